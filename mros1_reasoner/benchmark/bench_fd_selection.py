@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+'''
+Benchmark of the FD selection cost (NFR filtering + utility + best FD)
+as the number of FunctionDesigns and QA types grows.
+
+It selects the FD of an objective with tomasys.selectFunctionDesign over a
+FunctionDesignIndex, with and without Pareto pruning. The KB is built in
+memory with random QA estimations, it needs neither ROS nor an ontology
+file:
+
+    python benchmark/bench_fd_selection.py --fds 27 1000 10000 --qas 3 10
+'''
+import argparse
+import os
+import sys
+import timeit
+import types
+
+import numpy as np
+from owlready2 import World, Thing, ObjectProperty, DataProperty
+from owlready2 import FunctionalProperty
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from mros1_reasoner.fd_index import FunctionDesignIndex  # noqa: E402
+from mros1_reasoner.tomasys import candidateFunctionDesigns  # noqa: E402
+from mros1_reasoner.tomasys import selectFunctionDesign  # noqa: E402
+
+# Subset of the tomasys metamodel used by the FD selection
+CLASSES = ['Function', 'Objective', 'FunctionDesign', 'QAvalue',
+           'QualityAttributeType']
+OBJECT_PROPERTIES = ['hasQAestimation', 'hasNFR', 'fd_error_log']
+FUNCTIONAL_OBJECT_PROPERTIES = ['typeF', 'solvesF', 'isQAtype']
+DATA_PROPERTIES = ['hasValue', 'fd_realisability']
+
+
+def utility_configs(qa_types):
+    weights = dict((qa, 1.0 if i == 0 else -1.0)
+                   for i, qa in enumerate(qa_types))
+    return [
+        {'function': 'performance'},
+        {'function': 'weighted_sum', 'weights': weights},
+        {'function': 'lexicographic',
+         'order': [qa if w > 0 else '-' + qa for qa, w in weights.items()]},
+        {'function': 'pareto', 'weights': weights},
+    ]
+
+
+def build_kb(rng, n_fds, qa_types, nfrs):
+    """ Builds a KB with an objective and n_fds FDs solving its function
+        Returns:
+                (tbox, objective)
+    """
+    world = World()
+    tbox = world.get_ontology('http://metacontrol.org/tomasys#')
+    with tbox:
+        for name in CLASSES:
+            types.new_class(name, (Thing,))
+        for name in OBJECT_PROPERTIES:
+            types.new_class(name, (ObjectProperty,))
+        for name in FUNCTIONAL_OBJECT_PROPERTIES:
+            types.new_class(name, (ObjectProperty, FunctionalProperty))
+        for name in DATA_PROPERTIES:
+            types.new_class(name, (DataProperty, FunctionalProperty))
+    onto = world.get_ontology('http://bench/selection#')
+    function = tbox.Function('f_bench', namespace=onto)
+    qa_types = [tbox.QualityAttributeType(qa, namespace=onto)
+                for qa in qa_types]
+    estimations = rng.uniform(size=(n_fds, len(qa_types)))
+    for i in range(n_fds):
+        tbox.FunctionDesign(
+            'fd_{}'.format(i), namespace=onto, solvesF=function,
+            hasQAestimation=[
+                tbox.QAvalue(namespace=onto, isQAtype=qa_type,
+                             hasValue=float(value))
+                for qa_type, value in zip(qa_types, estimations[i])])
+    qa_types = dict((qa_type.name, qa_type) for qa_type in qa_types)
+    objective = tbox.Objective(
+        'o_bench', namespace=onto, typeF=function,
+        hasNFR=[tbox.QAvalue(namespace=onto, isQAtype=qa_types[qa],
+                             hasValue=value) for qa, value in nfrs])
+    return tbox, objective
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--fds', type=int, nargs='+',
+                        default=[27, 100, 1000, 10000])
+    parser.add_argument('--qas', type=int, nargs='+', default=[3, 10, 30])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    print('{0:>14} {1:>6} {2:>6} {3:>8} {4:>12}'.format(
+        'utility', 'FDs', 'QAs', 'pruning', 'ms/selection'))
+    for n_qas in args.qas:
+        qa_types = ['performance'] + ['qa_{}'.format(i)
+                                      for i in range(1, n_qas)]
+        # NFRs as upper bounds on half of the QA types
+        nfrs = [(qa, 0.9) for qa in qa_types[1::2]]
+        for n_fds in args.fds:
+            tbox, objective = build_kb(rng, n_fds, qa_types, nfrs)
+            fd_index = FunctionDesignIndex(
+                qa_directions=dict((qa, -1.0) for qa in qa_types[1:]))
+            fd_index.build(tbox)
+            rows, suitable, nfr_values = candidateFunctionDesigns(
+                objective, fd_index)
+            for config in utility_configs(qa_types):
+                for pruning in (False, True):
+                    fd_index.pareto_pruning = pruning
+                    seconds = min(timeit.repeat(
+                        lambda: selectFunctionDesign(
+                            fd_index, rows, suitable, nfr_values, config),
+                        number=1, repeat=args.repeat))
+                    print('{0:>14} {1:>6} {2:>6} {3:>8} {4:>12.3f}'.format(
+                        config['function'], n_fds, n_qas, str(pruning),
+                        seconds * 1000.0))
+
+
+if __name__ == '__main__':
+    main()
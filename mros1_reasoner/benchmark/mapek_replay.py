@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+'''
+Offline replay of the metacontrol (MAPE-K) loop, without a ROS master.
+
+It drives Reasoner and the tomasys functions with synthetic QA and
+component status streams generated from expected_qas.csv, and reports the
+latency of each phase of the loop (ingest, reason, evaluate, select,
+ground) and the number of cycles per second:
+
+    python benchmark/mapek_replay.py --tomasys tomasys.owl mros.owl \\
+        --model scripts/kb.owl --fds 27 1000 5000 --cycles 200
+
+The FDs of the model can be replicated (with perturbed QA estimations) to
+measure how the loop scales with the number of FunctionDesigns.
+'''
+import argparse
+import csv
+import os
+import random
+import subprocess
+import sys
+import timeit
+from collections import OrderedDict
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from mros1_reasoner.reasoner import Reasoner  # noqa: E402
+from mros1_reasoner.reasoning import get_backend  # noqa: E402
+from mros1_reasoner.rules import NFRRules, is_lower_bound  # noqa: E402
+from mros1_reasoner.diagnostics_buffer import DiagnosticsBuffer  # noqa: E402
+from mros1_reasoner.local_transport import qa_status  # noqa: E402
+from mros1_reasoner.local_transport import component_status  # noqa: E402
+from mros1_reasoner.utility import utility_config_for  # noqa: E402
+from mros1_reasoner.tomasys import loadKB_from_file  # noqa: E402
+from mros1_reasoner.tomasys import evaluateObjectives  # noqa: E402
+from mros1_reasoner.tomasys import obtainBestFunctionDesign  # noqa: E402
+
+PACKAGE_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+PHASES = ['ingest', 'reason', 'evaluate', 'select', 'ground']
+
+
+def read_expected_qas(csv_file):
+    """ Returns {configuration name: {qa type name: estimation}} """
+    expected_qas = OrderedDict()
+    with open(csv_file) as f:
+        for row in csv.DictReader(f):
+            name = row.pop('Configuration name')
+            expected_qas[name] = dict((qa, float(value))
+                                      for qa, value in row.items()
+                                      if qa and value)
+    return expected_qas
+
+
+def load_kb(reasoner, tomasys_files, model_file):
+    """ Loads the ontologies as RosReasoner does """
+    for tomasys_file in tomasys_files:
+        if reasoner.tomasys is None:
+            reasoner.tomasys = loadKB_from_file(tomasys_file)
+        else:
+            reasoner.tomasys.imported_ontologies.append(
+                loadKB_from_file(tomasys_file))
+    reasoner.onto = loadKB_from_file(model_file)
+    if reasoner.tomasys is None or reasoner.onto is None:
+        sys.exit("Error while reading ontology files")
+
+
+def replicate_fds(reasoner, n_fds, rng):
+    """ Adds copies of the FDs of the model, with perturbed QA estimations,
+        until there are n_fds FunctionDesigns
+    """
+    tomasys, onto = reasoner.tomasys, reasoner.onto
+    originals = list(tomasys.FunctionDesign.instances())
+    for i in range(max(0, n_fds - len(originals))):
+        fd = originals[i % len(originals)]
+        copy = tomasys.FunctionDesign(
+            '{0}_x{1}'.format(fd.name, i), namespace=onto,
+            solvesF=fd.solvesF, roles=list(fd.roles))
+        for qa in fd.hasQAestimation:
+            value = qa.hasValue * rng.uniform(0.8, 1.2) \
+                if qa.hasValue is not None else None
+            copy.hasQAestimation.append(tomasys.QAvalue(
+                'qa_est_{0}_{1}'.format(copy.name, qa.isQAtype.name),
+                namespace=onto, isQAtype=qa.isQAtype, hasValue=value))
+    reasoner.fd_index.invalidate()
+    reasoner.build_index()
+
+
+def init_objective(reasoner, nfr_safety):
+    """ Creates the navigation objective of RosReasoner.initKB if the
+        model has no objectives
+    """
+    objectives = reasoner.search_objectives()
+    if objectives:
+        return objectives
+    objective = reasoner.get_new_tomasys_objective('o_navigateA',
+                                                   '*f_navigate')
+    objective.hasNFR.append(
+        reasoner.get_new_tomasys_nrf('nfr_safety', '*safety', nfr_safety))
+    objective.o_status = 'UNGROUNDED'
+    return [objective]
+
+
+class Streams(object):
+    """Synthetic diagnostics: QA observations of the grounded FDs around
+       their expected values, NFR violations and component failures
+       followed by their recovery.
+    """
+
+    def __init__(self, reasoner, expected_qas, args, rng):
+        self.reasoner = reasoner
+        self.expected_qas = expected_qas
+        self.args = args
+        self.rng = rng
+        self.components = [c.name for c in
+                           reasoner.tomasys.ComponentState.instances()]
+        self.failed = []
+        # observed safety violating the NFR: below it if the NFR rules of
+        # the model make it a lower bound (e.g. kb.owl), above otherwise
+        nfr_rules = getattr(reasoner.reasoning_backend, 'nfr_rules', None) \
+            or NFRRules()
+        nfr_rules.load(reasoner.tomasys.world)
+        lower = any(is_lower_bound(rule) for rule in nfr_rules.rules('safety'))
+        self.safety_violation = args.nfr_safety + (-0.1 if lower else 0.1)
+
+    def expected(self, fd_name):
+        # replicated FDs are observed as their original
+        return self.expected_qas.get(fd_name.split('_x')[0], {})
+
+    def next_cycle(self):
+        statuses = []
+        for fg in self.reasoner.tomasys.FunctionGrounding.instances():
+            if fg.typeFD is None:
+                continue
+            expected = self.expected(fg.typeFD.name)
+            violation = self.rng.random() < self.args.violation_rate
+            for qa_type, value in expected.items():
+                value *= self.rng.uniform(0.95, 1.05)
+                if violation and qa_type == 'safety':
+                    value = self.safety_violation
+                statuses.append(qa_status(fg.name, qa_type, value))
+        while self.failed:
+            statuses.append(component_status(self.failed.pop(),
+                                             'RECOVERED'))
+        if self.components and self.rng.random() < self.args.fault_rate:
+            component = self.rng.choice(self.components)
+            statuses.append(component_status(component, 'FALSE'))
+            self.failed.append(component)
+        return statuses
+
+
+def apply_statuses(reasoner, buffer, statuses):
+    """ Ingests diagnostics as RosReasoner.apply_diagnostics does """
+    for status in statuses:
+        buffer.add(status)
+    with reasoner.ontology_lock:
+        for status in buffer.flush():
+            if status.message == 'QA status':
+                reasoner.updateQA(status)
+            elif status.message == 'Component status':
+                reasoner.updateComponentStatus(status)
+
+
+def clear_recovered(reasoner):
+    for component in reasoner.tomasys.ComponentState.instances():
+        if component.c_status == 'RECOVERED':
+            component.c_status = None
+            reasoner.mark_kb_changed()
+
+
+def run_cycle(reasoner, buffer, streams, objectives, timings):
+    """ One iteration of the metacontrol loop, timing each phase
+        Returns:
+                number of reconfigurations
+    """
+    timer = timeit.default_timer
+    # time at the end of each phase
+    marks = [timer()]
+    apply_statuses(reasoner, buffer, streams.next_cycle())
+    marks.append(timer())
+    reasoner.perform_reasoning()
+    marks.append(timer())
+    in_error = evaluateObjectives(objectives)
+    marks.append(timer())
+    new_groundings = []
+    for objective in in_error:
+        if objective.o_status == 'UPDATABLE':
+            clear_recovered(reasoner)
+        fd_name = obtainBestFunctionDesign(
+            objective, reasoner.tomasys, reasoner.fd_index,
+            utility_config_for(reasoner.utility_configs, objective.name))
+        if fd_name is not None:
+            new_groundings.append((fd_name, objective))
+    marks.append(timer())
+    for fd_name, objective in new_groundings:
+        reasoner.set_new_grounding(fd_name, objective)
+    marks.append(timer())
+    for i, phase in enumerate(PHASES):
+        timings[phase].append(marks[i + 1] - marks[i])
+    return len(new_groundings)
+
+
+def replay(args, n_fds):
+    rng = random.Random(args.seed)
+    reasoner = Reasoner()
+    reasoner.reasoning_backend = get_backend(args.backend)
+    reasoner.incremental_reasoning = not args.full_reasoning
+    load_kb(reasoner, args.tomasys, args.model)
+    replicate_fds(reasoner, n_fds, np.random.RandomState(args.seed))
+    objectives = init_objective(reasoner, args.nfr_safety)
+    streams = Streams(reasoner, read_expected_qas(args.csv), args, rng)
+    buffer = DiagnosticsBuffer()
+    timings = dict((phase, []) for phase in PHASES)
+
+    for _ in range(args.warmup):
+        run_cycle(reasoner, buffer, streams, objectives,
+                  dict((phase, []) for phase in PHASES))
+    reconfigurations = 0
+    start = timeit.default_timer()
+    for _ in range(args.cycles):
+        reconfigurations += run_cycle(reasoner, buffer, streams,
+                                      objectives, timings)
+    elapsed = timeit.default_timer() - start
+
+    n_fds = len(reasoner.tomasys.FunctionDesign.instances())
+    print('\n{0} FDs, {1} cycles, {2} reconfigurations, backend {3}'
+          .format(n_fds, args.cycles, reconfigurations, args.backend))
+    print('{0:>10} {1:>10} {2:>10} {3:>10} {4:>10}'.format(
+        'phase', 'mean ms', 'p50 ms', 'p95 ms', 'max ms'))
+    for phase in PHASES:
+        ms = np.array(timings[phase]) * 1000.0
+        print('{0:>10} {1:>10.3f} {2:>10.3f} {3:>10.3f} {4:>10.3f}'.format(
+            phase, ms.mean(), np.percentile(ms, 50),
+            np.percentile(ms, 95), ms.max()))
+    print('{0:>10} {1:>10.1f}'.format('cycles/s', args.cycles / elapsed))
+    print('reasoning cycles - run: {runs}, skipped: {skips}'
+          .format(**reasoner.reasoning_stats()))
+    if hasattr(reasoner.reasoning_backend, 'close'):
+        reasoner.reasoning_backend.close()
+
+
+def without_option(argv, option):
+    """ Removes an option and its values from a list of arguments """
+    result, skipping = [], False
+    for arg in argv:
+        if arg == option:
+            skipping = True
+        elif not (skipping and not arg.startswith('-')):
+            skipping = False
+            result.append(arg)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--tomasys', nargs='+', required=True,
+                        help='tomasys ontology files, as ~tomasys_file')
+    parser.add_argument('--model', default=os.path.join(
+        PACKAGE_DIR, 'scripts', 'kb.owl'))
+    parser.add_argument('--csv', default=os.path.join(
+        PACKAGE_DIR, 'expected_qas.csv'))
+    parser.add_argument('--fds', type=int, nargs='+', default=[27],
+                        help='number of FDs of each replay')
+    parser.add_argument('--cycles', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--backend', default='python',
+                        help='reasoning backend: pellet, pellet_server, '
+                        'python, crosscheck')
+    parser.add_argument('--full-reasoning', action='store_true',
+                        help='reason on every cycle (no incremental mode)')
+    parser.add_argument('--nfr-safety', type=float, default=0.8)
+    parser.add_argument('--violation-rate', type=float, default=0.1,
+                        help='probability of a safety NFR violation')
+    parser.add_argument('--fault-rate', type=float, default=0.05,
+                        help='probability of a component failure')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # the KB lives in the owlready2 default world,
+    # so each replay runs in a fresh process
+    if len(args.fds) > 1:
+        argv = without_option(sys.argv[1:], '--fds')
+        for n_fds in args.fds:
+            subprocess.check_call([sys.executable, __file__,
+                                   '--fds', str(n_fds)] + argv)
+        return
+    replay(args, args.fds[0])
+
+
+if __name__ == '__main__':
+    main()
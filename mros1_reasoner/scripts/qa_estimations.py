@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+'''
+Imports the QA estimations of the FunctionDesigns of an OWL model from a CSV
+table (one row per configuration, one column per QA type, as
+expected_qas.csv), or exports them to such a table, without regenerating the
+model with rosmodel2owl:
+
+    rosrun mros1_reasoner qa_estimations.py import --tomasys tomasys.owl \\
+        --model kb.owl --csv expected_qas.csv [--output kb_updated.owl]
+    rosrun mros1_reasoner qa_estimations.py export --tomasys tomasys.owl \\
+        --model kb.owl --csv estimations.csv
+'''
+import argparse
+import sys
+import time
+
+from mros1_reasoner.reasoner import Reasoner
+from mros1_reasoner.tomasys import loadKB_from_file
+from mros1_reasoner.qa_table import read_qa_table
+from mros1_reasoner.qa_table import import_qa_estimations
+from mros1_reasoner.qa_table import export_qa_estimations
+
+
+def load_kb(tomasys_files, model_file):
+    reasoner = Reasoner()
+    for tomasys_file in tomasys_files:
+        if reasoner.tomasys is None:
+            reasoner.tomasys = loadKB_from_file(tomasys_file)
+        else:
+            reasoner.tomasys.imported_ontologies.append(
+                loadKB_from_file(tomasys_file))
+    reasoner.onto = loadKB_from_file(model_file)
+    if reasoner.tomasys is None or reasoner.onto is None:
+        sys.exit("Error while reading ontology files")
+    reasoner.build_index()
+    return reasoner
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Imports/exports the QA estimations of a model as CSV')
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('--tomasys', nargs='+', required=True,
+                        help='tomasys ontology files')
+    parser.add_argument('--model', required=True, help='OWL model')
+    parser.add_argument('--csv', required=True, help='CSV table')
+    parser.add_argument('--output', default=None,
+                        help='model updated by import (default: --model)')
+    args = parser.parse_args()
+
+    reasoner = load_kb(args.tomasys, args.model)
+    start = time.time()
+    if args.command == 'import':
+        stats = import_qa_estimations(reasoner, read_qa_table(args.csv))
+        elapsed = time.time() - start
+        reasoner.onto.save(file=args.output or args.model, format='rdfxml')
+        print('{0} estimations updated, {1} created in {2:.1f} ms'
+              .format(stats.updated, stats.created, elapsed * 1000.0))
+        if stats.unknown_fds:
+            print('FunctionDesigns not in the model: {}'
+                  .format(', '.join(stats.unknown_fds)))
+        if stats.unknown_qa_types:
+            print('QA types not in the model: {}'
+                  .format(', '.join(stats.unknown_qa_types)))
+    else:
+        n_fds = export_qa_estimations(reasoner, args.csv)
+        print('Estimations of {0} FunctionDesigns written to {1} in '
+              '{2:.1f} ms'.format(n_fds, args.csv,
+                                  (time.time() - start) * 1000.0))
@@ -6,79 +6,262 @@ This script generates an .owl file from a RosModel
 It uses Owlready2 to manipulate the OWL ontology
 
 INPUT:
-- RosModel: not sure if a system.rossystem and/or multiple .rossystem files with the configurations of navigation 
+- RosModel: not sure if a system.rossystem and/or multiple .rossystem files
+  with the configurations of navigation
 - tomasys.owl: contains the tomasys metamodel with the ontology classes
-- onto_file (default value=ros_navigation.owl): contains individuals and rules for the domain (e.g. ROS navihation stack)
+- onto_file (default value=ros_navigation.owl): contains individuals and rules
+  for the domain (e.g. ROS navihation stack)
+
+The .rossystem files of the configurations are parsed in parallel (-j/--jobs
+processes), then the FunctionDesigns and their QA estimations are added to the
+ontology in a single pass.
+
+A manifest with the content hash of each configuration is saved next to the
+result_file (result_file.manifest.json). On later runs the existing result_file
+is updated in place: only new or modified configurations are parsed, and the
+FunctionDesigns of the deleted ones are removed (--full rebuilds it all). A
+modified configuration that cannot be parsed keeps its previous
+FunctionDesign.
 '''
+import argparse
+import json
+from multiprocessing import Pool
+import os
+import sys
+import time
+
 import rospy
 import rospkg
 import roslib
 
 from ros_model_parser.rossystem_parser import RosSystemModelParser
-from pyparsing import ParseResults
+from owlready2 import destroy_entity, get_ontology
+
+from mros1_reasoner.kb_cache import snapshot_key
 roslib.load_manifest('rosparam')
-import rosparam
-from owlready2 import *
+import rosparam  # noqa: E402
 
 ros_root = rospkg.get_ros_root()
 rospack = rospkg.RosPack()
 
 onto = None
-import os, sys
-def rosmodel2owl(configFilePath):
-    # the file path should be given as argument, alternatively a ns can be added
-    # params = rosparam.load_file(rospack.get_path('mros1_reasoner')+'/config/nav_config.yaml', '')
-    # loads individuals to specify a single function and QalityAttributeTypes from the domain_ontology_file
+
+
+# Parses the .rossystem file of a configuration (run in the worker processes)
+# returns (config, system name, [(qa param name, qa type, value)], error)
+def parse_config(config_name):
+    file_name = config_name + '.rossystem'
+    try:
+        model = RosSystemModelParser(config_file_path(config_name)).parse()
+        # plain values, the parse results are not sent back to the parent
+        sys_name = str(model.system_name[0])
+        qa_estimations = [(str(qa_param.param_name[0]),
+                           str(qa_param.param_name[0]).replace('qa_', ''),
+                           qa_param.param_value[0])
+                          for qa_param in model.global_parameters]
+    except Exception as e:
+        return config_name, None, [], '{0}: {1}'.format(file_name, e)
+    return config_name, sys_name, qa_estimations, None
+
+
+# Parses all the configurations, in a process pool if jobs > 1
+# returns the records of the configurations parsed, in the configs order
+def parse_configs(configs, jobs):
+    records = []
+    errors = 0
+    if jobs > 1 and len(configs) > 1:
+        pool = Pool(processes=jobs)
+        results = pool.imap(parse_config, configs,
+                            chunksize=max(1, len(configs) // (jobs * 4)))
+    else:
+        pool = None
+        results = (parse_config(config) for config in configs)
+    progress_step = max(1, len(configs) // 20)
+    try:
+        for i, (config_name, sys_name, qa_estimations, error) in \
+                enumerate(results, 1):
+            if error is not None:
+                errors += 1
+                print('Skipping configuration {0} - {1}'
+                      .format(config_name, error))
+            else:
+                records.append((config_name, sys_name, qa_estimations))
+            if i % progress_step == 0 or i == len(configs):
+                print('Parsed {0}/{1} configurations'
+                      .format(i, len(configs)))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return records, errors
+
+
+# Returns the path of the .rossystem file of a configuration
+def config_file_path(config_name):
+    return os.path.join(rospack.get_path(config_name),
+                        config_name + '.rossystem')
+
+
+# Returns the content hash of the .rossystem file of a configuration, None
+# if it cannot be read (the configuration is then parsed again)
+def config_hash(config_name):
+    try:
+        return snapshot_key([config_file_path(config_name)])
+    except rospkg.ResourceNotFound as e:
+        print('Cannot hash configuration {0} - package not found: {1}'
+              .format(config_name, e))
+        return None
+
+
+def manifest_path(result_file):
+    return result_file + '.manifest.json'
+
+
+# Reads the manifest of a previous run, None if there is none or it does not
+# match the current ontologies and function
+def load_manifest(result_file, sources, function):
+    if not os.path.isfile(result_file):
+        return None
+    try:
+        with open(manifest_path(result_file)) as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if manifest.get('sources') != sources or \
+            manifest.get('function') != function:
+        return None
+    return manifest
+
+
+def save_manifest(result_file, manifest):
+    tmp_file = manifest_path(result_file) + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.rename(tmp_file, manifest_path(result_file))
+
+
+# Removes the FunctionDesign of a configuration and its QA estimations
+def remove_config(onto, entry):
+    for name in entry['qas'] + [entry['fd']]:
+        entity = onto[name]
+        if entity is not None:
+            destroy_entity(entity)
+
+
+def rosmodel2owl(configFilePath, jobs=None, full=False):
+    # the file path should be given as argument, alternatively a ns can be
+    # added
+    # params = rosparam.load_file(
+    #     rospack.get_path('mros1_reasoner')+'/config/nav_config.yaml', '')
+    # loads individuals to specify a single function and
+    # QalityAttributeTypes from the domain_ontology_file
     params = rosparam.load_file(configFilePath)
     for param, ns in params:
         try:
-            rosparam.upload_params(ns,param)
-        except:
-            pass # ignore empty params
+            rosparam.upload_params(ns, param)
+        except (rosparam.RosParamException, TypeError):
+            pass  # ignore empty params
     ontology_pkg = rospy.get_param('ontology_pkg')
     ontology_path = rospy.get_param('ontology_path')
-    ontology_file = os.path.join(rospack.get_path(ontology_pkg)+'/'+ontology_path)
+    ontology_file = os.path.join(
+        rospack.get_path(ontology_pkg) + '/' + ontology_path)
     domain_ontology_pkg = rospy.get_param('domain_ontology_pkg')
     domain_ontology_path = rospy.get_param('domain_ontology_path')
-    domain_ontology_file= os.path.join(rospack.get_path(domain_ontology_pkg)+'/'+domain_ontology_path)
+    domain_ontology_file = os.path.join(
+        rospack.get_path(domain_ontology_pkg) + '/' + domain_ontology_path)
     function = rospy.get_param('function')
     configs = rospy.get_param('configs')
     result_file = rospy.get_param('result_file')
 
+    start = time.time()
+    # hash of the ontologies the result_file is built from
+    sources = snapshot_key([ontology_file, domain_ontology_file])
+    manifest = None if full else load_manifest(result_file, sources, function)
     tomasys = get_ontology(ontology_file).load()
-    onto = get_ontology(domain_ontology_file).load()
-    rospy.loginfo('Loaded domain ontology: ' + domain_ontology_file)
+    if manifest is None:
+        manifest = {'sources': sources, 'function': function, 'configs': {}}
+        onto = get_ontology(domain_ontology_file).load()
+        rospy.loginfo('Loaded domain ontology: ' + domain_ontology_file)
+    else:
+        # update the KB generated in the previous run
+        onto = get_ontology(result_file).load()
+        rospy.loginfo('Loaded previous result: ' + result_file)
     function_ = onto.search_one(iri='*'+function+'*')
 
-
-    if function_ == None:
-        print('The domain ontology provided does not contain a Function ',function)
+    if function_ is None:
+        print('The domain ontology provided does not contain a Function ',
+              function)
         sys.exit(0)
-    
-    for config in configs:
-        config_name = config
-        file_name = config_name + '.rossystem'
-        file_path = os.path.join(rospack.get_path(config_name),file_name)
-        parser = RosSystemModelParser(file_path)
-        model = parser.parse()
-        sys_name = model.system_name[0]
-
-        # create a FunctionDesign
-        fd = tomasys.FunctionDesign(sys_name, namespace=onto, solvesF=function_)
-            
-        # create a QualityAttribute expected value for the FunctionDesign with the type indicated by the name of the param in the RosSystem and the value of the param (e.g. 0.5)
-        for qa_param in model.global_parameters:
-            qa_string = qa_param.param_name[0].replace('qa_', '')
-            value = qa_param.param_value[0]
-            qa = tomasys.QAvalue('{0}_{1}'.format(qa_param.param_name[0], sys_name), namespace=onto, isQAtype=onto.search_one(iri='*'+qa_string), hasValue=value)
-            fd.hasQAestimation.append(qa)
-
-    # save the ontology to a file
+    loaded = time.time()
+
+    # configurations new or modified since the previous run, and deleted
+    configs = list(configs)
+    hashes = dict((config, config_hash(config)) for config in configs)
+    entries = manifest['configs']
+    changed = [config for config in configs
+               if config not in entries or hashes[config] is None
+               or entries[config]['hash'] != hashes[config]]
+    deleted = [config for config in entries if config not in hashes]
+    print('{0} configurations: {1} new or modified, {2} deleted, {3} '
+          'unchanged'.format(len(configs), len(changed), len(deleted),
+                             len(configs) - len(changed)))
+
+    records, errors = parse_configs(changed, jobs or os.cpu_count() or 1)
+    parsed = time.time()
+
+    with onto:
+        # the FDs of the changed configurations are only replaced if they
+        # have been parsed, those that failed keep their previous FD
+        for config in deleted + [record[0] for record in records]:
+            if config in entries:
+                remove_config(onto, entries.pop(config))
+
+        # create the FunctionDesigns and their QA estimations in one pass
+        qa_types = {}
+        for config, sys_name, qa_estimations in records:
+            # create a FunctionDesign
+            fd = tomasys.FunctionDesign(sys_name, namespace=onto,
+                                        solvesF=function_)
+
+            # create a QualityAttribute expected value for the
+            # FunctionDesign with the type indicated by the name of the param
+            # in the RosSystem and the value of the param (e.g. 0.5)
+            qas = []
+            for qa_name, qa_string, value in qa_estimations:
+                if qa_string not in qa_types:
+                    qa_types[qa_string] = onto.search_one(iri='*'+qa_string)
+                qas.append(tomasys.QAvalue(
+                    '{0}_{1}'.format(qa_name, sys_name), namespace=onto,
+                    isQAtype=qa_types[qa_string], hasValue=value))
+            fd.hasQAestimation = qas
+            entries[config] = {'hash': hashes[config], 'fd': fd.name,
+                               'qas': [qa.name for qa in qas]}
+    built = time.time()
+
+    # save the ontology to a file, then the manifest describing it
     onto.save(file=result_file, format='rdfxml')
+    save_manifest(result_file, manifest)
+    saved = time.time()
+
+    print('{0} FunctionDesigns written to {1} ({2} updated, {3} removed, '
+          '{4} configurations skipped)'.format(
+              len(entries), result_file, len(records), len(deleted), errors))
+    print('Time (s) - load: {0:.2f}, parse: {1:.2f}, build: {2:.2f}, '
+          'save: {3:.2f}, total: {4:.2f}'.format(
+              loaded - start, parsed - loaded, built - parsed,
+              saved - built, saved - start))
 
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("usage: rosrun mros1_reasoner rosmodel2owl.py /path/to/config/file")
-    else:
-        rosmodel2owl(sys.argv[1])
+    arg_parser = argparse.ArgumentParser(
+        description='Generates an .owl file with the FunctionDesigns of the '
+                    'configurations listed in a config file')
+    arg_parser.add_argument('config_file', help='/path/to/config/file')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=None,
+                            help='processes parsing the configurations '
+                                 '(default: number of CPUs)')
+    arg_parser.add_argument('--full', action='store_true',
+                            help='rebuild the result file from all the '
+                                 'configurations')
+    args = arg_parser.parse_args(rospy.myargv()[1:])
+    rosmodel2owl(args.config_file, args.jobs, args.full)
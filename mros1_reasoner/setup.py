@@ -8,6 +8,7 @@ setup_args = generate_distutils_setup(
     packages=[
         'mros1_reasoner'
     ],
-    package_dir={'': 'src'})
+    package_dir={'': 'src'},
+    package_data={'mros1_reasoner': ['PelletServer.java']})
 
 setup(**setup_args)
@@ -0,0 +1,211 @@
+///////////////////////////////////////////
+//
+// DESCRIPTION:
+//  Long-lived Pellet reasoner used by the 'pellet_server' reasoning backend
+//  (see pellet_server.py). It keeps the KB in a Jena model with a Pellet
+//  inference graph, receives the triples added to and removed from the
+//  A-box on its standard input and reports the status values inferred.
+//  Started with the Java (>= 11) source launcher and the Pellet jars
+//  bundled with owlready2:
+//    java -cp <owlready2/pellet/*.jar> PelletServer.java
+//
+//  Requests, one line each, "<n>" lines following some of them:
+//   PROPERTIES <n>  IRIs of the status properties reported
+//   LOAD <file>     replaces the KB with an N-Triples file
+//   ADD <n>         N-Triples lines added to the KB
+//   REMOVE <n>      N-Triples lines removed from the KB
+//   REASON <n>      IRIs of subjects whose status values are reported even
+//                   if they did not change
+//   QUIT
+//  Each request is answered with "OK", "INCONSISTENT" or "ERROR <message>".
+//  REASON first prints the status values that changed since the last
+//  REASON, one per line: "VALUE\t<s>\t<p>\t<lexical form>\t<datatype>"
+//  or "NONE\t<s>\t<p>" if the subject has no value anymore.
+///////////////////////////////////////////
+
+import java.io.BufferedReader;
+import java.io.FileInputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStreamWriter;
+import java.io.PrintWriter;
+import java.io.StringReader;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.HashMap;
+import java.util.LinkedHashSet;
+import java.util.List;
+import java.util.Map;
+import java.util.Set;
+
+import com.hp.hpl.jena.rdf.model.InfModel;
+import com.hp.hpl.jena.rdf.model.Literal;
+import com.hp.hpl.jena.rdf.model.Model;
+import com.hp.hpl.jena.rdf.model.ModelFactory;
+import com.hp.hpl.jena.rdf.model.Property;
+import com.hp.hpl.jena.rdf.model.RDFNode;
+import com.hp.hpl.jena.rdf.model.Statement;
+import com.hp.hpl.jena.rdf.model.StmtIterator;
+
+import org.mindswap.pellet.PelletOptions;
+import org.mindswap.pellet.exceptions.InconsistentOntologyException;
+import org.mindswap.pellet.jena.PelletInfGraph;
+import org.mindswap.pellet.jena.PelletReasonerFactory;
+
+public class PelletServer {
+
+    private final BufferedReader in;
+    private final PrintWriter out;
+    private final Model base = ModelFactory.createDefaultModel();
+    private InfModel inf = createInfModel();
+    private final List<Property> properties = new ArrayList<Property>();
+    // "<s>\t<p>" -> "<lexical form>\t<datatype>" reported by the last REASON
+    private Map<String, String> reported = new HashMap<String, String>();
+
+    public PelletServer(InputStream input, PrintWriter output) {
+        in = new BufferedReader(
+            new InputStreamReader(input, StandardCharsets.UTF_8));
+        out = output;
+    }
+
+    public static void main(String[] args) throws IOException {
+        // the A-box changes between two cycles are small
+        PelletOptions.USE_INCREMENTAL_CONSISTENCY = true;
+        PelletOptions.USE_INCREMENTAL_DELETION = true;
+        PrintWriter output = new PrintWriter(
+            new OutputStreamWriter(System.out, StandardCharsets.UTF_8));
+        new PelletServer(System.in, output).serve();
+    }
+
+    private InfModel createInfModel() {
+        return ModelFactory.createInfModel(
+            PelletReasonerFactory.theInstance().create(), base);
+    }
+
+    public void serve() throws IOException {
+        String line;
+        while ((line = in.readLine()) != null) {
+            String[] request = line.split(" ", 2);
+            String argument = request.length > 1 ? request[1] : "";
+            try {
+                if (request[0].equals("QUIT")) {
+                    break;
+                } else if (request[0].equals("PROPERTIES")) {
+                    properties.clear();
+                    for (String iri : readLines(argument)) {
+                        properties.add(base.createProperty(iri));
+                    }
+                } else if (request[0].equals("LOAD")) {
+                    load(argument);
+                } else if (request[0].equals("ADD")) {
+                    base.add(readTriples(argument));
+                } else if (request[0].equals("REMOVE")) {
+                    base.remove(readTriples(argument));
+                } else if (request[0].equals("REASON")) {
+                    reason(readLines(argument));
+                } else {
+                    throw new IllegalArgumentException(
+                        "Unknown request: " + request[0]);
+                }
+                out.println("OK");
+            } catch (InconsistentOntologyException e) {
+                out.println("INCONSISTENT");
+            } catch (Exception e) {
+                out.println("ERROR " + String.valueOf(e).replace('\n', ' '));
+            }
+            out.flush();
+        }
+    }
+
+    private List<String> readLines(String count) throws IOException {
+        int n = Integer.parseInt(count.trim());
+        List<String> lines = new ArrayList<String>(n);
+        for (int i = 0; i < n; i++) {
+            String line = in.readLine();
+            if (line == null) {
+                throw new IOException("Request truncated");
+            }
+            lines.add(line);
+        }
+        return lines;
+    }
+
+    private Model readTriples(String count) throws IOException {
+        StringBuilder triples = new StringBuilder();
+        for (String line : readLines(count)) {
+            triples.append(line).append('\n');
+        }
+        Model delta = ModelFactory.createDefaultModel();
+        delta.read(new StringReader(triples.toString()), null, "N-TRIPLE");
+        return delta;
+    }
+
+    private void load(String file) throws IOException {
+        InputStream input = new FileInputStream(file);
+        try {
+            base.removeAll();
+            base.read(input, null, "N-TRIPLE");
+        } finally {
+            input.close();
+        }
+        inf = createInfModel();
+        reported = new HashMap<String, String>();
+    }
+
+    private void reason(List<String> subjects) {
+        PelletInfGraph graph = (PelletInfGraph) inf.getGraph();
+        if (!graph.isConsistent()) {
+            throw new InconsistentOntologyException("KB is inconsistent");
+        }
+        Map<String, String> values = new HashMap<String, String>();
+        for (Property property : properties) {
+            StmtIterator statements =
+                inf.listStatements(null, property, (RDFNode) null);
+            while (statements.hasNext()) {
+                Statement statement = statements.next();
+                if (!statement.getSubject().isURIResource()) {
+                    continue;
+                }
+                values.put(key(statement.getSubject().getURI(), property),
+                           value(statement.getObject()));
+            }
+        }
+        Set<String> keys = new LinkedHashSet<String>();
+        for (Map.Entry<String, String> entry : values.entrySet()) {
+            if (!entry.getValue().equals(reported.get(entry.getKey()))) {
+                keys.add(entry.getKey());
+            }
+        }
+        for (String key : reported.keySet()) {
+            if (!values.containsKey(key)) {
+                keys.add(key);
+            }
+        }
+        for (String subject : subjects) {
+            for (Property property : properties) {
+                keys.add(key(subject, property));
+            }
+        }
+        for (String key : keys) {
+            String value = values.get(key);
+            out.println(value != null ? "VALUE\t" + key + "\t" + value
+                                      : "NONE\t" + key);
+        }
+        reported = values;
+    }
+
+    private static String key(String subject, Property property) {
+        return subject + "\t" + property.getURI();
+    }
+
+    private static String value(RDFNode node) {
+        if (!node.isLiteral()) {
+            return node.toString() + "\t";
+        }
+        Literal literal = node.asLiteral();
+        String datatype = literal.getDatatypeURI();
+        return literal.getLexicalForm().replace('\t', ' ').replace('\n', ' ')
+            + "\t" + (datatype != null ? datatype : "");
+    }
+}
@@ -0,0 +1,152 @@
+###########################################
+#
+# DESCRIPTION:
+#  Change tracking of the quadstore of an owlready2 World with temporary
+#  SQLite triggers, so the reasoning backends know which individuals were
+#  modified (to send only their triples to a long-lived reasoner) and
+#  which status values the reasoning changed, without comparing snapshots
+#  of all the Objectives, FGs and FDs.
+##########################################
+
+import itertools
+
+# Status properties inferred by the reasoning
+STATUS_PROPERTIES = ('o_status', 'fg_status', 'fd_realisability')
+
+_ids = itertools.count()
+
+
+def iri_name(iri):
+    """ Returns the name of an entity from its IRI, as owlready2 does """
+    if '#' in iri:
+        return iri.rsplit('#', 1)[1]
+    return iri.rsplit('/', 1)[-1]
+
+
+def ntriple(s, p, o, d, unabbreviate):
+    """ Formats a triple of the quadstore as N-Triples (as owlready2 saves
+        it), d being None for object triples
+    """
+    s = "_:{}".format(-s) if s < 0 else "<{}>".format(unabbreviate(s))
+    p = "<{}>".format(unabbreviate(p))
+    if d is None:
+        o = "_:{}".format(-o) if o < 0 else "<{}>".format(unabbreviate(o))
+    else:
+        if isinstance(o, str):
+            o = o.replace('\\', '\\\\').replace('"', '\\"') \
+                .replace('\n', '\\n').replace('\r', '\\r')
+        if isinstance(d, str) and d.startswith('@'):
+            o = '"{0}"{1}'.format(o, d)
+        elif d == 0:
+            o = '"{}"'.format(o)
+        else:
+            o = '"{0}"^^<{1}>'.format(o, unabbreviate(d))
+    return "{0} {1} {2} .".format(s, p, o)
+
+
+class ABoxChanges(object):
+    """Records, with SQLite triggers on the quadstore of a world:
+        - the named subjects of the triples added or removed
+        - the values of the status properties added or removed
+
+       Args:
+               world: owlready2 World.
+               tbox (ontology): ontology holding the tomasys Tbox, with the
+                                status properties.
+    """
+
+    def __init__(self, world, tbox):
+        self.world = world
+        self.id = next(_ids)
+        self.subjects_table = 'mros_subjects_{}'.format(self.id)
+        self.status_table = 'mros_status_{}'.format(self.id)
+        # storid -> name of the status properties
+        self.status_properties = {}
+        for name in STATUS_PROPERTIES:
+            prop = getattr(tbox, name, None)
+            if prop is not None:
+                self.status_properties[prop.storid] = name
+        self._triggers = []
+        self.attach()
+
+    def execute(self, sql, args=()):
+        return self.world.graph.execute(sql, args)
+
+    def attach(self):
+        self.execute("CREATE TEMP TABLE IF NOT EXISTS {} "
+                     "(s INTEGER PRIMARY KEY, iri TEXT)"
+                     .format(self.subjects_table))
+        self.execute("CREATE TEMP TABLE IF NOT EXISTS {} "
+                     "(id INTEGER PRIMARY KEY, iri TEXT, p INTEGER, "
+                     "removed INTEGER, o BLOB, d INTEGER)"
+                     .format(self.status_table))
+        for table in ('objs', 'datas'):
+            for event, row in (('INSERT', 'new'), ('DELETE', 'old')):
+                self._trigger(
+                    'mros_{0}_{1}_{2}'.format(table, event.lower(), self.id),
+                    event, table, "{}.s > 0".format(row),
+                    "INSERT OR IGNORE INTO {0} VALUES ({1}.s, (SELECT iri "
+                    "FROM resources WHERE storid = {1}.s))"
+                    .format(self.subjects_table, row))
+        if self.status_properties:
+            properties = ','.join(str(p) for p in self.status_properties)
+            for event, row, removed in (('INSERT', 'new', 0),
+                                        ('DELETE', 'old', 1)):
+                self._trigger(
+                    'mros_status_{0}_{1}'.format(event.lower(), self.id),
+                    event, 'datas', "{0}.p IN ({1})".format(row, properties),
+                    "INSERT INTO {0} (iri, p, removed, o, d) VALUES ((SELECT "
+                    "iri FROM resources WHERE storid = {1}.s), {1}.p, {2}, "
+                    "{1}.o, {1}.d)".format(self.status_table, row, removed))
+
+    def _trigger(self, name, event, table, condition, statement):
+        self.execute("CREATE TEMP TRIGGER IF NOT EXISTS {0} AFTER {1} ON "
+                     "main.{2} WHEN {3} BEGIN {4}; END"
+                     .format(name, event, table, condition, statement))
+        self._triggers.append(name)
+
+    def detach(self):
+        for name in self._triggers:
+            self.execute("DROP TRIGGER IF EXISTS temp.{}".format(name))
+        self._triggers = []
+        for table in (self.subjects_table, self.status_table):
+            self.execute("DROP TABLE IF EXISTS temp.{}".format(table))
+
+    def changed_subjects(self):
+        """ Returns and forgets the subjects modified since the last call
+            Returns:
+                    list of (storid, iri)
+        """
+        subjects = self.execute("SELECT s, iri FROM {}"
+                                .format(self.subjects_table)).fetchall()
+        self.execute("DELETE FROM {}".format(self.subjects_table))
+        return subjects
+
+    def clear_status(self):
+        self.execute("DELETE FROM {}".format(self.status_table))
+
+    def status_changes(self):
+        """ Returns and forgets the changes of the status values since the
+            last call (or clear_status)
+            Returns:
+                    dict {(individual name, property name): (old, new)}
+                    with only the values that differ
+        """
+        to_python = self.world._to_python
+        # (name, property name) -> [old, new]
+        values = {}
+        for iri, p, removed, o, d in self.execute(
+                "SELECT iri, p, removed, o, d FROM {} ORDER BY id"
+                .format(self.status_table)):
+            if iri is None:
+                continue
+            key = (iri_name(iri), self.status_properties[p])
+            value = to_python(o, d)
+            change = values.get(key)
+            if change is None:
+                # the first removal gives the value before the reasoning
+                change = values[key] = [value if removed else None, None]
+            change[1] = None if removed else value
+        self.clear_status()
+        return dict((key, tuple(change)) for key, change in values.items()
+                    if change[0] != change[1])
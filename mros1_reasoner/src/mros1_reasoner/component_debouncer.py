@@ -0,0 +1,150 @@
+###########################################
+#
+# DESCRIPTION:
+#  Debouncing of the component statuses before they reach the KB: a
+#  flapping component would otherwise reset FD realisability, trigger
+#  reasoning and reconfigurations on every report. A change of status is
+#  only forwarded once it has been confirmed by N of the last M reports
+#  of the component and the previous change is older than a minimum dwell
+#  time. A confirmed change only held back by the dwell time is released
+#  once it has passed, even if the component does not report it again.
+#  Disabled by default (N = M = 1, no dwell time).
+##########################################
+
+from collections import Counter, deque
+from threading import Lock
+import time
+
+
+class _ComponentState(object):
+    """Debouncing state of a component."""
+
+    __slots__ = ('status', 'changed', 'reports', 'pending')
+
+    def __init__(self, window):
+        # last status forwarded, and when it was forwarded
+        self.status = None
+        self.changed = None
+        # last reported statuses
+        self.reports = deque(maxlen=window)
+        # (status, report) of the confirmed change held back by the dwell
+        # time
+        self.pending = None
+
+
+class ComponentDebouncer(object):
+    """Decides which component status reports are forwarded to the KB.
+
+       Args:
+               confirmations: reports of a new status (N) needed in the
+                              window to forward it.
+               window: number of last reports (M) of each component
+                       considered.
+               dwell_time: minimum time (s) a forwarded status is kept
+                           before forwarding another one.
+               clock: returns the current time in seconds.
+
+       While enabled, reports repeating the forwarded status are dropped
+       too. A change held back is forwarded by a later report confirming
+       it, or by release() once the dwell time has passed if it was
+       confirmed. suppressed counts, per component, the changes held back.
+    """
+
+    def __init__(self, confirmations=1, window=1, dwell_time=0.0,
+                 clock=time.monotonic):
+        if not 1 <= confirmations <= window:
+            raise ValueError(
+                "Component debouncing needs 1 <= confirmations ({0}) <= "
+                "window ({1})".format(confirmations, window))
+        self.confirmations = confirmations
+        self.window = window
+        self.dwell_time = dwell_time
+        self.clock = clock
+        self._lock = Lock()
+        self._components = {}
+        self.forwarded = 0
+        self.duplicates = 0
+        self.suppressed = Counter()
+
+    @property
+    def enabled(self):
+        return self.window > 1 or self.dwell_time > 0
+
+    def accept(self, component, status, report=None):
+        """ Registers a status report of a component
+            Args:
+                    component (string): name of the component.
+                    status (string): reported status, e.g. 'FALSE'.
+                    report: message of the report, returned by release()
+                            if the change is held back by the dwell time.
+            Returns:
+                    True if the status has to be applied to the KB
+        """
+        if not self.enabled:
+            self.forwarded += 1
+            return True
+        now = self.clock()
+        with self._lock:
+            state = self._components.get(component)
+            if state is None:
+                state = self._components[component] = \
+                    _ComponentState(self.window)
+            state.reports.append(status)
+            if state.pending is not None and state.reports.count(
+                    state.pending[0]) < self.confirmations:
+                state.pending = None
+            if status == state.status:
+                self.duplicates += 1
+                state.pending = None
+                return False
+            if state.reports.count(status) < self.confirmations:
+                self.suppressed[component] += 1
+                return False
+            if state.changed is not None and \
+                    now - state.changed < self.dwell_time:
+                self.suppressed[component] += 1
+                state.pending = (status, report)
+                return False
+            self._forward(state, status, now)
+            return True
+
+    def release(self):
+        """ Forwards the confirmed changes held back whose dwell time has
+            passed
+            Returns:
+                    list of the reports of the changes to apply to the KB
+        """
+        if not self.enabled:
+            return []
+        now = self.clock()
+        released = []
+        with self._lock:
+            for state in self._components.values():
+                if state.pending is None or \
+                        now - state.changed < self.dwell_time:
+                    continue
+                status, report = state.pending
+                self._forward(state, status, now)
+                released.append(report)
+        return released
+
+    def _forward(self, state, status, now):
+        state.status = status
+        state.changed = now
+        state.pending = None
+        self.forwarded += 1
+
+    def status(self, component):
+        """ Returns the last status forwarded for a component """
+        state = self._components.get(component)
+        return state.status if state is not None else None
+
+    def suppressed_transitions(self):
+        return sum(self.suppressed.values())
+
+    def reset(self):
+        with self._lock:
+            self._components = {}
+            self.forwarded = 0
+            self.duplicates = 0
+            self.suppressed = Counter()
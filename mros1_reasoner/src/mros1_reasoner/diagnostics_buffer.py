@@ -0,0 +1,69 @@
+###########################################
+#
+# DESCRIPTION:
+#  Staging buffer for the DiagnosticStatus messages received between two
+#  metacontrol cycles. Only the latest status is kept per QA (FG, QA type),
+#  per component and per binding, the buffer is flushed into the KB once
+#  per cycle.
+##########################################
+
+from threading import Lock
+
+
+def diagnostic_key(diagnostic_status):
+    """ Returns the key identifying what a DiagnosticStatus updates in the
+        KB, statuses with the same key overwrite each other.
+        None for unsupported messages.
+    """
+    if diagnostic_status.message == "QA status":
+        return (diagnostic_status.message, diagnostic_status.name,
+                diagnostic_status.values[0].key)
+    elif diagnostic_status.message == "Component status":
+        return (diagnostic_status.message, diagnostic_status.values[0].key)
+    elif diagnostic_status.message == "binding error":
+        return (diagnostic_status.message, diagnostic_status.name)
+    return None
+
+
+class DiagnosticsBuffer(object):
+    """Coalesces DiagnosticStatus messages until they are flushed."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._staged = {}
+        # number of statuses received and overwritten before being flushed,
+        # in total and for the last flush
+        self.received = 0
+        self.coalesced = 0
+        self.last_coalesced = 0
+        self._pending_coalesced = 0
+
+    def add(self, diagnostic_status):
+        """ Stages a DiagnosticStatus
+            Returns:
+                    False if the message is not supported (not staged)
+        """
+        key = diagnostic_key(diagnostic_status)
+        if key is None:
+            return False
+        with self._lock:
+            self.received += 1
+            if key in self._staged:
+                self.coalesced += 1
+                self._pending_coalesced += 1
+            self._staged[key] = diagnostic_status
+        return True
+
+    def flush(self):
+        """ Returns the staged statuses, in order of first arrival,
+            and empties the buffer
+        """
+        with self._lock:
+            staged = list(self._staged.values())
+            self._staged = {}
+            self.last_coalesced = self._pending_coalesced
+            self._pending_coalesced = 0
+        return staged
+
+    def __len__(self):
+        return len(self._staged)
@@ -0,0 +1,615 @@
+###########################################
+#
+# DESCRIPTION:
+#  Transport-agnostic metacontrol engine: KB initialization and the
+#  MAPE-K loop, without ROS. Transports (RosReasoner, LocalTransport) feed
+#  it with batches of DiagnosticStatus-like messages and execute the
+#  reconfigurations it decides.
+#
+#  Messages only need the fields of diagnostic_msgs/DiagnosticStatus used
+#  by the reasoner: level, name, message and values (list of key, value).
+##########################################
+
+from collections import deque, namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from threading import RLock
+import time
+
+from mros1_reasoner.reasoner import Reasoner
+from mros1_reasoner.kb_cache import load_snapshot, save_snapshot
+from mros1_reasoner.kb_journal import KBJournal, objective_state
+from mros1_reasoner.diagnostics_buffer import DiagnosticsBuffer
+from mros1_reasoner.component_debouncer import ComponentDebouncer
+from mros1_reasoner.metrics import Metrics
+from mros1_reasoner.status_reporter import StatusReporter
+from mros1_reasoner.tomasys import candidateFunctionDesigns
+from mros1_reasoner.tomasys import evaluateObjectives
+from mros1_reasoner.tomasys import loadKB_from_file
+from mros1_reasoner.tomasys import parent_objective
+
+# rospy logs through the 'rosout' logger: messages reach /rosout in a node
+logger = logging.getLogger('rosout')
+
+# Decision of the engine: ground configuration (FD name) for objectives
+Reconfiguration = namedtuple('Reconfiguration',
+                             ['configuration', 'objectives'])
+
+
+class MetacontrolEngine(object):
+    """Metacontrol loop over a Reasoner, independent of the transport.
+
+       step() applies a batch of diagnostics, reasons, evaluates the
+       objectives and plans the reconfigurations of all the objectives in
+       error. They are queued and executed one at a time by the transport:
+       next_reconfiguration() returns the next one to execute and
+       reconfiguration_done() reports its result.
+    """
+
+    def __init__(self, reasoner=None, clock=time.time):
+        super(MetacontrolEngine, self).__init__()
+        self.reasoner = reasoner if reasoner is not None else Reasoner()
+        # returns the current time in seconds, e.g. rospy.get_time
+        self.clock = clock
+
+        self.hasObjective = False
+
+        # name of the FD used to ground an UNGROUNDED objective
+        self.grounded_configuration = None
+
+        # Whether to stage diagnostics and apply them once per step
+        self.batch_diagnostics = True
+        self.diagnostics_buffer = DiagnosticsBuffer()
+
+        # Filters the flapping component statuses out before the KB
+        self.component_debouncer = ComponentDebouncer(clock=clock)
+
+        # Smooths the QA values observed before the KB, None to write the
+        # raw samples (see mros1_reasoner.qa_smoothing)
+        self.qa_smoother = None
+
+        # Reconfigurations planned and not executed yet, and the one in
+        # progress: (Reconfiguration, time it was requested). Both are
+        # guarded by reconfiguration_lock, as transports may report the
+        # results from another thread
+        self.reconfiguration_queue = deque()
+        self.pending_reconfiguration = None
+        self.reconfiguration_lock = RLock()
+        # Time (s) after which a reconfiguration in progress is dropped
+        self.reconfiguration_timeout = 30.0
+
+        # Logs the status changes of the KB (period: min time between logs)
+        self.status_reporter = StatusReporter(logger)
+
+        # Number of threads selecting the FDs of the objectives in error
+        self.planning_workers = 1
+        self._executor = None
+
+        # Latency of the loop sections, see mros1_reasoner.metrics
+        self.metrics = Metrics()
+
+        # Callable returning the QA predictions of the FDs (list of
+        # key, value), None if they are not available. It is called while
+        # planning, so it must not block (see prediction_cache)
+        self.qa_predictor = None
+
+    def read_ontology_file(self, ontology_file_name):
+        """ Checks if an ontology file exists and reads its value
+            Args:
+                    ontology_file_name (string): The name of the parameter.
+            Returns:
+                    The ontology if it's read correctly, None otherwise.
+        """
+        if ontology_file_name is not None:
+            ontology = loadKB_from_file(ontology_file_name)
+            if ontology is not None:
+                logger.info("Loaded ontology: " + str(ontology_file_name))
+            else:
+                logger.error("Failed to load ontology from: "
+                             + str(ontology_file_name))
+                return None
+        else:
+            logger.warning("No ontology file provided!")
+            return None
+        return ontology
+
+    def load_ontologies(self, tomasys_file_array, model_file,
+                        kb_cache_dir=None):
+        """ Loads the tomasys ontologies and the application model, from the
+            KB snapshot of these files in kb_cache_dir if there is one
+            Returns:
+                    True if the ontologies have been loaded
+        """
+        ontology_files = list(tomasys_file_array or []) + [model_file]
+        ontologies = None
+        if kb_cache_dir and None not in ontology_files:
+            ontologies = load_snapshot(kb_cache_dir, ontology_files)
+        if ontologies is not None:
+            for ontology_file in ontology_files:
+                logger.info("Loaded ontology: {0} (cached)"
+                            .format(ontology_file))
+            # imports are not stored in the snapshot
+            self.reasoner.tomasys = ontologies[0]
+            for ontology in ontologies[1:-1]:
+                self.reasoner.tomasys.imported_ontologies.append(ontology)
+            self.reasoner.onto = ontologies[-1]
+        else:
+            ontologies = []
+            # First read fixed ontologies (tomasys + MROS)
+            for tomasys_file in tomasys_file_array:
+                ontology = self.read_ontology_file(tomasys_file)
+                ontologies.append(ontology)
+                if self.reasoner.tomasys is None:
+                    # load ontology from file
+                    self.reasoner.tomasys = ontology
+                else:
+                    # Import additional ontology from files
+                    self.reasoner.tomasys.imported_ontologies.append(ontology)
+            # Load the application model (individuals of tomasys classes)
+            self.reasoner.onto = self.read_ontology_file(model_file)
+            ontologies.append(self.reasoner.onto)
+            if kb_cache_dir and None not in ontologies:
+                snapshot = save_snapshot(kb_cache_dir, ontology_files,
+                                         ontologies)
+                if snapshot is not None:
+                    logger.info("Saved KB snapshot: " + snapshot)
+        # Check if ontologies have been correctly loaded
+        if self.reasoner.tomasys is None or self.reasoner.onto is None:
+            logger.error("Error while reading ontology files!")
+            return False
+        self.reasoner.build_index()
+        return True
+
+    # Initializes the KB according to 2 cases:
+    # - If there are Objective individuals in the ontology file,
+    # the KB is initialized only using the OWL file, the objectives
+    # without FG are set to ungrounded
+    # - If there is no Objective individual,
+    # a navigation Objective is create in the KB,
+    # with associated NFR(s) with the given values
+    def initKB(self, nfr_safety_value=0.8):
+
+        logger.info('KB initialization:\n'
+                    + '\t - Supported QAs:\n'
+                    + '\t - for Function f_navigate:'
+                    + '/nfr_energy, /nfr_safety\n'
+                    + '\t - If an Objective instance is not found in the owl'
+                    + 'file, a default o_navigate is created.')
+
+        objectives = self.reasoner.search_objectives()
+
+        # if no objectives in the OWL file,
+        # standard navigation objective is assumed
+        if objectives == []:
+            logger.info('Creating Objective o_navigateA with default NFR(s)')
+
+            o_navigate = self.reasoner.get_new_tomasys_objective("o_navigateA",
+                                                                 "*f_navigate")
+
+            # Load NFR(s) in the KB
+            # nfr_energy = self.reasoner.get_new_tomasys_nrf("nfr_energy", "*energy", nfr_energy_value)  # noqa
+            nfr_safety = self.reasoner.get_new_tomasys_nrf("nfr_safety", "*safety", nfr_safety_value)  # noqa
+
+            # Link NFR(s) to objective
+            # o_navigate.hasNFR.append(nfr_energy)
+            o_navigate.hasNFR.append(nfr_safety)
+
+            # # Set objective to UnGrounded
+            o_navigate.o_status = "UNGROUNDED"
+            self.reasoner.record('objective', *objective_state(o_navigate))
+            logger.info('Objective created and set to ungrounded')
+
+        else:
+            for objective in objectives:
+                logger.info("Objective {}".format(objective.name)
+                            + " found, NFR(s) and initial FG are"
+                            + " generated from the OWL file")
+                if self.reasoner.onto.search_one(solvesO=objective) is None:
+                    objective.o_status = "UNGROUNDED"
+                    logger.info('Objective {} set to ungrounded'
+                                .format(objective.name))
+
+        self.reasoner.mark_kb_changed()
+        self.hasObjective = True
+
+    # Receives diagnostics, staged until the next step in batch mode
+    def add_diagnostics(self, statuses):
+        if self.reasoner.onto is None or self.hasObjective is not True:
+            return
+        for diagnostic_status in statuses:
+            if diagnostic_status.message == "Component status" and \
+                    diagnostic_status.values and \
+                    not self.component_debouncer.accept(
+                        diagnostic_status.values[0].key,
+                        diagnostic_status.values[0].value,
+                        diagnostic_status):
+                logger.debug("Component status of {0} suppressed: {1}"
+                             .format(diagnostic_status.values[0].key,
+                                     diagnostic_status.values[0].value))
+                continue
+            self.receive_diagnostic(diagnostic_status)
+
+    # Receives the component statuses held back by the debouncer whose
+    # dwell time has passed
+    def release_component_statuses(self):
+        for diagnostic_status in self.component_debouncer.release():
+            logger.debug("Component status of {0} released: {1}"
+                         .format(diagnostic_status.values[0].key,
+                                 diagnostic_status.values[0].value))
+            self.receive_diagnostic(diagnostic_status)
+
+    # Applies or stages a diagnostic accepted by the filters
+    def receive_diagnostic(self, diagnostic_status):
+        if diagnostic_status.message == "QA status" and \
+                self.qa_smoother is not None:
+            # every sample is smoothed, even if coalesced in the buffer
+            self.smooth_qa(diagnostic_status)
+        if not self.batch_diagnostics:
+            self.process_diagnostic_status(diagnostic_status)
+        elif not self.diagnostics_buffer.add(diagnostic_status):
+            logger.debug("Unsupported Message received: {}"
+                         .format(diagnostic_status.message))
+
+    def smooth_qa(self, diagnostic_status):
+        try:
+            return self.qa_smoother.observe(
+                diagnostic_status.name, diagnostic_status.values[0].key,
+                float(diagnostic_status.values[0].value))
+        except (IndexError, ValueError):
+            return None
+
+    # Returns the smoothed value of the QA in a 'QA status' diagnostic,
+    # None without smoothing
+    def smoothed_qa(self, diagnostic_status):
+        if self.qa_smoother is None or not diagnostic_status.values:
+            return None
+        return self.qa_smoother.value(diagnostic_status.name,
+                                      diagnostic_status.values[0].key)
+
+    # Applies the staged diagnostics to the KB taking the ontology lock once
+    def apply_diagnostics(self):
+        staged = self.diagnostics_buffer.flush()
+        if not staged:
+            return
+        with self.reasoner.ontology_lock:
+            for diagnostic_status in staged:
+                self.process_diagnostic_status(diagnostic_status)
+        logger.debug("Applied {0} diagnostics, {1} coalesced"
+                     .format(len(staged),
+                             self.diagnostics_buffer.last_coalesced))
+
+    # Updates the KB with a single DiagnosticStatus
+    def process_diagnostic_status(self, diagnostic_status):
+        # 2 types of diagnostics considered: about bindings in error
+        # TODO not implemented yet) or about QAs
+        if diagnostic_status.message == "binding error":
+            logger.info("binding error received")
+            up_binding = self.reasoner.updateBinding(diagnostic_status)
+            if up_binding == -1:
+                logger.warning("Unknown Function Grounding: %s",
+                               diagnostic_status.name)
+            elif up_binding == 0:
+                logger.warning("Diagnostics message received for %s "
+                               "with level %d , nothing done about it",
+                               diagnostic_status.name,
+                               diagnostic_status.level)
+
+        # Component error
+        elif diagnostic_status.message == "Component status":
+            up_cs = self.reasoner.updateComponentStatus(diagnostic_status)   # noqa
+            if up_cs == -1:
+                logger.warning("CS message refers to a FG not found in"
+                               + "The KB \n we assume it refers to the"
+                               + "current grounded_configuration \n"
+                               + "(1st fg found in the KB)")
+            elif up_cs == 1:
+                logger.info(
+                    "\n\nCS Message received!\tTYPE: {0}\tVALUE: {1}"
+                    .format(diagnostic_status.values[0].key,
+                            diagnostic_status.values[0].value))
+            else:
+                logger.debug("Unsupported CS Message received: %s ",
+                             str(diagnostic_status.values[0].key))
+
+        # QA Status update
+        elif diagnostic_status.message == "QA status":
+            up_qa = self.reasoner.updateQA(
+                diagnostic_status, self.smoothed_qa(diagnostic_status))
+            if up_qa == -1:
+                logger.warning("No FG found - Discarding QA message")
+            elif up_qa == 1:
+                logger.debug(
+                    "QA value received!\tTYPE: {0}\tVALUE: {1}"
+                    .format(diagnostic_status.values[0].key,
+                            diagnostic_status.values[0].value))
+            else:
+                logger.warning("Unsupported QA TYPE received: {}"
+                               .format(diagnostic_status.values[0].key))
+        else:
+            logger.debug("Unsupported Message received: {}"
+                         .format(diagnostic_status.message))
+
+    def next_reconfiguration(self):
+        """ Returns the next queued Reconfiguration to execute, None if
+            there are none or one is already in progress. It is pending
+            until reconfiguration_done() or its timeout.
+        """
+        with self.reconfiguration_lock:
+            if self.pending_reconfiguration is not None or \
+                    not self.reconfiguration_queue:
+                return None
+            reconfiguration = self.reconfiguration_queue.popleft()
+            self.pending_reconfiguration = (reconfiguration, self.clock())
+        logger.info('New Configuration requested: {0} (objectives: {1})'
+                    .format(reconfiguration.configuration,
+                            [o.name for o in reconfiguration.objectives]))
+        return reconfiguration
+
+    def requeue_reconfiguration(self):
+        """ Puts the pending reconfiguration back at the head of the queue,
+            e.g. when it could not be requested yet, so that
+            next_reconfiguration() returns it again
+        """
+        with self.reconfiguration_lock:
+            if self.pending_reconfiguration is None:
+                return
+            reconfiguration, _ = self.pending_reconfiguration
+            self.pending_reconfiguration = None
+            self.reconfiguration_queue.appendleft(reconfiguration)
+        logger.info('Configuration {} postponed'
+                    .format(reconfiguration.configuration))
+
+    def reconfiguration_done(self, success):
+        """ Updates the KB with the result of the pending reconfiguration
+            Returns:
+                    the name of the new grounded FD, None if it failed
+        """
+        with self.reconfiguration_lock:
+            if self.pending_reconfiguration is None:
+                return None
+            reconfiguration, start_time = self.pending_reconfiguration
+            self.pending_reconfiguration = None
+        self.metrics.observe('reconfiguration', self.clock() - start_time)
+        if not success:
+            logger.error("= RECONFIGURATION FAILED =")
+            return None
+        with self.reasoner.ontology_lock:
+            for objective in reconfiguration.objectives:
+                self.grounded_configuration = \
+                    self.reasoner.set_new_grounding(
+                        reconfiguration.configuration, objective)
+        logger.info('Reconfiguration to {} completed'
+                    .format(reconfiguration.configuration))
+        return self.grounded_configuration
+
+    def reconfiguration_timed_out(self):
+        """ Returns True, and drops the pending reconfiguration, when it
+            takes longer than the reconfiguration timeout
+        """
+        with self.reconfiguration_lock:
+            if self.pending_reconfiguration is None:
+                return False
+            reconfiguration, start_time = self.pending_reconfiguration
+            elapsed = self.clock() - start_time
+            if elapsed <= self.reconfiguration_timeout:
+                return False
+            self.pending_reconfiguration = None
+        logger.warning("Reconfiguration to {0} timed out after {1:.1f}s"
+                       " - Cancelling it"
+                       .format(reconfiguration.configuration, elapsed))
+        return True
+
+    # Returns True while reconfigurations are queued or in progress
+    def reconfiguration_in_progress(self):
+        with self.reconfiguration_lock:
+            pending = self.pending_reconfiguration
+            queued = len(self.reconfiguration_queue)
+        if pending is not None:
+            reconfiguration, start_time = pending
+            logger.info("Reconfiguration to {0} in progress ({1:.1f}s)"
+                        .format(reconfiguration.configuration,
+                                self.clock() - start_time))
+            return True
+        return queued > 0
+
+    # Requests the QA predictions of the FDs and updates their estimations
+    def update_qa_predictions(self):
+        if self.qa_predictor is None:
+            return
+        logger.info('  >> Request for QA updates **')
+        with self.metrics.timer('qa_predictions'):
+            values = self.qa_predictor()
+        if values is not None:
+            self.reasoner.updateQA_pred(values)
+
+    # main metacontrol loop
+    def step(self, statuses=()):
+        """ Runs one metacontrol (MAPE-K) cycle
+            Args:
+                    statuses: DiagnosticStatus messages received since the
+                              last step.
+            Returns:
+                    list of Reconfiguration planned (and queued)
+        """
+        with self.metrics.timer('cycle'):
+            reconfigurations = self._step(statuses)
+        journal = self.reasoner.journal
+        if journal is not None and journal.checkpoint_due():
+            with self.metrics.timer('checkpoint'):
+                journal.checkpoint(self.reasoner)
+        return reconfigurations
+
+    def open_journal(self, directory, checkpoint_interval=1000, fsync=False):
+        """ Restores the KB state saved in a journal directory, if any, and
+            journals the next KB mutations in it. Must be called once the
+            ontologies are loaded, before initKB
+            Returns:
+                    number of journal entries replayed
+        """
+        journal = KBJournal(directory, checkpoint_interval, fsync)
+        start = time.monotonic()
+        replayed = journal.restore(self.reasoner)
+        logger.info("KB state restored from {0} in {1:.1f} ms ({2} journal "
+                    "entries)".format(directory,
+                                      (time.monotonic() - start) * 1000.0,
+                                      replayed))
+        self.reasoner.journal = journal.open()
+        # compacts the restored state, the journal starts empty
+        journal.checkpoint(self.reasoner)
+        return replayed
+
+    def _step(self, statuses):
+        if self.reasoner.isInitialized is not True:
+            logger.info('Waiting to initialize Reasoner ')
+            return []
+        if self.hasObjective is not True:
+            logger.info('Waiting to initialize Objective ')
+            return []
+
+        # Apply diagnostics received since the last cycle (MAPE - Monitor)
+        self.add_diagnostics(statuses)
+        self.release_component_statuses()
+        with self.metrics.timer('diagnostics'):
+            self.apply_diagnostics()
+
+        # PRINT system status changes
+        self.status_reporter.report(self.reasoner.tomasys)
+
+        # EXEC REASONING to update ontology with inferences
+        with self.metrics.timer('reasoning'):
+            reasoning_ok = self.reasoner.perform_reasoning()
+        if not reasoning_ok:
+            logger.error("Reasoning error")
+            if self.reasoner.journal is not None:
+                logger.error("KB state saved in " +
+                             self.reasoner.journal.checkpoint(self.reasoner))
+            else:
+                self.reasoner.onto.save(file="error_reasoning.owl", format="rdfxml")  # noqa
+        logger.debug("Reasoning cycles - run: {runs}, skipped: {skips}"
+                     .format(**self.reasoner.reasoning_stats()))
+        for (name, prop), (old, new) in \
+                self.reasoner.last_status_changes.items():
+            logger.info("Inferred {0} of {1}: {2} -> {3}"
+                        .format(prop, name, old, new))
+
+        # EVALUATE functional hierarchy (objectives statuses) (MAPE - Analysis)
+        objectives_internal_error = evaluateObjectives(self.reasoner.search_objectives())  # noqa
+
+        # Keep monitoring, but do not plan while reconfiguring
+        if self.reconfiguration_in_progress():
+            return []
+
+        if not objectives_internal_error:
+            logger.info("No Objectives in status ERROR: no adaptation is needed")  # noqa
+            return []
+        for obj_in_error in objectives_internal_error:
+            logger.warning("Objective {0} in status {1}"
+                           .format(obj_in_error.name, obj_in_error.o_status))
+
+        self.update_qa_predictions()
+
+        # ADAPT MAPE -Plan & Execute
+        logger.info('\t>> Started MAPE-K ** PLAN adaptation **')
+
+        reconfigurations = self.plan(objectives_internal_error)
+        if not reconfigurations:
+            return []
+
+        # request new configurations
+        logger.info('  >> Started MAPE-K ** EXECUTION **')
+        with self.reconfiguration_lock:
+            self.reconfiguration_queue.extend(reconfigurations)
+        return reconfigurations
+
+    # Plans the reconfigurations of the objectives in error: the FD
+    # candidates are read from the KB, then the FDs of all the objectives
+    # are selected in parallel (selection only uses the FD index).
+    # Returns a list of Reconfiguration, objectives to be grounded with
+    # the same FD are combined in one
+    def plan(self, objectives):
+        new_grounded = OrderedDict()
+        problems = []
+        with self.reasoner.ontology_lock:
+            # Special cases
+
+            # Recover from failure in component.
+            if any(o.o_status in ["UPDATABLE"] for o in objectives):
+                logger.info("\t>> UPDATABLE objective - Clear Components status")  # noqa
+                for comp_inst in list(self.reasoner.tomasys.ComponentState.instances()):  # noqa
+                    if comp_inst.c_status == "RECOVERED":
+                        logger.info("Component {0} Status {1} - Setting to None"  # noqa
+                                    .format(comp_inst.name, comp_inst.c_status))  # noqa
+                        comp_inst.c_status = None
+                        self.reasoner.mark_kb_changed()
+                        self.reasoner.record('component', comp_inst.name,
+                                             None)
+
+            self.reasoner.fd_index.refresh(self.reasoner.tomasys)
+            # sub-objectives are regrounded with their parent objective
+            objectives = [o for o in objectives
+                          if not self.has_ancestor_in(o, objectives)]
+            for obj_in_error in objectives:
+                # Ungrounded objective
+                initial_fd = self.initial_function_design(obj_in_error)
+                if initial_fd is not None:
+                    logger.info("\t\t>>  Trying to set to initial FD {0}"
+                                .format(initial_fd))
+                    new_grounded[obj_in_error] = \
+                        self.reasoner.set_new_grounding(initial_fd,
+                                                        obj_in_error)
+                if new_grounded.get(obj_in_error):
+                    continue
+                # Search for a new configuration
+                logger.info("  >> Reasoner searches an FD for {}"
+                            .format(obj_in_error.name))
+                problems.append((obj_in_error, candidateFunctionDesigns(
+                    obj_in_error, self.reasoner.fd_index)))
+
+            # no update of the FD index while selecting
+            with self.metrics.timer('select'):
+                selected = self.map(self.select, problems)
+            for (obj_in_error, _), fd_name in zip(problems, selected):
+                new_grounded[obj_in_error] = fd_name
+
+        reconfigurations = OrderedDict()
+        for obj_in_error, fd_name in new_grounded.items():
+            if not fd_name:
+                logger.error("No FD found to solve Objective {} ".format(obj_in_error.name))  # noqa
+                continue
+            reconfigurations.setdefault(fd_name, []).append(obj_in_error)
+        return [Reconfiguration(fd_name, objectives)
+                for fd_name, objectives in reconfigurations.items()]
+
+    def has_ancestor_in(self, objective, objectives):
+        parent = parent_objective(objective, self.reasoner.onto)
+        while parent is not None:
+            if parent in objectives:
+                return True
+            parent = parent_objective(parent, self.reasoner.onto)
+        return False
+
+    # Returns the initial FD (desired configuration) if the objective is
+    # ungrounded and the FD solves its function
+    def initial_function_design(self, objective):
+        if objective.o_status not in ["UNGROUNDED"] or \
+                self.grounded_configuration is None:
+            return None
+        logger.info("\t>>  UNGROUNDED objective {}".format(objective.name))
+        fd = self.reasoner.lookup(self.grounded_configuration)
+        if fd is None or fd.solvesF != objective.typeF:
+            return None
+        return self.grounded_configuration
+
+    def select(self, problem):
+        objective, candidates = problem
+        return self.reasoner.select_function_design(objective.name,
+                                                    candidates)
+
+    # Applies function to all the items, on the planning worker pool
+    # when there are several workers
+    def map(self, function, items):
+        if self.planning_workers <= 1 or len(items) <= 1:
+            return [function(item) for item in items]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.planning_workers)
+        return list(self._executor.map(function, items))
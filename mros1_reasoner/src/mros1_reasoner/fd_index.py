@@ -0,0 +1,204 @@
+###########################################
+#
+# DESCRIPTION:
+#  Matrix of QA estimations (FunctionDesign x QA type) and
+#  Function -> FunctionDesign index, used to select FDs with array
+#  operations instead of walking the hasQAestimation lists.
+#  It also keeps, per Function, the Pareto front (skyline) of the FDs
+#  according to their QA estimations.
+##########################################
+
+import numpy as np
+
+from mros1_reasoner.kb_index import entity_name
+from mros1_reasoner.utility import dominates, dominated, pareto_front
+from mros1_reasoner.utility import utility_directions
+
+
+# Whether higher (1.0) or lower (-1.0) estimations of a QA type are better.
+# QA types not listed are lower is better, as NFR values are upper bounds
+DEFAULT_QA_DIRECTIONS = {'performance': 1.0}
+
+
+class FunctionDesignIndex(object):
+    """QA estimations of the FunctionDesigns in the KB as a numpy matrix.
+
+       Missing estimations are NaN. The index is built lazily from the KB
+       and kept up to date with update(), it must be invalidated when
+       FunctionDesigns are created or destroyed.
+
+       For each FD it keeps the number of FDs solving the same Function
+       that dominate it (better or equal in all QA types according to
+       qa_directions, better in one), those with none are on the Pareto
+       front. With pareto_pruning, only the front is considered to select
+       FDs with a utility whose preferred directions (see
+       utility.utility_directions) agree with qa_directions, pruning is
+       skipped for the others.
+    """
+
+    def __init__(self, qa_directions=None, pareto_pruning=True):
+        self.qa_directions = dict(DEFAULT_QA_DIRECTIONS)
+        self.qa_directions.update(qa_directions or {})
+        self.pareto_pruning = pareto_pruning
+        self.fds = []
+        # fd names by row, read once so FDs can be selected without the KB
+        self.names = []
+        self.qa_types = []
+        # fd name -> row, qa type name -> column
+        self.rows = {}
+        self.columns = {}
+        # function name -> array with the rows of the fds solving it
+        self.by_function = {}
+        # row -> function name
+        self.function_of = {}
+        # row -> number of fds of the same function that dominate it
+        self.dominator_counts = np.zeros(0, dtype=int)
+        # (row, column) -> QAvalue individual holding the estimation
+        self.qa_values = {}
+        self.estimations = np.empty((0, 0))
+        self.stale = True
+        # number of builds, rows are only comparable in the same generation
+        self.generation = 0
+
+    def invalidate(self):
+        self.stale = True
+
+    def build(self, tbox):
+        """ Reads all FunctionDesigns and their QA estimations from the KB
+            Args:
+                    tbox (ontology): ontology holding the tomasys Tbox.
+        """
+        self.generation += 1
+        self.fds = list(tbox.FunctionDesign.instances())
+        self.names = [fd.name for fd in self.fds]
+        self.rows = dict((name, row) for row, name in enumerate(self.names))
+        self.columns = {}
+        self.qa_values = {}
+        cells = []
+        by_function = {}
+        self.function_of = {}
+        for row, fd in enumerate(self.fds):
+            if fd.solvesF is not None:
+                by_function.setdefault(fd.solvesF.name, []).append(row)
+                self.function_of[row] = fd.solvesF.name
+            for qa in fd.hasQAestimation:
+                column = self.columns.setdefault(
+                    entity_name(qa.isQAtype), len(self.columns))
+                self.qa_values[(row, column)] = qa
+                cells.append((row, column, qa.hasValue))
+        self.qa_types = sorted(self.columns, key=self.columns.get)
+        self.by_function = dict((f, np.array(rows, dtype=int))
+                                for f, rows in by_function.items())
+        self.estimations = np.full((len(self.fds), len(self.columns)), np.nan)
+        for row, column, value in cells:
+            if value is not None:
+                self.estimations[row, column] = value
+        self.dominator_counts = np.zeros(len(self.fds), dtype=int)
+        for rows in self.by_function.values():
+            signed = self.signed(rows)
+            for i, row in enumerate(rows):
+                self.dominator_counts[row] = \
+                    dominates(signed, signed[i]).sum()
+        self.stale = False
+
+    def refresh(self, tbox):
+        if self.stale:
+            self.build(tbox)
+
+    def update(self, fd, qa_type, value):
+        """ Updates a single estimation, e.g. after import_qa_estimations
+            Returns:
+                    False if the fd or the qa type are not in the index
+        """
+        row = self.rows.get(fd.name)
+        column = self.columns.get(entity_name(qa_type))
+        if self.stale or row is None or column is None:
+            return False
+        signs = self.directions()
+        old = self.estimations[row] * signs
+        self.estimations[row, column] = value
+        function = self.function_of.get(row)
+        if function is not None:
+            # update the dominance relations of the changed fd only
+            rows = self.by_function[function]
+            signed = self.signed(rows)
+            new = self.estimations[row] * signs
+            self.dominator_counts[rows] -= dominated(signed, old)
+            self.dominator_counts[rows] += dominated(signed, new)
+            self.dominator_counts[row] = dominates(signed, new).sum()
+        return True
+
+    def directions(self):
+        """ Array with the direction of each QA type column """
+        return np.array([float(self.qa_directions.get(qa, -1.0))
+                         for qa in self.qa_types])
+
+    def signed(self, rows):
+        """ Estimations of the given rows, multiplied by the QA directions
+            so that higher values are always better
+        """
+        return self.estimations[rows] * self.directions()
+
+    def front(self, rows):
+        """ Boolean mask over rows of the FDs on the Pareto front """
+        return self.dominator_counts[rows] == 0
+
+    def prunable(self, utility_config):
+        """ Whether the FDs dominated according to qa_directions can be
+            discarded when selecting with a utility configuration: its
+            preferred directions must be known and agree with them
+        """
+        if not self.pareto_pruning:
+            return False
+        directions = utility_directions(utility_config)
+        if directions is None:
+            return False
+        return all(self.qa_directions.get(qa_type, -1.0) == direction
+                   for qa_type, direction in directions.items())
+
+    def prune_dominated(self, rows, suitable, nfrs):
+        """ Discards the FDs that cannot be the best candidate, because they
+            are dominated by another suitable FD meeting the NFRs
+            Args:
+                    rows: rows of the FDs solving a Function.
+                    suitable: boolean mask over rows of the FDs that can
+                              be selected (realisable, not in error log).
+                    nfrs: NFRs of the objective, (QA type name, value).
+            Returns:
+                    (rows, suitable) restricted to the remaining FDs
+        """
+        front = self.front(rows)
+        minimized = all(self.qa_directions.get(qa_type, -1.0) < 0
+                        for qa_type, _ in nfrs)
+        if minimized and not (front & ~suitable).any():
+            # an FD dominated by an FD meeting the NFRs meets them too,
+            # so the precomputed front is enough
+            return rows[front], suitable[front]
+        # some FDs of the front cannot be selected: front of the rest
+        feasible = rows[suitable & self.meet_nfrs(rows, nfrs)]
+        feasible = feasible[pareto_front(self.signed(feasible))]
+        return feasible, np.ones(len(feasible), dtype=bool)
+
+    def column(self, qa_type):
+        """ Returns the column index of a QA type, None if not estimated """
+        return self.columns.get(entity_name(qa_type))
+
+    def function_rows(self, function):
+        """ Returns the rows of the FDs that solve a given Function """
+        return self.by_function.get(function.name,
+                                    np.empty(0, dtype=int))
+
+    def meet_nfrs(self, rows, nfrs):
+        """ Boolean mask over rows of the FDs whose QA estimations meet
+            all the NFRs (the estimation is lower than the NFR value)
+            Args:
+                    nfrs: list of (QA type name, NFR value).
+        """
+        mask = np.ones(len(rows), dtype=bool)
+        for qa_type, value in nfrs:
+            column = self.column(qa_type)
+            if column is None:
+                return np.zeros(len(rows), dtype=bool)
+            with np.errstate(invalid='ignore'):
+                mask &= self.estimations[rows, column] < value
+        return mask
@@ -0,0 +1,124 @@
+###########################################
+#
+# DESCRIPTION:
+#  Start-up cache of the KB: the world loaded from the ontology files is
+#  stored as an owlready2 SQLite quadstore, keyed on the content hashes of
+#  the files, and reopened on later starts instead of parsing them again.
+#  The files can be given as paths, file:// or package:// URIs.
+##########################################
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+from owlready2 import default_world
+
+logger = logging.getLogger('rosout')
+
+
+def resolve_path(file_name):
+    """ Returns the path of an ontology file given as a path, a file:// URI
+        or a package:// URI (resolved with rospkg), None if it cannot be
+        resolved
+    """
+    if file_name.startswith('file://'):
+        return file_name[len('file://'):]
+    if file_name.startswith('package://'):
+        package, _, path = file_name[len('package://'):].partition('/')
+        try:
+            import rospkg
+            return os.path.join(rospkg.RosPack().get_path(package), path)
+        except Exception as e:
+            logger.warning("Cannot resolve {0}: {1}".format(file_name, e))
+            return None
+    return file_name
+
+
+def snapshot_key(files):
+    """ Hash of the contents of the given files, in order
+        Returns:
+                hex digest, None if a file cannot be read
+    """
+    digest = hashlib.sha256()
+    for file_name in files:
+        path = resolve_path(file_name)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        except (IOError, OSError) as e:
+            logger.warning("Cannot read {0} to key the KB snapshot: {1}"
+                           .format(file_name, e))
+            return None
+    return digest.hexdigest()
+
+
+def snapshot_paths(cache_dir, key):
+    """ Returns the (quadstore, metadata) file paths of a snapshot """
+    base = os.path.join(cache_dir, key)
+    return base + '.sqlite3', base + '.json'
+
+
+def load_snapshot(cache_dir, files, world=default_world):
+    """ Reopens the snapshot of the ontologies loaded from files
+        Args:
+                cache_dir (string): directory holding the snapshots.
+                files (list): ontology files, in loading order.
+                world (World): empty owlready2 world to load the snapshot in.
+        Returns:
+                list with the ontology of each file, None if there is no
+                valid snapshot for the current contents of the files.
+    """
+    if len(world.graph) > 0:
+        logger.warning("KB cache bypassed: the world is not empty")
+        return None
+    key = snapshot_key(files)
+    if key is None:
+        logger.warning("KB cache bypassed: the ontologies are loaded from "
+                       "the files")
+        return None
+    quadstore, metadata = snapshot_paths(cache_dir, key)
+    if not (os.path.isfile(quadstore) and os.path.isfile(metadata)):
+        return None
+    try:
+        with open(metadata) as f:
+            base_iris = json.load(f)['ontologies']
+        # open the snapshot and copy it in memory, so that the changes done
+        # to the KB at runtime are not written in the cache
+        world.set_backend(filename=quadstore)
+        world.set_backend(filename=':memory:')
+    except Exception as e:
+        logging.exception("{0}".format(e))
+        return None
+    return [world.get_ontology(base_iri) for base_iri in base_iris]
+
+
+def save_snapshot(cache_dir, files, ontologies, world=default_world):
+    """ Stores the world holding the ontologies loaded from files
+        Returns:
+                path of the snapshot, None if it could not be written
+    """
+    key = snapshot_key(files)
+    if key is None:
+        logger.warning("KB snapshot not saved")
+        return None
+    quadstore, metadata = snapshot_paths(cache_dir, key)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        world.graph.commit()
+        tmp_file = quadstore + '.tmp'
+        destination = sqlite3.connect(tmp_file)
+        world.graph.db.backup(destination)
+        destination.close()
+        os.rename(tmp_file, quadstore)
+        with open(metadata, 'w') as f:
+            json.dump({'files': list(files),
+                       'ontologies': [o.base_iri for o in ontologies]}, f)
+    except Exception as e:
+        logging.exception("{0}".format(e))
+        return None
+    return quadstore
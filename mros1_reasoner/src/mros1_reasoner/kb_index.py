@@ -0,0 +1,150 @@
+###########################################
+#
+# DESCRIPTION:
+#  Name -> entity index of the individuals in a KB, replacing the
+#  wildcard IRI searches (search_one(iri="*name")) in the hot path.
+##########################################
+
+
+def entity_name(entity):
+    """ Name of an entity from its string representation, to compare
+        entities whose ontologies are named differently
+    """
+    return str(entity).split('.')[-1]
+
+
+def component_names(component):
+    """ Names a component can be referred to by the roleDef of a role: its
+        own name and those of its types, as in the tomasys models the
+        roles are defined by a component class (typeC of the
+        ComponentState, or its OWL class)
+    """
+    names = [component.name]
+    types = getattr(component, 'typeC', None)
+    if types is None:
+        types = []
+    elif not isinstance(types, list):
+        types = [types]
+    types = types + [c for c in component.is_a
+                     if hasattr(c, 'instances') and
+                     c.name != 'ComponentState']
+    for component_type in types:
+        if component_type.name not in names:
+            names.append(component_type.name)
+    return names
+
+
+class NameIndex(object):
+    """Index of the individuals of an owlready2 world by name.
+
+       The index is built once from the world and must be kept coherent
+       with add() and remove() when individuals are created or destroyed.
+       Names not in the index fall back to a wildcard IRI search, whose
+       result is cached.
+    """
+
+    def __init__(self):
+        self.world = None
+        self._entities = {}
+        # names already searched without result, cleared when the KB grows
+        self._misses = set()
+
+    def build(self, world):
+        """ (Re)builds the index with all the individuals of a world
+            Args:
+                    world (World): owlready2 world holding the KB.
+        """
+        self.world = world
+        self._entities = {}
+        self._misses = set()
+        for individual in world.individuals():
+            self._entities.setdefault(individual.name, individual)
+
+    def get(self, name):
+        """ Returns the entity with a given name
+            Args:
+                    name (string): entity name, a leading '*' as used in
+                                   IRI searches is ignored.
+            Returns:
+                    The entity, None if it is not in the KB.
+        """
+        name = str(name).lstrip('*')
+        entity = self._entities.get(name)
+        if entity is not None or self.world is None or name in self._misses:
+            return entity
+        entity = self.world.search_one(iri="*{}".format(name))
+        if entity is None:
+            self._misses.add(name)
+        else:
+            self._entities[name] = entity
+        return entity
+
+    def add(self, entity):
+        if entity is not None:
+            self._entities[entity.name] = entity
+            self._misses.clear()
+
+    def remove(self, entity):
+        if entity is not None and \
+                self._entities.get(entity.name) is entity:
+            del self._entities[entity.name]
+
+    def __len__(self):
+        return len(self._entities)
+
+
+class ComponentIndex(object):
+    """Component -> FunctionDesigns requiring it (through their roles),
+       so a change in a component only invalidates its dependent FDs. The
+       roles are indexed by the name of their roleDef, matched against the
+       names of a component and of its types (see component_names).
+
+       The index is built lazily from the KB, it must be invalidated when
+       FunctionDesigns or roles are created or destroyed.
+    """
+
+    def __init__(self):
+        # component name -> list of FD individuals
+        self.dependents = {}
+        # whether the model declares any component of any FD
+        self.has_dependencies = False
+        self.stale = True
+
+    def invalidate(self):
+        self.stale = True
+
+    def build(self, tbox):
+        """ Reads the components required by the roles of each FD
+            Args:
+                    tbox (ontology): ontology holding the tomasys Tbox.
+        """
+        self.dependents = {}
+        for fd in tbox.FunctionDesign.instances():
+            for role in getattr(fd, 'roles', []):
+                component = getattr(role, 'roleDef', None)
+                if component is not None:
+                    fds = self.dependents.setdefault(component.name, [])
+                    if fd not in fds:
+                        fds.append(fd)
+        self.has_dependencies = bool(self.dependents)
+        self.stale = False
+
+    def refresh(self, tbox):
+        if self.stale:
+            self.build(tbox)
+
+    def dependent_fds(self, component):
+        """ Returns the FDs requiring a component, None if the model has no
+            dependency information or no role refers to the component (then
+            any FD may depend on it)
+        """
+        if not self.has_dependencies:
+            return None
+        fds = None
+        for name in component_names(component):
+            for fd in self.dependents.get(name, []):
+                if fds is None:
+                    fds = []
+                if fd not in fds:
+                    fds.append(fd)
+        return fds
@@ -0,0 +1,274 @@
+###########################################
+#
+# DESCRIPTION:
+#  Append-only journal of the A-box mutations of the metacontrol loop (QA
+#  values and estimations, component statuses, objectives and groundings)
+#  with periodic compact checkpoints of the live state, to restore it
+#  after a restart by replaying the checkpoint and the journal entries
+#  written after it, instead of saving the whole KB as RDF/XML.
+#
+#  Files in the journal directory:
+#   - checkpoint.json: live state, and seq of the last entry it includes
+#   - journal.jsonl: one JSON entry per line {seq, time, op, args}
+#  Inferred facts (statuses of FGs, FD realisability) are not journaled,
+#  they are inferred again by the next reasoning cycle.
+##########################################
+
+from collections import deque
+import json
+import logging
+import os
+from threading import Lock
+import time
+
+from mros1_reasoner.kb_index import entity_name
+from mros1_reasoner.qa_table import import_qa_estimations
+from mros1_reasoner.tomasys import parent_objective, updateQAvalue
+
+logger = logging.getLogger('rosout')
+
+CHECKPOINT_FILE = 'checkpoint.json'
+JOURNAL_FILE = 'journal.jsonl'
+
+
+def _name(entity):
+    return entity.name if entity is not None else None
+
+
+def objective_state(objective):
+    """ Returns [name, function name, [[nfr name, qa type name, value]],
+        status] of an objective
+    """
+    return [objective.name, _name(objective.typeF),
+            [[nfr.name, entity_name(nfr.isQAtype), nfr.hasValue]
+             for nfr in objective.hasNFR],
+            objective.o_status]
+
+
+def capture_state(reasoner):
+    """ Reads the live state of the KB (see KBJournal.checkpoint)
+        Returns:
+                dict, serializable as JSON
+    """
+    tbox, abox = reasoner.tomasys, reasoner.onto
+    roots = [o for o in tbox.Objective.instances()
+             if parent_objective(o, abox) is None]
+    # groundings of the objectives, parents before their sub-objectives
+    groundings = []
+    pending = deque(roots)
+    while pending:
+        objective = pending.popleft()
+        fg = abox.search_one(solvesO=objective)
+        if fg is None or fg.typeFD is None:
+            continue
+        groundings.append([objective.name, fg.typeFD.name])
+        pending.extend(getattr(fg, 'needsO', []))
+    fd_index = reasoner.fd_index
+    fd_index.refresh(tbox)
+    estimations = [[fd_index.names[row], fd_index.qa_types[column],
+                    qa.hasValue]
+                   for (row, column), qa in sorted(fd_index.qa_values.items())
+                   if qa.hasValue is not None]
+    return {
+        'objectives': [objective_state(o) for o in roots],
+        'groundings': groundings,
+        'components': [[c.name, c.c_status]
+                       for c in tbox.ComponentState.instances()
+                       if c.c_status is not None],
+        'qa_values': [[fg.name, entity_name(qa.isQAtype), qa.hasValue]
+                      for fg in tbox.FunctionGrounding.instances()
+                      for qa in fg.hasQAvalue],
+        'estimations': estimations,
+    }
+
+
+def apply_objective(reasoner, name, function, nfrs, status):
+    objective = reasoner.lookup(name)
+    if not isinstance(objective, reasoner.tomasys.Objective):
+        objective = reasoner.get_new_tomasys_objective(name, function)
+    for nfr_name, qa_type, value in nfrs:
+        nfr = reasoner.lookup(nfr_name)
+        if nfr is None:
+            nfr = reasoner.get_new_tomasys_nrf(nfr_name, qa_type, value)
+        else:
+            nfr.hasValue = value
+        if nfr not in objective.hasNFR:
+            objective.hasNFR.append(nfr)
+    objective.o_status = status
+
+
+def apply_grounding(reasoner, objective_name, fd_name):
+    objective = reasoner.lookup(objective_name)
+    if objective is not None:
+        reasoner.set_new_grounding(fd_name, objective)
+
+
+def apply_component(reasoner, name, status):
+    component = reasoner.lookup(name)
+    if component is not None:
+        component.c_status = status
+
+
+def apply_qa_value(reasoner, fg_name, qa_type, value):
+    fg = reasoner.lookup(fg_name)
+    qa_type = reasoner.lookup(qa_type)
+    if fg is not None and qa_type is not None:
+        updateQAvalue(fg, qa_type, value, reasoner.tomasys, reasoner.onto)
+
+
+def apply_estimations(reasoner, estimations):
+    import_qa_estimations(reasoner, estimations, create=False)
+
+
+def apply_objective_removed(reasoner, name):
+    reasoner.remove_objective(name)
+
+
+# op -> function applying an entry, called with the reasoner and its args
+OPERATIONS = {
+    'objective': apply_objective,
+    'objective_removed': apply_objective_removed,
+    'grounding': apply_grounding,
+    'component': apply_component,
+    'qa_value': apply_qa_value,
+    'estimations': apply_estimations,
+}
+
+
+def apply_state(reasoner, state):
+    """ Applies a state read by capture_state to the KB """
+    estimations = {}
+    for fd_name, qa_type, value in state.get('estimations', []):
+        estimations.setdefault(fd_name, []).append((qa_type, value))
+    apply_estimations(reasoner, estimations.items())
+    for objective in state.get('objectives', []):
+        apply_objective(reasoner, *objective)
+    for grounding in state.get('groundings', []):
+        apply_grounding(reasoner, *grounding)
+    for component in state.get('components', []):
+        apply_component(reasoner, *component)
+    for qa_value in state.get('qa_values', []):
+        apply_qa_value(reasoner, *qa_value)
+
+
+class KBJournal(object):
+    """Journal of the KB mutations in a directory.
+
+       Args:
+               directory: directory of the checkpoint and journal files.
+               checkpoint_interval: number of entries after which
+                                    checkpoint_due() is True, 0 never.
+               fsync: whether to sync the journal file after each entry
+                      (durable across power losses, slower).
+    """
+
+    def __init__(self, directory, checkpoint_interval=1000, fsync=False):
+        self.directory = directory
+        self.checkpoint_interval = checkpoint_interval
+        self.fsync = fsync
+        self.seq = 0
+        self.entries_since_checkpoint = 0
+        self._lock = Lock()
+        self._file = None
+
+    @property
+    def checkpoint_file(self):
+        return os.path.join(self.directory, CHECKPOINT_FILE)
+
+    @property
+    def journal_file(self):
+        return os.path.join(self.directory, JOURNAL_FILE)
+
+    def open(self):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self._file = open(self.journal_file, 'a')
+        return self
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def append(self, op, *args):
+        """ Appends an entry, op being a key of OPERATIONS """
+        with self._lock:
+            if self._file is None:
+                return
+            self.seq += 1
+            self.entries_since_checkpoint += 1
+            self._file.write(json.dumps({'seq': self.seq,
+                                         'time': time.time(),
+                                         'op': op, 'args': args}) + '\n')
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def checkpoint_due(self):
+        return 0 < self.checkpoint_interval <= self.entries_since_checkpoint
+
+    def checkpoint(self, reasoner):
+        """ Writes the live state of the KB and truncates the journal
+            Returns:
+                    path of the checkpoint file
+        """
+        with reasoner.ontology_lock, self._lock:
+            state = capture_state(reasoner)
+            tmp_file = self.checkpoint_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump({'seq': self.seq, 'time': time.time(),
+                           'state': state}, f)
+            os.rename(tmp_file, self.checkpoint_file)
+            # entries up to seq are in the checkpoint
+            if self._file is not None:
+                self._file.close()
+                self._file = open(self.journal_file, 'w')
+            self.entries_since_checkpoint = 0
+        return self.checkpoint_file
+
+    def restore(self, reasoner):
+        """ Applies the checkpoint and the later journal entries to the KB,
+            without journaling them again. The journal is then opened to
+            append the next entries
+            Returns:
+                    number of journal entries replayed
+        """
+        journal, reasoner.journal = reasoner.journal, None
+        replayed = 0
+        try:
+            with reasoner.ontology_lock:
+                if os.path.isfile(self.checkpoint_file):
+                    with open(self.checkpoint_file) as f:
+                        checkpoint = json.load(f)
+                    self.seq = checkpoint['seq']
+                    apply_state(reasoner, checkpoint['state'])
+                for entry in self.read_entries():
+                    if entry['seq'] <= self.seq:
+                        continue
+                    operation = OPERATIONS.get(entry['op'])
+                    if operation is not None:
+                        operation(reasoner, *entry['args'])
+                    self.seq = entry['seq']
+                    replayed += 1
+            reasoner.mark_kb_changed()
+        finally:
+            reasoner.journal = journal
+        self.entries_since_checkpoint = replayed
+        return replayed
+
+    def read_entries(self):
+        """ Returns the journal entries, up to the first one truncated
+            (e.g. by a crash while writing it)
+        """
+        entries = []
+        if not os.path.isfile(self.journal_file):
+            return entries
+        with open(self.journal_file) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Journal truncated after entry {}"
+                                   .format(self.seq + len(entries)))
+                    break
+        return entries
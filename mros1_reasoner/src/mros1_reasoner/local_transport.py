@@ -0,0 +1,80 @@
+###########################################
+#
+# DESCRIPTION:
+#  In-memory stand-in for the ROS interfaces of the reasoner (/diagnostics
+#  and the reconfiguration action), to run a MetacontrolEngine in-process:
+#  tests, simulators and batch runs of adaptation scenarios.
+##########################################
+
+from collections import deque, namedtuple
+
+# Fields of diagnostic_msgs/DiagnosticStatus and KeyValue used by the engine
+DiagnosticStatus = namedtuple('DiagnosticStatus',
+                              ['level', 'name', 'message', 'values'])
+KeyValue = namedtuple('KeyValue', ['key', 'value'])
+
+
+def qa_status(fg_name, qa_type, value):
+    """ Returns a 'QA status' message with a QA observation of an FG """
+    return DiagnosticStatus(0, fg_name, 'QA status',
+                            [KeyValue(qa_type, str(value))])
+
+
+def component_status(component, value):
+    """ Returns a 'Component status' message, value being e.g. 'FALSE' or
+        'RECOVERED'
+    """
+    return DiagnosticStatus(0, 'local_transport', 'Component status',
+                            [KeyValue(component, str(value))])
+
+
+def binding_error(fg_name, level=2):
+    """ Returns a 'binding error' message for an FG """
+    return DiagnosticStatus(level, fg_name, 'binding error', [])
+
+
+class LocalTransport(object):
+    """Delivers published diagnostics to an engine and executes its
+       reconfigurations synchronously.
+
+       reconfigure is called with the name of each configuration requested
+       and returns whether the reconfiguration succeeded (always by
+       default).
+    """
+
+    def __init__(self, engine, reconfigure=None):
+        self.engine = engine
+        self.reconfigure = reconfigure or (lambda configuration: True)
+        # published diagnostics, delivered in the next spin_once
+        self.diagnostics = deque()
+        # (configuration, objective names, success) of the reconfigurations
+        self.reconfigurations = []
+
+    def publish(self, *statuses):
+        self.diagnostics.extend(statuses)
+
+    def spin_once(self):
+        """ Runs one engine step with the diagnostics published since the
+            last one and executes the reconfigurations it planned
+            Returns:
+                    list of Reconfiguration planned by the engine
+        """
+        statuses = list(self.diagnostics)
+        self.diagnostics.clear()
+        decisions = self.engine.step(statuses)
+        reconfiguration = self.engine.next_reconfiguration()
+        while reconfiguration is not None:
+            success = bool(self.reconfigure(reconfiguration.configuration))
+            self.engine.reconfiguration_done(success)
+            self.reconfigurations.append(
+                (reconfiguration.configuration,
+                 [o.name for o in reconfiguration.objectives], success))
+            reconfiguration = self.engine.next_reconfiguration()
+        return decisions
+
+    def spin(self, cycles):
+        """ Runs a number of engine steps
+            Returns:
+                    total number of reconfigurations decided
+        """
+        return sum(len(self.spin_once()) for _ in range(cycles))
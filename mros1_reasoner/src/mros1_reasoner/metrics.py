@@ -0,0 +1,142 @@
+###########################################
+#
+# DESCRIPTION:
+#  Latency metrics of the metacontrol loop: monotonic timers aggregated in
+#  histograms, summarized periodically (published as a DiagnosticArray by
+#  RosReasoner or appended to a file). Disabled metrics cost a single
+#  attribute check per timed section.
+##########################################
+
+from bisect import bisect_left
+import json
+import time
+
+# Upper bounds (s) of the histogram buckets: 0.1 ms to ~26 s
+DEFAULT_BOUNDS = [0.0001 * 2 ** i for i in range(19)]
+
+
+class Histogram(object):
+    """Distribution of durations in exponential buckets."""
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = list(bounds)
+        self.reset()
+
+    def reset(self):
+        # one more bucket for the values above the last bound
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """ Returns an upper bound of the q-th percentile (0-100), the bound
+            of the bucket it falls in
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        accumulated = 0
+        for bucket, count in enumerate(self.buckets):
+            accumulated += count
+            if accumulated >= rank and count > 0:
+                if bucket == len(self.bounds):
+                    return self.max
+                return min(self.bounds[bucket], self.max)
+        return self.max
+
+    def summary(self):
+        """ Returns the count and mean, p50, p95 and max in ms """
+        mean = self.total / self.count if self.count else 0.0
+        return {'count': self.count,
+                'mean_ms': mean * 1000.0,
+                'p50_ms': self.percentile(50) * 1000.0,
+                'p95_ms': self.percentile(95) * 1000.0,
+                'max_ms': self.max * 1000.0}
+
+
+class _Timer(object):
+    """Context manager adding its duration to a histogram."""
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.monotonic() - self.start)
+        return False
+
+
+class _NullTimer(object):
+    """Timer used while metrics are disabled, does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics(object):
+    """Histograms of the durations of the metacontrol loop sections,
+       by name. Disabled by default.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def timer(self, name):
+        """ Returns a context manager timing a section:
+                with metrics.timer('reasoning'):
+                    ...
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.histogram(name))
+
+    def observe(self, name, seconds):
+        """ Adds a duration measured elsewhere, e.g. of an action """
+        if self.enabled:
+            self.histogram(name).observe(seconds)
+
+    def summary(self, reset=False):
+        """ Returns {name: histogram summary}, see Histogram.summary """
+        summary = dict((name, histogram.summary())
+                       for name, histogram in list(self.histograms.items()))
+        if reset:
+            for histogram in list(self.histograms.values()):
+                histogram.reset()
+        return summary
+
+    def write(self, file_name, summary=None):
+        """ Appends a summary (the current one by default) to a file, as a
+            JSON line with a timestamp
+        """
+        if summary is None:
+            summary = self.summary()
+        with open(file_name, 'a') as f:
+            f.write(json.dumps({'time': time.time(), 'metrics': summary},
+                               sort_keys=True) + '\n')
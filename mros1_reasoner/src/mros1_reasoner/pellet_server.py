@@ -0,0 +1,226 @@
+###########################################
+#
+# DESCRIPTION:
+#  Client of PelletServer.java, a Pellet reasoner running in a long-lived
+#  JVM: the KB is loaded once, then each reasoning cycle only sends the
+#  triples of the individuals modified since the previous one (tracked by
+#  ABoxChanges) and reads back the status values that changed, instead of
+#  starting a JVM and reloading the whole world as sync_reasoner_pellet
+#  does.
+##########################################
+
+import glob
+import logging
+import os
+import subprocess
+import tempfile
+
+import owlready2
+from owlready2 import OwlReadyInconsistentOntologyError
+
+from mros1_reasoner.abox_changes import ABoxChanges, ntriple
+
+logger = logging.getLogger('rosout')
+
+SERVER_SOURCE = os.path.join(os.path.dirname(__file__), 'PelletServer.java')
+
+
+def pellet_classpath():
+    """ Returns the classpath of the Pellet jars bundled with owlready2 """
+    pellet_dir = os.path.join(os.path.dirname(owlready2.__file__), 'pellet')
+    return os.pathsep.join([pellet_dir] + sorted(
+        glob.glob(os.path.join(pellet_dir, '*.jar'))))
+
+
+class PelletProcess(object):
+    """PelletServer JVM, driven through its standard input/output.
+
+       Args:
+               java: java executable (>= 11, for the source launcher).
+               memory: maximum heap size of the JVM (MB).
+    """
+
+    def __init__(self, java=None, memory=None):
+        self.java = java or owlready2.JAVA_EXE
+        self.memory = memory or owlready2.reasoning.JAVA_MEMORY
+        self.process = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [self.java, '-Xmx{}M'.format(self.memory),
+             '-cp', pellet_classpath(), SERVER_SOURCE],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            universal_newlines=True, encoding='utf-8')
+        return self
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.write('QUIT\n')
+            self.process.stdin.close()
+            self.process.wait(timeout=5.0)
+        except (IOError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.process = None
+
+    def request(self, command, argument=None, lines=None):
+        """ Sends a request and waits for its answer
+            Args:
+                    command (string): e.g. 'ADD'.
+                    argument (string): argument of the command, the number
+                                       of lines if lines is given.
+                    lines (list): lines following the request.
+            Returns:
+                    lines printed before 'OK'
+            Raises:
+                    OwlReadyInconsistentOntologyError: if the KB is
+                                                       inconsistent.
+                    RuntimeError: if the request failed or the process
+                                  exited.
+        """
+        if lines is not None:
+            argument = len(lines)
+        request = command if argument is None else \
+            '{0} {1}'.format(command, argument)
+        stdin, stdout = self.process.stdin, self.process.stdout
+        try:
+            stdin.write(request + '\n')
+            for line in lines or []:
+                stdin.write(line + '\n')
+            stdin.flush()
+        except IOError as err:
+            raise RuntimeError("Pellet server not running: {}".format(err))
+        output = []
+        while True:
+            line = stdout.readline()
+            if not line:
+                raise RuntimeError("Pellet server exited with code {}"
+                                   .format(self.process.poll()))
+            line = line.rstrip('\n')
+            if line == 'OK':
+                return output
+            if line == 'INCONSISTENT':
+                raise OwlReadyInconsistentOntologyError()
+            if line.startswith('ERROR'):
+                raise RuntimeError("Pellet server {0} failed: {1}"
+                                   .format(command, line[6:]))
+            output.append(line)
+
+
+class PelletServerSession(object):
+    """State of the KB loaded in a PelletProcess: the N-Triples of each
+       named subject sent, to compute the A-box deltas of the subjects
+       modified in the world.
+
+       Args:
+               tbox (ontology): ontology holding the tomasys Tbox, its world
+                                being the KB.
+               process: started PelletProcess.
+    """
+
+    def __init__(self, tbox, process):
+        self.world = tbox.world
+        self.process = process
+        self._unabbreviate = self.world._unabbreviate
+        # storid -> set of N-Triples lines of the subject sent to the
+        # server, keyed by storid as destroyed entities lose their IRI
+        self.sent = {}
+        self.changes = ABoxChanges(self.world, tbox)
+        try:
+            self.process.request('PROPERTIES', lines=[
+                self._unabbreviate(storid)
+                for storid in self.changes.status_properties])
+            self.load()
+        except Exception:
+            self.changes.detach()
+            raise
+
+    def load(self):
+        """ Sends the whole world, as sync_reasoner_pellet does """
+        graph = self.world.graph
+        self.sent = {}
+        with tempfile.NamedTemporaryFile('w', suffix='.nt', delete=False,
+                                         encoding='utf-8') as f:
+            for s, p, o, d in graph._iter_triples():
+                line = ntriple(s, p, o, d, self._unabbreviate)
+                f.write(line + '\n')
+                if s > 0 and not (d is None and o < 0):
+                    self.sent.setdefault(s, set()).add(line)
+        # changes already in the file
+        self.changes.changed_subjects()
+        try:
+            self.process.request('LOAD', f.name)
+        finally:
+            os.remove(f.name)
+
+    def subject_triples(self, storid):
+        """ Returns the N-Triples lines of a named subject, without those
+            linking it to blank nodes
+        """
+        lines = set()
+        for p, o in self.world._get_obj_triples_s_po(storid):
+            if o > 0:
+                lines.add(ntriple(storid, p, o, None,
+                                  self._unabbreviate))
+        for p, o, d in self.world._get_data_triples_s_pod(storid):
+            lines.add(ntriple(storid, p, o, d,
+                              self._unabbreviate))
+        return lines
+
+    def deltas(self):
+        """ Computes the triples removed and added since the last call, from
+            the subjects modified in the world
+            Returns:
+                    (removed lines, added lines, modified subject IRIs)
+        """
+        removed, added, subjects = [], [], []
+        for storid, iri in self.changes.changed_subjects():
+            if iri is None:
+                # destroyed entity: all the triples sent are removed
+                removed.extend(self.sent.pop(storid, ()))
+                continue
+            lines = self.subject_triples(storid)
+            sent = self.sent.get(storid, set())
+            removed.extend(sent - lines)
+            added.extend(lines - sent)
+            if lines:
+                self.sent[storid] = lines
+            else:
+                self.sent.pop(storid, None)
+            subjects.append(iri)
+        return removed, added, subjects
+
+    def reason(self):
+        """ Sends the A-box deltas, reasons and writes the status values
+            that changed in the world
+            Returns:
+                    dict {(individual name, property name): (old, new)}
+        """
+        removed, added, subjects = self.deltas()
+        if removed:
+            self.process.request('REMOVE', lines=removed)
+        if added:
+            self.process.request('ADD', lines=added)
+        self.changes.clear_status()
+        for line in self.process.request('REASON', lines=subjects):
+            fields = line.split('\t')
+            individual = self.world[fields[1]]
+            prop = self.world[fields[2]]
+            if individual is None or prop is None:
+                continue
+            value = None
+            if fields[0] == 'VALUE':
+                value = fields[3]
+                if fields[4]:
+                    value = self.world._to_python(
+                        value, self.world._abbreviate(fields[4]))
+            if getattr(individual, prop.python_name) != value:
+                setattr(individual, prop.python_name, value)
+        logger.debug("Pellet server: {0} subjects modified, {1} triples "
+                     "removed, {2} added".format(len(subjects), len(removed),
+                                                 len(added)))
+        return self.changes.status_changes()
+
+    def close(self):
+        self.changes.detach()
@@ -0,0 +1,100 @@
+###########################################
+#
+# DESCRIPTION:
+#  Cache of the QA predictions of the FDs, refreshed in a background
+#  thread, so the planning phase uses the latest predictions received
+#  without waiting for the predictor (e.g. the /qa_pred_update service,
+#  which may be slow or down).
+##########################################
+
+import logging
+from threading import Event, Lock, Thread
+import time
+
+logger = logging.getLogger('rosout')
+
+
+class CachedPredictor(object):
+    """Callable returning the latest predictions fetched, None if there
+       are none younger than ttl seconds. It never calls fetch itself.
+
+       Args:
+               fetch: callable returning the predictions (list of key,
+                      value), it may block or raise.
+               period: time (s) between two background refreshes, 0 to
+                       refresh only when the cached predictions are stale.
+               ttl: time (s) the predictions are used after being fetched.
+    """
+
+    def __init__(self, fetch, period=1.0, ttl=5.0, clock=time.monotonic):
+        self.fetch = fetch
+        self.period = period
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = Lock()
+        self._values = None
+        self._fetched = None
+        self._wakeup = Event()
+        self._stopped = Event()
+        self._thread = None
+        self.refreshes = 0
+        self.failures = 0
+        self.stale_reads = 0
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = Thread(target=self._run,
+                                  name='qa_predictions', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def refresh(self):
+        """ Fetches the predictions and caches them
+            Returns:
+                    False if fetch failed (the cache is kept)
+        """
+        try:
+            values = self.fetch()
+        except Exception as err:
+            self.failures += 1
+            logger.debug("QA predictions not available: {}".format(err))
+            return False
+        if values is None:
+            self.failures += 1
+            return False
+        with self._lock:
+            self._values = values
+            self._fetched = self.clock()
+            self.refreshes += 1
+        return True
+
+    def age(self):
+        """ Returns the time (s) since the cached predictions were fetched,
+            None if there are none
+        """
+        fetched = self._fetched
+        return self.clock() - fetched if fetched is not None else None
+
+    def __call__(self):
+        with self._lock:
+            values, fetched = self._values, self._fetched
+        if fetched is not None and self.clock() - fetched <= self.ttl:
+            return values
+        # stale or missing: wake the refresh thread up, if any
+        self.stale_reads += 1
+        self._wakeup.set()
+        return None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.refresh()
+            self._wakeup.wait(self.period if self.period > 0 else None)
+            self._wakeup.clear()
@@ -0,0 +1,131 @@
+###########################################
+#
+# DESCRIPTION:
+#  Smoothing of the QA values observed for the FunctionGroundings: noisy
+#  observers would otherwise make objectives flip in and out of
+#  IN_ERROR_NFR. Each (FG, QA type) series is summarized by a bounded
+#  estimator (EWMA, sliding mean or sliding percentile) whose value is
+#  written in the KB instead of the raw sample.
+##########################################
+
+from bisect import bisect_left, insort
+from collections import deque
+from threading import Lock
+
+
+class EWMAEstimator(object):
+    """Exponentially weighted moving average, alpha being the weight of
+       the last sample.
+    """
+
+    __slots__ = ('alpha', 'value')
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.value = None
+
+    def observe(self, sample):
+        if self.value is None:
+            self.value = sample
+        else:
+            self.value += self.alpha * (sample - self.value)
+        return self.value
+
+
+class MeanEstimator(object):
+    """Mean of the last window samples."""
+
+    __slots__ = ('samples', 'total')
+
+    def __init__(self, window=10):
+        self.samples = deque(maxlen=window)
+        self.total = 0.0
+
+    def observe(self, sample):
+        if len(self.samples) == self.samples.maxlen:
+            self.total -= self.samples[0]
+        self.samples.append(sample)
+        self.total += sample
+        return self.total / len(self.samples)
+
+
+class PercentileEstimator(object):
+    """q-th percentile (0-100, nearest rank) of the last window samples."""
+
+    __slots__ = ('q', 'samples', 'ordered')
+
+    def __init__(self, window=10, q=50.0):
+        self.q = q
+        self.samples = deque(maxlen=window)
+        # the samples in the window, sorted
+        self.ordered = []
+
+    def observe(self, sample):
+        if len(self.samples) == self.samples.maxlen:
+            del self.ordered[bisect_left(self.ordered, self.samples[0])]
+        self.samples.append(sample)
+        insort(self.ordered, sample)
+        rank = int(round(self.q / 100.0 * (len(self.ordered) - 1)))
+        return self.ordered[rank]
+
+
+ESTIMATORS = {
+    'ewma': lambda alpha, window, q: EWMAEstimator(alpha),
+    'mean': lambda alpha, window, q: MeanEstimator(window),
+    'percentile': lambda alpha, window, q: PercentileEstimator(window, q),
+}
+
+
+class QASmoother(object):
+    """Estimators of the QA values observed, per (FG name, QA type name).
+
+       Args:
+               mode: 'ewma', 'mean' or 'percentile'.
+               alpha: weight of the last sample (ewma).
+               window: number of samples kept per series (mean, percentile).
+               q: percentile (percentile).
+    """
+
+    def __init__(self, mode='ewma', alpha=0.3, window=10, q=50.0):
+        if mode not in ESTIMATORS:
+            raise ValueError("Unknown QA smoothing '{0}', use one of: {1}"
+                             .format(mode, ', '.join(sorted(ESTIMATORS))))
+        if not 0 < alpha <= 1 or window < 1 or not 0 <= q <= 100:
+            raise ValueError("Invalid QA smoothing parameters: alpha={0}, "
+                             "window={1}, q={2}".format(alpha, window, q))
+        self.mode = mode
+        self.alpha = alpha
+        self.window = window
+        self.q = q
+        self._lock = Lock()
+        # (fg name, qa type name) -> estimator, and its last value
+        self._estimators = {}
+        self._values = {}
+
+    def observe(self, fg_name, qa_type, sample):
+        """ Adds a sample to a series
+            Returns:
+                    the smoothed value of the series
+        """
+        key = (fg_name, qa_type)
+        with self._lock:
+            estimator = self._estimators.get(key)
+            if estimator is None:
+                estimator = self._estimators[key] = \
+                    ESTIMATORS[self.mode](self.alpha, self.window, self.q)
+            value = self._values[key] = estimator.observe(sample)
+            return value
+
+    def value(self, fg_name, qa_type):
+        """ Returns the smoothed value of a series, None if it has no
+            samples
+        """
+        return self._values.get((fg_name, qa_type))
+
+    def clear(self):
+        with self._lock:
+            self._estimators = {}
+            self._values = {}
+
+    def __len__(self):
+        return len(self._estimators)
@@ -0,0 +1,127 @@
+###########################################
+#
+# DESCRIPTION:
+#  Bulk import/export of the QA estimations of the FunctionDesigns as CSV
+#  tables like expected_qas.csv: one row per FD (configuration name) and
+#  one column per QA type. The estimations are updated through the FD
+#  index, without walking the hasQAestimation lists nor regenerating the
+#  model with rosmodel2owl.
+##########################################
+
+from collections import namedtuple
+import csv
+import math
+
+NAME_COLUMN = 'Configuration name'
+
+# Result of an import: number of estimations updated (changed value),
+# created and unchanged, and names of the FDs and QA types not found in
+# the KB
+ImportStats = namedtuple('ImportStats', ['updated', 'created', 'unchanged',
+                                         'unknown_fds', 'unknown_qa_types'])
+
+
+def read_qa_table(csv_file):
+    """ Reads a table of QA estimations, one row at a time
+        Args:
+                csv_file (string): path of the CSV file, with a
+                                   'Configuration name' column and a column
+                                   per QA type.
+        Returns:
+                generator of (fd name, [(qa type name, value)]), empty
+                cells are skipped
+    """
+    with open(csv_file) as f:
+        reader = csv.reader(f)
+        header = [column.strip() for column in next(reader, [])]
+        if NAME_COLUMN not in header:
+            raise ValueError("{0}: no '{1}' column"
+                             .format(csv_file, NAME_COLUMN))
+        name_column = header.index(NAME_COLUMN)
+        qa_columns = [(i, qa_type) for i, qa_type in enumerate(header)
+                      if qa_type and i != name_column]
+        for cells in reader:
+            if len(cells) <= name_column or not cells[name_column].strip():
+                continue
+            yield (cells[name_column].strip(),
+                   [(qa_type, float(cells[i])) for i, qa_type in qa_columns
+                    if i < len(cells) and cells[i].strip()])
+
+
+def import_qa_estimations(reasoner, rows, create=True):
+    """ Updates the QA estimations of the FDs
+        Args:
+                reasoner (Reasoner): reasoner holding the KB.
+                rows: iterable of (fd name, [(qa type name, value)]), e.g.
+                      read_qa_table(csv_file).
+                create (bool): whether to create the estimations an FD does
+                               not have, or report their QA types as
+                               unknown.
+        Returns:
+                ImportStats
+    """
+    fd_index = reasoner.fd_index
+    updated = created = unchanged = 0
+    unknown_fds = []
+    unknown_qa_types = set()
+    # (row, qa type name) -> QAvalue created, not in the index yet
+    new_qas = {}
+    with reasoner.ontology_lock:
+        fd_index.refresh(reasoner.tomasys)
+        for fd_name, values in rows:
+            row = fd_index.rows.get(fd_name)
+            if row is None:
+                unknown_fds.append(fd_name)
+                continue
+            fd = fd_index.fds[row]
+            for qa_type_name, value in values:
+                column = fd_index.columns.get(qa_type_name)
+                qa = fd_index.qa_values.get((row, column)) or \
+                    new_qas.get((row, qa_type_name))
+                if qa is not None:
+                    if qa.hasValue != value:
+                        qa.hasValue = value
+                        fd_index.update(fd, qa.isQAtype, value)
+                        updated += 1
+                    else:
+                        unchanged += 1
+                    continue
+                qa_type = reasoner.lookup(qa_type_name) if create else None
+                if not isinstance(qa_type,
+                                  reasoner.tomasys.QualityAttributeType):
+                    unknown_qa_types.add(qa_type_name)
+                    continue
+                qa = new_qas[(row, qa_type_name)] = reasoner.tomasys.QAvalue(
+                    'qa_{0}_{1}'.format(qa_type_name, fd_name),
+                    namespace=reasoner.onto, isQAtype=qa_type, hasValue=value)
+                fd.hasQAestimation.append(qa)
+                reasoner.index.add(qa)
+                created += 1
+        if created:
+            # new cells (or columns) in the index
+            fd_index.invalidate()
+    if updated or created:
+        reasoner.mark_kb_changed()
+    return ImportStats(updated, created, unchanged, unknown_fds,
+                       sorted(unknown_qa_types))
+
+
+def export_qa_estimations(reasoner, csv_file):
+    """ Writes the QA estimations of all the FDs in a table readable by
+        read_qa_table, missing estimations are left empty
+        Returns:
+                number of FDs written
+    """
+    fd_index = reasoner.fd_index
+    with reasoner.ontology_lock:
+        fd_index.refresh(reasoner.tomasys)
+        names = list(fd_index.names)
+        qa_types = list(fd_index.qa_types)
+        estimations = fd_index.estimations.copy()
+    with open(csv_file, 'w') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow([NAME_COLUMN] + qa_types)
+        for name, values in zip(names, estimations):
+            writer.writerow([name] + ['' if math.isnan(value) else repr(value)
+                                      for value in values.tolist()])
+    return len(names)
@@ -5,20 +5,29 @@
 #             c.h.corbato@tudelft.nl
 ##########################################
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 import argparse
 from decimal import Decimal
 
 import signal
 import sys
-from threading import Lock
+from threading import RLock
 
 from mros1_reasoner.tomasys import remove_objective_grounding, ground_fd
-from mros1_reasoner.tomasys import updateQAvalue, updateQAestimation
+from mros1_reasoner.tomasys import reground_fd
+from mros1_reasoner.tomasys import updateQAvalue
 from mros1_reasoner.tomasys import resetFDRealisability, resetObjStatus
+from mros1_reasoner.tomasys import candidateFunctionDesigns
+from mros1_reasoner.tomasys import selectFunctionDesign
+from mros1_reasoner.reasoning import PelletBackend
+from mros1_reasoner.kb_index import NameIndex, ComponentIndex
+from mros1_reasoner.fd_index import FunctionDesignIndex
+from mros1_reasoner.solution_cache import SolutionCache
+from mros1_reasoner.utility import utility_config_for
+from mros1_reasoner.qa_table import import_qa_estimations
 
-from owlready2 import sync_reasoner_pellet, destroy_entity
+from owlready2 import destroy_entity
 
 import logging
 
@@ -44,19 +53,78 @@ class Reasoner(object):
         self.grounded_configuration = None
 
         # This Lock is used to ensure safety of tQAvalues
-        self.ontology_lock = Lock()
+        # (reentrant, so several updates can be applied in one acquisition)
+        self.ontology_lock = RLock()
+
+        # Incremental reasoning: perform_reasoning is skipped when the A-box
+        # has not been modified since the last reasoning cycle
+        self.incremental_reasoning = True
+        self.kb_changed = True
+        self.reasoning_runs = 0
+        self.reasoning_skips = 0
+
+        # Backend performing the reasoning (see mros1_reasoner.reasoning),
+        # and the status changes it inferred in the last reasoning cycle
+        self.reasoning_backend = PelletBackend()
+        self.last_status_changes = {}
+
+        # name -> individual index, replaces wildcard IRI searches
+        self.index = NameIndex()
+
+        # QA estimations of the FDs, used to select FDs
+        self.fd_index = FunctionDesignIndex()
+
+        # component -> FDs requiring it, to reset only their realisability,
+        # and number of FDs reset by the last component status update
+        self.component_index = ComponentIndex()
+        self.last_invalidated_fds = 0
+
+        # Journal of the KB mutations (see mros1_reasoner.kb_journal),
+        # None if disabled
+        self.journal = None
+
+        # QA type of the predictions whose key is only an FD name
+        self.prediction_qa_type = 'safety'
+
+        # {objective name: utility configuration} used to select FDs,
+        # see mros1_reasoner.utility
+        self.utility_configs = {}
+
+        # FD selections, reused while their inputs do not change
+        self.solution_cache = SolutionCache()
+
+        # Whether to ground the functions required by the grounded FDs
+        # (sub-objectives) recursively
+        self.hierarchical_grounding = True
 
         signal.signal(signal.SIGINT, self.save_ontology_exit)
         self.isInitialized = True
 
+    def build_index(self):
+        """(Re)builds the name index, once the ontologies are loaded"""
+        self.index.build(self.onto.world)
+        self.component_index.invalidate()
+
+    def lookup(self, name):
+        """ Returns the KB entity with a given name, None if not found
+            (replaces onto.search_one(iri="*name"))
+        """
+        if self.index.world is None:
+            self.build_index()
+        return self.index.get(name)
+
     def remove_objective(self, objective_id):
         # Checks if there are previously defined objectives.
-        old_objective = self.onto.search_one(iri="*{}".format(objective_id))
+        old_objective = self.lookup(objective_id)
         if old_objective:
-            old_fg_instance = self.onto.search_one(solvesO=old_objective)
             with self.ontology_lock:
-                destroy_entity(old_fg_instance)
+                for entity in remove_objective_grounding(
+                        old_objective, self.tomasys, self.onto):
+                    self.index.remove(entity)
+                self.index.remove(old_objective)
                 destroy_entity(old_objective)
+            self.mark_kb_changed()
+            self.record('objective_removed', str(objective_id))
             return True
         else:
             return False
@@ -72,8 +140,9 @@ class Reasoner(object):
         """
         objective = self.tomasys.Objective(str(objective_name),
                                            namespace=self.onto,
-                                           typeF=self.onto.search_one(
-                                               iri=str(iri_seed)))
+                                           typeF=self.lookup(iri_seed))
+        self.index.add(objective)
+        self.mark_kb_changed()
         return objective
 
     def get_new_tomasys_nrf(self, qa_value_name, iri_seed, nfr_value):
@@ -82,26 +151,73 @@ class Reasoner(object):
         """
         new_nfr = self.tomasys.QAvalue(str(qa_value_name),
                                        namespace=self.onto,
-                                       isQAtype=self.onto.search_one(
-                                           iri=str(iri_seed)),
+                                       isQAtype=self.lookup(iri_seed),
                                        hasValue=nfr_value)
+        self.index.add(new_nfr)
+        self.mark_kb_changed()
         return new_nfr
 
     def set_new_grounding(self, fd_name, objective):
         """Given a string fd_name with the name of a FunctionDesign and
            an objective, removes the previous fg for the objective
-           and ground a new fg of typeF fd
+           and ground a new fg of typeF fd (and the sub-objectives it
+           requires, in hierarchical grounding: the branches of the
+           previous grounding whose FD does not change are kept)
         """
-        remove_objective_grounding(objective, self.tomasys, self.onto)
-        fd = self.onto.search_one(iri="*{}".format(fd_name),
-                                  is_a=self.tomasys.FunctionDesign)
-        if fd:
-            with self.ontology_lock:
-                ground_fd(fd, objective, self.tomasys, self.onto)
+        fd = self.lookup(fd_name)
+        if not (fd and isinstance(fd, self.tomasys.FunctionDesign)):
+            fd = None
+        with self.ontology_lock:
+            created, removed = [], []
+            if fd is not None and self.hierarchical_grounding:
+                reground_fd(fd, objective, self.tomasys, self.onto,
+                            self.solve, created, removed)
+            else:
+                removed = remove_objective_grounding(objective, self.tomasys,
+                                                     self.onto)
+                if fd is not None:
+                    ground_fd(fd, objective, self.tomasys, self.onto, None,
+                              created)
+            for entity in removed:
+                self.index.remove(entity)
+            for entity in created:
+                self.index.add(entity)
+            if fd is not None:
                 resetObjStatus(objective)
-            return str(fd.name)
-        else:
+        if fd is None:
             return None
+        self.mark_kb_changed()
+        self.record('grounding', objective.name, fd.name)
+        return str(fd.name)
+
+    def select_function_design(self, objective_name, candidates):
+        """ Memoized selectFunctionDesign, it does not access the KB
+            Args:
+                    objective_name (string): name of the objective, to
+                                             get its utility.
+                    candidates: (rows, suitable, nfrs), as returned by
+                                candidateFunctionDesigns.
+            Returns:
+                    The name of the best FD, None if there is none.
+        """
+        rows, suitable, nfrs = candidates
+        utility_config = utility_config_for(self.utility_configs,
+                                            objective_name)
+        return self.solution_cache.get(
+            SolutionCache.key(self.fd_index, rows, suitable, nfrs,
+                              utility_config),
+            lambda: selectFunctionDesign(self.fd_index, rows, suitable,
+                                         nfrs, utility_config))
+
+    def solve(self, objective):
+        """ Returns the best FD individual to solve an objective, None if
+            there is none
+        """
+        self.fd_index.refresh(self.tomasys)
+        fd_name = self.select_function_design(
+            objective.name, candidateFunctionDesigns(objective,
+                                                     self.fd_index))
+        return self.lookup(fd_name) if fd_name is not None else None
 
     # the DiagnosticStatus message process contains, per field
     # - message: "binding_error"
@@ -109,11 +225,13 @@ class Reasoner(object):
     # - level: values 0 and 1 are mapped to nothing, values 2 or 3 are mapped
     #   to fg.status="INTERNAL_ERROR"
     def updateBinding(self, diagnostic_status):
-        fg = self.onto.search_one(iri="*{}".format(diagnostic_status.name))
+        fg = self.lookup(diagnostic_status.name)
         if fg is None:
             return -1
         if diagnostic_status.level > 1:
-            fg.fg_status = "INTERNAL_ERROR"
+            with self.ontology_lock:
+                fg.fg_status = "INTERNAL_ERROR"
+                self.mark_kb_changed()
             return 1
         else:
             return 0
@@ -130,21 +248,26 @@ class Reasoner(object):
     def updateComponentStatus(self, diagnostic_status):
         # Find the Component with the same name that the one in the Component
         # Status message (in diagnostic_status.key)
-        component_type = self.onto.search_one(
-            iri="*{}".format(diagnostic_status.values[0].key))
+        component_type = self.lookup(diagnostic_status.values[0].key)
         if component_type is not None:
             value = diagnostic_status.values[0].value
             with self.ontology_lock:
-                resetFDRealisability(
-                    self.tomasys, self.onto, diagnostic_status.values[0].key)
+                self.component_index.refresh(self.tomasys)
+                self.last_invalidated_fds = resetFDRealisability(
+                    self.tomasys, component_type,
+                    self.component_index.dependent_fds(component_type))
                 component_type.c_status = value
+            self.mark_kb_changed()
+            self.record('component', component_type.name, value)
             return_value = 1
         else:
             return_value = 0
         return return_value
 
     # update QA value based on incoming diagnostic
-    def updateQA(self, diagnostic_status):
+    # - value: value to write instead of the one in the diagnostic, e.g.
+    #   the smoothed one (see mros1_reasoner.qa_smoothing)
+    def updateQA(self, diagnostic_status, value=None):
         # Find the FG with the same name that the one in the QA message
         # (in diagnostic_status.name)
 
@@ -152,60 +275,99 @@ class Reasoner(object):
         if len(self.tomasys.FunctionGrounding.instances()) == 0:
             return -1
 
-        fg = next((fg for fg in self.tomasys.FunctionGrounding.instances()
-                  if fg.name == diagnostic_status.name), None)
-        if fg is None:
+        fg = self.lookup(diagnostic_status.name)
+        if not isinstance(fg, self.tomasys.FunctionGrounding):
             fg = self.tomasys.FunctionGrounding.instances()[0]
 
-        qa_type = self.onto.search_one(iri="*{}".format(
-            diagnostic_status.values[0].key))
+        qa_type = self.lookup(diagnostic_status.values[0].key)
 
         if qa_type is not None:
-            value = float(diagnostic_status.values[0].value)
+            if value is None:
+                value = float(diagnostic_status.values[0].value)
             with self.ontology_lock:
-                updateQAvalue(fg, qa_type, value, self.tomasys, self.onto)
+                if updateQAvalue(fg, qa_type, value, self.tomasys, self.onto):
+                    self.mark_kb_changed()
+                    self.record('qa_value', fg.name, qa_type.name, value)
             return_value = 1
 
         return return_value
 
     # Adding Jasper's function to update QA estimations
+    # - values: list of KeyValue with the predicted estimations, the key
+    #   being the FD name ("fd_name", for the prediction_qa_type) or the
+    #   FD and QA type names ("fd_name/qa_type")
+    # All the predictions are applied in one pass through the FD index
     def updateQA_pred(self, values):
-        # Find the FG with the same name that the one in the QA message (in diagnostic_status.name)
-        return_value = 0
-        for i in range(len(values)):
-            print("Prediction received for %s, safety=%s" % (values[i].key, values[i].value))
-            fd = next((fd for fd in self.tomasys.FunctionDesign.instances() if fd.name == values[i].key), None)
-            qa_type = self.onto.search_one(iri="*{}".format('safety'))
-            if qa_type != None:
-                value = float(values[i].value)
-                with self.ontology_lock:
-                    updateQAestimation(fd, qa_type, value)
-                return_value = 1
-            else:
-                return_value = 0
-                return return_value
-        return return_value
+        estimations = OrderedDict()
+        for key_value in values:
+            fd_name, _, qa_type = str(key_value.key).partition('/')
+            try:
+                value = float(key_value.value)
+            except ValueError:
+                logging.warning("Invalid prediction for %s: %s",
+                                key_value.key, key_value.value)
+                continue
+            estimations.setdefault(fd_name, []).append(
+                (qa_type or self.prediction_qa_type, value))
+        stats = import_qa_estimations(self, estimations.items(),
+                                      create=False)
+        if stats.updated:
+            self.record('estimations', list(estimations.items()))
+        logging.debug("QA predictions received: %s", stats)
+        return 1 if stats.updated or stats.unchanged else 0
+
+    # Appends a KB mutation to the journal, if enabled
+    def record(self, op, *args):
+        if self.journal is not None:
+            self.journal.append(op, *args)
+
+    # Flags the A-box as modified, so the next perform_reasoning call
+    # runs the reasoner even in incremental mode
+    def mark_kb_changed(self):
+        self.kb_changed = True
+
+    def reasoning_stats(self):
+        """ Returns the number of reasoning cycles run and skipped
+            Returns:
+                    dict with keys 'runs' and 'skips'
+        """
+        return {'runs': self.reasoning_runs, 'skips': self.reasoning_skips}
 
     # EXEC REASONING to update ontology with inferences
     # TODO CHECK: update reasoner facts, evaluate, retrieve action, publish
     # update reasoner facts
+    # In incremental mode the reasoner is only invoked when the A-box has
+    # changed since the last successful reasoning cycle
     def perform_reasoning(self):
         return_value = False
+        if self.incremental_reasoning and not self.kb_changed:
+            self.reasoning_skips += 1
+            self.last_status_changes = {}
+            return True
         with self.ontology_lock:
-            with self.onto:
-                try:
-                    sync_reasoner_pellet(infer_property_values=True,
-                                         infer_data_property_values=True)
-                    return_value = True
-                except Exception as err:
-                    logging.exception("{0}".format(err))
-                    return False
-                    # raise err
+            # Cleared before the backend reads the KB so that a change made
+            # meanwhile is reasoned about in the next iteration
+            self.kb_changed = False
+            try:
+                self.last_status_changes = self.reasoning_backend.reason(
+                    self.tomasys, self.onto)
+                self.reasoning_runs += 1
+                return_value = True
+            except Exception as err:
+                self.kb_changed = True
+                logging.exception("{0}".format(err))
+                return False
+                # raise err
         return return_value
 
     # For debugging purposes: saves state of the KB in an ontology file
     # TODO move to library
     # TODO save file in a temp location
+    # With a journal, a compact checkpoint is written instead
     def save_ontology_exit(self, signal, frame):
-        self.onto.save(file="error.owl", format="rdfxml")
+        if self.journal is not None:
+            self.journal.checkpoint(self)
+            self.journal.close()
+        else:
+            self.onto.save(file="error.owl", format="rdfxml")
         sys.exit(0)
@@ -0,0 +1,161 @@
+###########################################
+#
+# DESCRIPTION:
+#  Reasoning backends used by Reasoner.perform_reasoning to update the
+#  statuses of the tomasys individuals in the KB.
+#  A backend reasons over the KB and returns only the inferred status
+#  changes, i.e. o_status, fg_status and fd_realisability
+##########################################
+
+import logging
+
+from owlready2 import sync_reasoner_pellet
+
+from mros1_reasoner.abox_changes import ABoxChanges
+from mros1_reasoner.pellet_server import PelletProcess, PelletServerSession
+from mros1_reasoner.rules import collect_facts, infer_status, apply_status
+from mros1_reasoner.rules import current_status, NFRRules
+
+
+REASONING_BACKENDS = {}
+
+
+def register_backend(backend_class):
+    """ Class decorator adding a reasoning backend to the registry
+        under its 'name' attribute
+    """
+    REASONING_BACKENDS[backend_class.name] = backend_class
+    return backend_class
+
+
+def get_backend(name):
+    """ Creates the reasoning backend registered with a given name
+        Args:
+                name (string): name of the backend, e.g. 'pellet'.
+        Returns:
+                A new backend instance.
+        Raises:
+                ValueError: if there is no backend with that name.
+    """
+    if name not in REASONING_BACKENDS:
+        raise ValueError("Unknown reasoning backend '{0}', available: {1}"
+                         .format(name, sorted(REASONING_BACKENDS.keys())))
+    return REASONING_BACKENDS[name]()
+
+
+@register_backend
+class PelletBackend(object):
+    """Runs the Pellet reasoner bundled with owlready2 on the KB."""
+
+    name = 'pellet'
+
+    def __init__(self):
+        # status values written by owlready2 after running Pellet
+        self.changes = None
+
+    def reason(self, tbox, abox):
+        """ Performs reasoning and returns the inferred status changes
+            Args:
+                    tbox (ontology): ontology holding the tomasys Tbox.
+                    abox (ontology): application model, inferences are
+                                     stored in it.
+            Returns:
+                    dict {(individual name, property name): (old, new)}
+        """
+        if self.changes is None or self.changes.world is not tbox.world:
+            self.changes = ABoxChanges(tbox.world, tbox)
+        self.changes.clear_status()
+        with abox:
+            sync_reasoner_pellet(infer_property_values=True,
+                                 infer_data_property_values=True)
+        return self.changes.status_changes()
+
+
+@register_backend
+class PelletServerBackend(object):
+    """Runs Pellet in a long-lived JVM (see pellet_server.py), loading the
+       KB once and then sending it only the A-box changes of each cycle.
+       Needs Java >= 11.
+    """
+
+    name = 'pellet_server'
+
+    def __init__(self, process_factory=PelletProcess):
+        self.process_factory = process_factory
+        self.session = None
+
+    def reason(self, tbox, abox):
+        if self.session is not None and self.session.world is not tbox.world:
+            self.close()
+        try:
+            if self.session is None:
+                process = self.process_factory().start()
+                try:
+                    self.session = PelletServerSession(tbox, process)
+                except Exception:
+                    process.stop()
+                    raise
+            return self.session.reason()
+        except RuntimeError:
+            # the KB is loaded again in a new process on the next cycle
+            self.close()
+            raise
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session.process.stop()
+            self.session = None
+
+
+@register_backend
+class PythonRulesBackend(object):
+    """Evaluates the tomasys status rules in Python (see rules.py),
+       without running a JVM.
+    """
+
+    name = 'python'
+
+    def __init__(self):
+        # NFR rules, read from the SWRL rules of the model
+        self.nfr_rules = NFRRules()
+
+    def reason(self, tbox, abox):
+        facts = collect_facts(tbox)
+        self.nfr_rules.load(tbox.world)
+        return apply_status(facts, infer_status(facts, self.nfr_rules))
+
+
+@register_backend
+class CrossCheckBackend(object):
+    """Runs Pellet and the Python rules on the same KB state and reports
+       the values where they diverge. The KB is updated by Pellet.
+    """
+
+    name = 'crosscheck'
+
+    def __init__(self):
+        self.pellet = PelletBackend()
+        self.nfr_rules = NFRRules()
+        # divergences found in the last reasoning cycle:
+        # {(individual name, property name): (pellet value, python value)}
+        self.divergences = {}
+
+    def reason(self, tbox, abox):
+        facts = collect_facts(tbox)
+        self.nfr_rules.load(tbox.world)
+        predicted = infer_status(facts, self.nfr_rules)
+        changes = self.pellet.reason(tbox, abox)
+        self.divergences = {}
+        for key in set(changes) | set(predicted):
+            before = current_status(facts, *key)
+            pellet_value = changes[key][1] if key in changes else before
+            python_value = predicted.get(key, before)
+            if pellet_value != python_value:
+                self.divergences[key] = (pellet_value, python_value)
+        for (name, prop), (pellet_value, python_value) in \
+                self.divergences.items():
+            logging.warning(
+                "Reasoning divergence for {0} of {1}: pellet={2} python={3}"
+                .format(prop, name, pellet_value, python_value))
+        return changes
@@ -1,7 +1,10 @@
+import os
+
 import rospy
 
 import actionlib
 from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+from actionlib_msgs.msg import GoalStatus
 
 from metacontrol_msgs.msg import MvpReconfigurationAction
 from metacontrol_msgs.msg import MvpReconfigurationGoal
@@ -12,15 +15,19 @@ from metacontrol_msgs.msg import SystemState
 
 from metacontrol_msgs.srv import QAPredictions # Needed for Jasper's additions
 
-from mros1_reasoner.reasoner import Reasoner
-from mros1_reasoner.tomasys import obtainBestFunctionDesign
-from mros1_reasoner.tomasys import print_ontology_status, evaluateObjectives
-from mros1_reasoner.tomasys import loadKB_from_file, remove_objective_grounding
-from mros1_reasoner.tomasys import destroy_entity, resetObjStatus, logging
+from mros1_reasoner.engine import MetacontrolEngine
+from mros1_reasoner.reasoning import get_backend
+from mros1_reasoner.component_debouncer import ComponentDebouncer
+from mros1_reasoner.qa_smoothing import QASmoother
+from mros1_reasoner.prediction_cache import CachedPredictor
+from mros1_reasoner.qa_table import import_qa_estimations, read_qa_table
 
 
 class RosReasoner(object):
-    """docstring for RosComponents."""
+    """ROS adapter of the MetacontrolEngine: reads the parameters, feeds
+       the engine with /diagnostics and executes its reconfigurations with
+       the reconfiguration action.
+    """
 
     def __init__(self):
         super(RosReasoner, self).__init__()
@@ -29,9 +36,8 @@ class RosReasoner(object):
 
         # Initialize variables.
         self.isInitialized = False
-        self.reasoner = Reasoner()
-
-        self.hasObjective = False
+        self.engine = MetacontrolEngine(clock=rospy.get_time)
+        self.reasoner = self.engine.reasoner
 
         # Read ROS parameters
         # Get ontology and tomasys file paths from parameters
@@ -39,7 +45,7 @@ class RosReasoner(object):
         tomasys_file_array = self.check_and_read_parameter('~tomasys_file')
 
         # Get desired_configuration_name from parameters
-        self.grounded_configuration = self.check_and_read_parameter(
+        self.engine.grounded_configuration = self.check_and_read_parameter(
             '~desired_configuration'
         )
 
@@ -48,6 +54,43 @@ class RosReasoner(object):
             '~reasoning_rate', 2.0)
         )
 
+        # Reasoning backend, see mros1_reasoner.reasoning
+        backend_name = self.check_and_read_parameter(
+            '~reasoning_backend', 'pellet'
+        )
+        try:
+            self.reasoner.reasoning_backend = get_backend(backend_name)
+        except ValueError as err:
+            rospy.logerr("{0} - Using 'pellet'".format(err))
+        # e.g. the JVM of the pellet_server backend
+        if hasattr(self.reasoner.reasoning_backend, 'close'):
+            rospy.on_shutdown(self.reasoner.reasoning_backend.close)
+        # NFR bounds of the QA types without NFR rules in the model, for the
+        # python rules ({qa type name: 'upper' or 'lower'})
+        nfr_rules = getattr(self.reasoner.reasoning_backend, 'nfr_rules', None)
+        if nfr_rules is not None:
+            nfr_rules.bounds.update(
+                self.check_and_read_parameter('~nfr_bounds', {}))
+
+        # Utility functions used to select FDs, per objective name
+        self.reasoner.utility_configs = self.check_and_read_parameter(
+            '~utility', {}
+        )
+
+        # Pareto front pruning of the FDs and QA directions it relies on
+        # ({qa type name: 1.0 if higher is better, -1.0 if lower})
+        self.reasoner.fd_index.pareto_pruning = self.check_and_read_parameter(
+            '~pareto_pruning', True
+        )
+        self.reasoner.fd_index.qa_directions.update(
+            self.check_and_read_parameter('~qa_directions', {})
+        )
+
+        # Whether to skip reasoning when the KB has not changed
+        self.reasoner.incremental_reasoning = self.check_and_read_parameter(
+            '~incremental_reasoning', True
+        )
+
         # Whether or not to use system modes reconfiguration / just for testing
         self.use_reconfiguration_srv = self.check_and_read_parameter(
             "~use_reconfigure_srv", True
@@ -58,41 +101,141 @@ class RosReasoner(object):
             self.reconfigure_srv_name = self.check_and_read_parameter(
                 '~reconfigure_srv_name', 'rosgraph_manipulator_action_server'
             )
+            # Time (s) after which a reconfiguration in progress is cancelled
+            self.engine.reconfiguration_timeout = float(
+                self.check_and_read_parameter('~reconfiguration_timeout', 30.0)
+            )
+            # Action client, reused for all the reconfiguration requests
+            self.rosgraph_manipulator_client = actionlib.SimpleActionClient(
+                self.reconfigure_srv_name,
+                MvpReconfigurationAction)
 
-        # Whether or not to use system modes reconfiguration / Used for testing
-        self.use_reconfiguration_srv = self.check_and_read_parameter(
-            "~use_reconfigure_srv", True
+        # Threads selecting the FDs of the objectives in error in parallel
+        self.engine.planning_workers = int(self.check_and_read_parameter(
+            '~planning_workers', 1)
+        )
+
+        # Whether to stage diagnostics and apply them once per cycle
+        self.engine.batch_diagnostics = self.check_and_read_parameter(
+            '~batch_diagnostics', True
         )
 
+        # Component status debouncing: a new status is applied once
+        # reported component_confirmations times in the last
+        # component_window reports, and component_dwell_time (s) after the
+        # previous one
+        try:
+            self.engine.component_debouncer = ComponentDebouncer(
+                confirmations=int(self.check_and_read_parameter(
+                    '~component_confirmations', 1)),
+                window=int(self.check_and_read_parameter(
+                    '~component_window', 1)),
+                dwell_time=float(self.check_and_read_parameter(
+                    '~component_dwell_time', 0.0)),
+                clock=rospy.get_time)
+        except ValueError as err:
+            rospy.logerr("{0} - Component debouncing disabled".format(err))
+
+        # Smoothing of the QA values observed: none, ewma, mean or
+        # percentile, see mros1_reasoner.qa_smoothing
+        qa_smoothing = self.check_and_read_parameter('~qa_smoothing', 'none')
+        if qa_smoothing != 'none':
+            try:
+                self.engine.qa_smoother = QASmoother(
+                    qa_smoothing,
+                    alpha=float(self.check_and_read_parameter(
+                        '~qa_smoothing_alpha', 0.3)),
+                    window=int(self.check_and_read_parameter(
+                        '~qa_smoothing_window', 10)),
+                    q=float(self.check_and_read_parameter(
+                        '~qa_smoothing_percentile', 50.0)))
+            except ValueError as err:
+                rospy.logerr("{0} - QA values not smoothed".format(err))
+
+        # Minimum time (s) between two logs of the KB status changes
+        self.engine.status_reporter.period = float(
+            self.check_and_read_parameter('~status_period', 0.0)
+        )
+
+        # Latency metrics of the loop, published every metrics_period
+        # seconds (0 disables them) and appended to metrics_file if given
+        metrics_period = float(self.check_and_read_parameter(
+            '~metrics_period', 0.0)
+        )
+        self.metrics_file = self.check_and_read_parameter('~metrics_file', '')
+        self.engine.metrics.enabled = metrics_period > 0
+        if self.engine.metrics.enabled:
+            self.metrics_pub = rospy.Publisher('~metrics', DiagnosticArray,
+                                               queue_size=1)
+            rospy.Timer(rospy.Duration(metrics_period), self.publish_metrics)
+
+        # QA predictions of the FDs, refreshed in background every
+        # qa_predictions_period seconds (0: only when needed) and used
+        # for qa_predictions_ttl seconds
+        self.qa_predictions_proxy = None
+        # QA type of the predictions keyed by FD name only
+        self.reasoner.prediction_qa_type = self.check_and_read_parameter(
+            '~prediction_qa_type', 'safety')
+        self.engine.qa_predictor = CachedPredictor(
+            self.fetch_qa_predictions,
+            period=float(self.check_and_read_parameter(
+                '~qa_predictions_period', 1.0)),
+            ttl=float(self.check_and_read_parameter(
+                '~qa_predictions_ttl', 5.0)),
+            clock=rospy.get_time).start()
+        rospy.on_shutdown(self.engine.qa_predictor.stop)
+
         # Start interfaces
         rospy.Subscriber('/diagnostics',
                          DiagnosticArray,
                          self.callbackDiagnostics,)
 
-        # First read fixed ontologies (tomasys + MROS)
-        for tomasys_file in tomasys_file_array:
-            if self.reasoner.tomasys is None:
-                # load ontology from file
-                self.reasoner.tomasys = self.read_ontology_file(tomasys_file)
-            else:
-                # Import additional ontology from files
-                self.reasoner.tomasys.imported_ontologies.append(
-                    self.read_ontology_file(tomasys_file)
-                )
-        # Load the application model (individuals of tomasys classes)
-        self.reasoner.onto = self.read_ontology_file(model_file)
-        # Check if ontologies have been correctly loaded
-        if self.reasoner.tomasys is None or self.reasoner.onto is None:
-            rospy.logerr("Error while reading ontology files!")
+        # Directory of the KB start-up snapshots, '' disables them
+        kb_cache_dir = self.check_and_read_parameter(
+            '~kb_cache_dir', os.path.join(
+                os.environ.get('ROS_HOME',
+                               os.path.join(os.path.expanduser('~'), '.ros')),
+                'mros1_reasoner', 'kb_cache')
+        )
+
+        if not self.engine.load_ontologies(tomasys_file_array, model_file,
+                                           kb_cache_dir):
             return
 
+        # QA estimations of the FDs overriding those of the model, as a
+        # CSV table like expected_qas.csv ('' to use the model ones)
+        qa_estimations_file = self.check_and_read_parameter(
+            '~qa_estimations_file', '')
+        if qa_estimations_file:
+            try:
+                stats = import_qa_estimations(
+                    self.reasoner, read_qa_table(qa_estimations_file))
+                rospy.loginfo("QA estimations imported from {0}: {1}"
+                              .format(qa_estimations_file, stats))
+            except (IOError, OSError, ValueError) as err:
+                rospy.logerr("QA estimations not imported: {}".format(err))
+
+        # Journal of the KB mutations, to restore the KB state on restart
+        # ('' disables it), checkpointed every journal_checkpoint_interval
+        # entries
+        journal_dir = self.check_and_read_parameter('~journal_dir', '')
+        if journal_dir:
+            try:
+                self.engine.open_journal(
+                    journal_dir,
+                    int(self.check_and_read_parameter(
+                        '~journal_checkpoint_interval', 1000)),
+                    self.check_and_read_parameter('~journal_fsync', False))
+            except (IOError, OSError, ValueError) as err:
+                rospy.logerr("KB journal disabled: {}".format(err))
+
         # Wait for subscribers
         # (only for the test_1_level_functional_architecture)
         # rospy.sleep(0.5)
 
-        if self.grounded_configuration is not None:
+        if self.engine.grounded_configuration is not None:
             rospy.loginfo('grounded_configuration initialized to: %s',
-                          self.grounded_configuration)
+                          self.engine.grounded_configuration)
         else:
             rospy.logwarn('grounded_configuration parameter not found')
 
@@ -117,286 +260,140 @@ class RosReasoner(object):
                           str(param_name), str(default_value))
             return default_value
 
-    def read_ontology_file(self, ontology_file_name):
-        """ Checks if an ontology file exists and reads its value
-            Args:
-                    ontology_file_name (string): The name of the parameter.
-            Returns:
-                    The ontology if it's read correctly, None otherwise.
-        """
-        if ontology_file_name is not None:
-            ontology = loadKB_from_file(ontology_file_name)
-            if ontology is not None:
-                rospy.loginfo("Loaded ontology: " + str(ontology_file_name))
-            else:
-                rospy.logerr("Failed to load ontology from: "
-                             + str(ontology_file_name))
-                return None
-        else:
-            rospy.logwarn("No ontology file provided!")
-            return None
-        return ontology
-
-    # NOTE REFACTORING: This KB initialization is completely mixed with
-    # ROS interfaces, probably library should not have an initKB method,
-    # but utility methods to update the a-box according to incoming information
-    # Initializes the KB according to 2 cases:
-    # - If there is an Objective individual in the ontology file,
-    # the KB is initialized only using the OWL file
-    # - If there is no Objective individual,
-    # a navigation Objective is create in the KB,
-    # with associated NFR(s) that are read from ros parameters
+    # Initializes the KB, the NFR(s) of the default navigation objective
+    # are read from ros parameters (see MetacontrolEngine.initKB)
     def initKB(self):
-
-        rospy.loginfo('KB initialization:\n'
-                      + '\t - Supported QAs:\n'
-                      + '\t - for Function f_navigate:'
-                      + '/nfr_energy, /nfr_safety\n'
-                      + '\t - If an Objective instance is not found in the owl'
-                      + 'file, a default o_navigate is created.')
-
-        objectives = self.reasoner.search_objectives()
-
-        # if no objectives in the OWL file,
-        # standard navigation objective is assumed
-        if objectives == []:
-            rospy.loginfo('Creating Objective o_navigateA with default NFR(s)')
-
-            o_navigate = self.reasoner.get_new_tomasys_objective("o_navigateA",
-                                                                 "*f_navigate")
-
-            # Get ontology and tomasys file paths from parameters
-            # nfr_energy_value = float(self.check_and_read_parameter('~nfr_energy', 0.5))  # noqa
-            nfr_safety_value = float(self.check_and_read_parameter('~nfr_safety', 0.8))  # noqa
-
-            # Load NFR(s) in the KB
-            # nfr_energy = self.reasoner.get_new_tomasys_nrf("nfr_energy", "*energy", nfr_energy_value)  # noqa
-            nfr_safety = self.reasoner.get_new_tomasys_nrf("nfr_safety", "*safety", nfr_safety_value)  # noqa
-
-            # Link NFR(s) to objective
-            # o_navigate.hasNFR.append(nfr_energy)
-            o_navigate.hasNFR.append(nfr_safety)
-
-        elif len(objectives) == 1:
-            rospy.loginfo("Objective {}".format(objectives[0].name)
-                          + " found, NFR(s) and initial FG are"
-                          + " generated from the OWL file")
-
-        else:
-            rospy.logerr('Metacontrol cannot handle more than one Objective'
-                         + 'in the OWL file (the Root Objective)')
-            return
-
-        # # Set objective to UnGrounded
-        o_navigate.o_status = "UNGROUNDED"
-        self.hasObjective = True
-        rospy.loginfo('Objective created and set to ungrounded')
-
-        # For debugging InConsistent ontology errors,
-        # save the ontology before reasoning
-        # self.onto.save(file="tmp_debug.owl", format="rdfxml")
+        # Get ontology and tomasys file paths from parameters
+        # nfr_energy_value = float(self.check_and_read_parameter('~nfr_energy', 0.5))  # noqa
+        nfr_safety_value = float(self.check_and_read_parameter('~nfr_safety', 0.8))  # noqa
+        self.engine.initKB(nfr_safety_value)
 
     # MVP: callback for diagnostic msg received from QA Observer
+    # In batch mode the statuses are staged and applied in timer_cb
     def callbackDiagnostics(self, msg):
-        if self.reasoner.onto is not None and self.hasObjective is True:
-            for diagnostic_status in msg.status:
-                # 2 types of diagnostics considered: about bindings in error
-                # TODO not implemented yet) or about QAs
-                if diagnostic_status.message == "binding error":
-                    rospy.loginfo("binding error received")
-                    up_binding = self.reasoner.updateBinding(diagnostic_status)
-                    if up_binding == -1:
-                        rospy.logwarn("Unknown Function Grounding: %s",
-                                      diagnostic_status.name)
-                    elif up_binding == 0:
-                        rospy.logwarn("Diagnostics message received for %s"
-                                      + "with level %d , nothing done about it"
-                                      % (diagnostic_status.name,
-                                         diagnostic_status.level))
-
-                # Component error
-                elif diagnostic_status.message == "Component status":
-                    up_cs = self.reasoner.updateComponentStatus(diagnostic_status)   # noqa
-                    if up_cs == -1:
-                        rospy.logwarn("CS message refers to a FG not found in"
-                                      + "The KB \n we assume it refers to the"
-                                      + "current grounded_configuration \n"
-                                      + "(1st fg found in the KB)")
-                    elif up_cs == 1:
-                        rospy.loginfo(
-                            "\n\nCS Message received!\tTYPE: {0}\tVALUE: {1}"
-                            .format(diagnostic_status.values[0].key,
-                                    diagnostic_status.values[0].value))
-                    else:
-                        rospy.logdebug("Unsupported CS Message received: %s ",
-                                      str(diagnostic_status.values[0].key))
-
-                # QA Status update
-                elif diagnostic_status.message == "QA status":
-                    # rospy.loginfo(
-                    #     "QA value received for: {0}\tTYPE: {1}\tVALUE: {2}"
-                    #     .format(diagnostic_status.name,
-                    #             diagnostic_status.values[0].key,
-                    #             diagnostic_status.values[0].value))
-
-                    up_qa = self.reasoner.updateQA(diagnostic_status)
-                    if up_qa == -1:
-                        rospy.logwarn("No FG found - Discarding QA message")
-                    elif up_qa == 1:
-                        rospy.logdebug(
-                            "QA value received!\tTYPE: {0}\tVALUE: {1}"
-                            .format(diagnostic_status.values[0].key,
-                                    diagnostic_status.values[0].value))
-                    else:
-                        rospy.logwarn("Unsupported QA TYPE received: {}"
-                                      .format(diagnostic_status.values[0].key))
-                else:
-                    rospy.logdebug("Unsupported Message received: {}"
-                                  .format(diagnostic_status.message))
+        self.engine.add_diagnostics(msg.status)
+
+    # Calls the QA predictions service (Jasper's additions), on a
+    # persistent connection that is reopened after a failure.
+    # Raises an exception if the service is not available
+    def fetch_qa_predictions(self):
+        if self.qa_predictions_proxy is None:
+            self.qa_predictions_proxy = rospy.ServiceProxy(
+                '/qa_pred_update', QAPredictions, persistent=True)
+        try:
+            resp = self.qa_predictions_proxy("")
+        except Exception:
+            self.qa_predictions_proxy.close()
+            self.qa_predictions_proxy = None
+            raise
+        rospy.logdebug("QA predictions received")
+        return resp.values
 
     # for MVP with QAs - request the FD.name to reconfigure to
+    # The goal is sent without waiting for its result, the KB is updated
+    # in reconfiguration_done_cb. Returns True if the goal was sent, None
+    # if the action server is not available yet and False if the request
+    # failed
     def request_configuration(self, new_configuration):
 
-        rospy.loginfo('New Configuration requested: {}'.format(new_configuration))  # noqa
-        result = None
+        if not self.rosgraph_manipulator_client.wait_for_server(
+                timeout=rospy.Duration(0.1)):
+            rospy.logwarn("Action server not found, reconfiguration postponed")
+            return None
 
         goal = MvpReconfigurationGoal()
         goal.desired_configuration_name = new_configuration
 
-        rosgraph_manipulator_client = actionlib.SimpleActionClient(
-                self.reconfigure_srv_name,
-                MvpReconfigurationAction)
-
-        attempts = 0
-        while (
-            not rosgraph_manipulator_client.wait_for_server(
-                timeout=rospy.Duration(1.0))
-            and attempts < 5
-        ):
-            rospy.logwarn("Action server not found, waiting {}s more"
-                          .format(5-attempts))
-            attempts += 1
-
-        if attempts == 5:
-            rospy.logerr("Action server not found, Aborting reconfiguration!")
-            return None
-
         try:
-            rosgraph_manipulator_client.send_goal(goal)
-            goal_completed = rosgraph_manipulator_client.wait_for_result()
+            with self.engine.metrics.timer('request_configuration'):
+                self.rosgraph_manipulator_client.send_goal(
+                    goal,
+                    done_cb=self.reconfiguration_done_cb,
+                    feedback_cb=self.reconfiguration_feedback_cb)
         except Exception as e:
             rospy.logerr('Request creation failed %r' % (e,))
-            return None
-        else:
-            if not goal_completed:
-                rospy.logwarn("result not found")
-                return None
-            result = rosgraph_manipulator_client.get_result().result
-        rospy.loginfo('Got Reconfiguration result {}'.format(result))
-
-        return result
+            return False
+        return True
+
+    # Called by the action client when the reconfiguration finishes,
+    # updates the KB according to the result of the adaptation action
+    def reconfiguration_done_cb(self, state, result):
+        result = result.result if result is not None else None
+        rospy.loginfo('Got Reconfiguration result {0} (state {1})'
+                      .format(result, GoalStatus.to_string(state)))
+        self.engine.reconfiguration_done(
+            state == GoalStatus.SUCCEEDED and result is not None
+            and result != -1)
+
+    def reconfiguration_feedback_cb(self, feedback):
+        rospy.logdebug('Reconfiguration feedback: {}'.format(feedback))
+
+    # Publishes the latency metrics of the loop since the last period
+    def publish_metrics(self, event):
+        summary = self.engine.metrics.summary(reset=True)
+        msg = DiagnosticArray()
+        msg.header.stamp = rospy.Time.now()
+        for name, values in sorted(summary.items()):
+            status = DiagnosticStatus()
+            status.name = 'mros1_reasoner/' + name
+            status.message = 'latency'
+            status.values = [KeyValue(key, str(value))
+                             for key, value in sorted(values.items())]
+            msg.status.append(status)
+        debouncer = self.engine.component_debouncer
+        if debouncer.enabled:
+            status = DiagnosticStatus()
+            status.name = 'mros1_reasoner/component_debouncing'
+            status.message = 'counters'
+            status.values = [
+                KeyValue('forwarded', str(debouncer.forwarded)),
+                KeyValue('duplicates', str(debouncer.duplicates)),
+                KeyValue('suppressed',
+                         str(debouncer.suppressed_transitions()))] + [
+                KeyValue('suppressed/' + component, str(count))
+                for component, count in sorted(debouncer.suppressed.items())]
+            msg.status.append(status)
+        self.metrics_pub.publish(msg)
+        if self.metrics_file:
+            try:
+                self.engine.metrics.write(self.metrics_file, summary)
+            except IOError as err:
+                rospy.logwarn("Metrics not written: {}".format(err))
 
     # main metacontrol loop
     def timer_cb(self, event):
 
         rospy.loginfo('Entered timer_cb for metacontrol reasoning')
-        # If we're waiting for a response from the reconfiguration,
-        # nothing should be done
-        if self.reasoner.isInitialized is not True:
-            rospy.loginfo('Waiting to initialize Reasoner ')
-            return
-        if self.hasObjective is not True:
-            rospy.loginfo('Waiting to initialize Objective ')
-            return
 
-        # PRINT system status
-        print_ontology_status(self.reasoner.tomasys)
+        if self.use_reconfiguration_srv and \
+                self.engine.reconfiguration_timed_out():
+            self.rosgraph_manipulator_client.cancel_goal()
 
-        # EXEC REASONING to update ontology with inferences
-        if not self.reasoner.perform_reasoning():
-            rospy.logerr("Reasoning error")
-            self.reasoner.onto.save(file="error_reasoning.owl", format="rdfxml")  # noqa
+        self.engine.step()
+        self.execute_reconfigurations()
 
-        # EVALUATE functional hierarchy (objectives statuses) (MAPE - Analysis)
-        objectives_internal_error = evaluateObjectives(self.reasoner.search_objectives())  # noqa
-
-        if not objectives_internal_error:
-            rospy.loginfo("No Objectives in status ERROR: no adaptation is needed")  # noqa
-            return
-        elif len(objectives_internal_error) > 1:
-            rospy.logerr("More than 1 objective in error, not supported yet.")
-            return
-        else:
-            for obj_in_error in objectives_internal_error:
-                rospy.logwarn("Objective {0} in status {1}"
-                              .format(obj_in_error.name, obj_in_error.o_status)
-                              )
-
-        rospy.loginfo('  >> Request for QA updates **')
-        try:
-            req_qa_updates = rospy.ServiceProxy('/qa_pred_update', QAPredictions)
-            # rospy.wait_for_service('/qa_pred_update')
-            resp = req_qa_updates("")
-            self.reasoner.updateQA_pred(resp.values)
-            rospy.loginfo("QA update request send")
-        except Exception as exc:
-            print(exc)
-            rospy.loginfo('/qa_pred_update service not available')
-
-        # ADAPT MAPE -Plan & Execute
-        rospy.loginfo('\t>> Started MAPE-K ** PLAN adaptation **')
-
-        new_grounded = None
-
-        # Special cases
-
-        # Recover from failure in component.
-        if obj_in_error.o_status in ["UPDATABLE"]:
-            rospy.loginfo("\t>> UPDATABLE objective - Clear Components status")
-            for comp_inst in list(self.reasoner.tomasys.ComponentState.instances()):  # noqa
-                if comp_inst.c_status == "RECOVERED":
-                    rospy.loginfo("Component {0} Status {1} - Setting to None"
-                                  .format(comp_inst.name, comp_inst.c_status))
-                    comp_inst.c_status = None
-
-        # Ungrounded objective
-        if obj_in_error.o_status in ["UNGROUNDED"]:
-            rospy.loginfo("\t>>  UNGROUNDED objective")
-            if self.grounded_configuration is not None:
-                rospy.loginfo("\t\t>>  Trying to set to initial FD {0}"
-                              .format(self.grounded_configuration))
-                new_grounded = self.reasoner.set_new_grounding(
-                    self.grounded_configuration, obj_in_error
-                )
-
-        # Search for a new configuration
-        if not new_grounded:
-            rospy.loginfo("  >> Reasoner searches an FD ")
-            new_grounded = obtainBestFunctionDesign(obj_in_error, self.reasoner.tomasys)  # noqa
-
-        if not new_grounded:
-            rospy.logerr("No FD found to solve Objective {} ".format(obj_in_error.name))  # noqa
+    # Executes the reconfigurations planned by the engine. With the
+    # reconfiguration action, one goal at a time: the next one is sent in
+    # the first cycle after the previous one has finished
+    def execute_reconfigurations(self):
+        reconfiguration = self.engine.next_reconfiguration()
+        if reconfiguration is None:
             return
-
-        # request new configuration
-        rospy.loginfo('  >> Started MAPE-K ** EXECUTION **')
-
         if self.use_reconfiguration_srv:
-
-            rec_result = self.request_configuration(new_grounded)
-
-            # Process adaptation feedback to update KB:
-            if rec_result is not None and rec_result != -1:
-                # updates the ontology according to the result of the
-                # adaptation action
-                self.grounded_configuration = self.reasoner.set_new_grounding(
-                    new_grounded, obj_in_error)
-            else:
-                rospy.logerr("= RECONFIGURATION FAILED =")
+            # Adaptation feedback is processed in reconfiguration_done_cb
+            requested = self.request_configuration(
+                reconfiguration.configuration)
+            if requested is None:
+                # retried in the next cycle
+                self.engine.requeue_reconfiguration()
                 return
-        else:
+            if not requested:
+                self.engine.reconfiguration_done(False)
+                return
+            rospy.loginfo('Exited timer_cb after requesting reconfiguration')
+            return
+        while reconfiguration is not None:
             # Set new grounded_configuration
-            self.grounded_configuration = self.reasoner.set_new_grounding(
-                new_grounded, obj_in_error)
-
-        rospy.loginfo('Exited timer_cb after successful reconfiguration')
+            self.engine.reconfiguration_done(True)
+            rospy.loginfo('Exited timer_cb after successful reconfiguration')
+            reconfiguration = self.engine.next_reconfiguration()
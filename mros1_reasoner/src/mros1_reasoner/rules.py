@@ -0,0 +1,338 @@
+###########################################
+#
+# DESCRIPTION:
+#  Forward-chaining evaluation of the tomasys status rules in Python,
+#  used by the 'python' reasoning backend instead of Pellet.
+#
+#  Rules:
+#   - FD realisability is False if a component required by one of its
+#     roles (its roleDef being the component or its type) has c_status
+#     "FALSE"
+#   - FG status is IN_ERROR_COMPONENT if its FD is not realisable
+#   - NFR rules: an observed QA value of the FG violating the NFR of the
+#     objective it solves asserts a status. The NFR rules of a QA type
+#     are read from the SWRL rules of the model, e.g. in kb.owl
+#       hasValue(?nfr, ?nfrv), hasValue(?qa, ?qav), greaterThan(?nfrv, ?qav)
+#       -> o_status(?o, 'INTERNAL_ERROR')
+#     (safety is a lower bound). QA types without SWRL rules use the
+#     default rule: fg_status IN_ERROR_NFR if the value is not below the
+#     NFR (upper bound) or, if configured as a lower bound in
+#     NFRRules.bounds, not above it
+#   - Objective status is UNGROUNDED if no FG solves it, IN_ERROR_COMPONENT
+#     if its FG is in that status, the status asserted by a violated NFR
+#     rule of the model, IN_ERROR_NFR if its FG is in that status, and
+#     UPDATABLE if it is grounded without errors and a component has been
+#     RECOVERED
+#  As with Pellet, statuses are only asserted, never retracted: the
+#  metacontrol loop resets them when it changes the groundings.
+##########################################
+
+from collections import defaultdict, namedtuple
+import operator
+
+from owlready2 import BuiltinAtom, DatavaluedPropertyAtom
+from owlready2 import IndividualPropertyAtom, Variable
+
+from mros1_reasoner.kb_index import component_names, entity_name
+
+# SWRL comparison builtins, and the builtin comparing the arguments swapped
+COMPARISONS = {
+    'greaterThan': operator.gt,
+    'greaterThanOrEqual': operator.ge,
+    'lessThan': operator.lt,
+    'lessThanOrEqual': operator.le,
+}
+SWAPPED = {
+    'greaterThan': 'lessThan',
+    'greaterThanOrEqual': 'lessThanOrEqual',
+    'lessThan': 'greaterThan',
+    'lessThanOrEqual': 'greaterThanOrEqual',
+}
+
+# NFR rule: the observed value (qav) of qa_type violates the NFR value
+# (nfrv) if COMPARISONS[comparison](qav, nfrv), then status is asserted
+# for the 'o_status' of the objective or the 'fg_status' of the FG
+NFRRule = namedtuple('NFRRule', ['qa_type', 'comparison', 'status_property',
+                                 'status'])
+
+
+def violates(rule, qav, nfrv):
+    return COMPARISONS[rule.comparison](qav, nfrv)
+
+
+def is_lower_bound(rule):
+    """ Returns True if the NFR values of the rule are lower bounds """
+    return rule.comparison in ('lessThan', 'lessThanOrEqual')
+
+
+def default_nfr_rule(qa_type, bound='upper'):
+    """ Rule of the QA types without NFR rules in the model
+        Args:
+                bound (string): 'upper' if the observed values have to be
+                                below the NFR, 'lower' if above.
+    """
+    if bound not in ('upper', 'lower'):
+        raise ValueError("Invalid NFR bound '{0}' for {1}, use 'upper' or "
+                         "'lower'".format(bound, qa_type))
+    return NFRRule(qa_type,
+                   'greaterThanOrEqual' if bound == 'upper'
+                   else 'lessThanOrEqual',
+                   'fg_status', 'IN_ERROR_NFR')
+
+
+def parse_nfr_rule(imp):
+    """ Reads an NFR rule from a SWRL rule comparing the hasValue of a QA
+        value of an FG (hasQAvalue) with the hasValue of an NFR (hasNFR)
+        Args:
+                imp: owlready2 Imp.
+        Returns:
+                NFRRule, None if the SWRL rule is not an NFR rule
+    """
+    # variable name -> (property name, subject variable name)
+    bound_by = {}
+    # variable name -> qa type name
+    qa_types = {}
+    comparisons = []
+    for atom in imp.body:
+        if isinstance(atom, BuiltinAtom):
+            if atom.builtin in COMPARISONS and len(atom.arguments) == 2 and \
+                    all(isinstance(argument, Variable)
+                        for argument in atom.arguments):
+                comparisons.append((atom.builtin,
+                                    [a.name for a in atom.arguments]))
+        elif isinstance(atom, (IndividualPropertyAtom,
+                               DatavaluedPropertyAtom)):
+            prop = atom.property_predicate.name
+            subject, value = atom.arguments
+            if not isinstance(subject, Variable):
+                continue
+            if prop == 'isQAtype' and not isinstance(value, Variable):
+                qa_types[subject.name] = entity_name(value)
+            elif isinstance(value, Variable):
+                bound_by[value.name] = (prop, subject.name)
+    heads = [atom for atom in imp.head
+             if isinstance(atom, DatavaluedPropertyAtom) and
+             atom.property_predicate.name in ('o_status', 'fg_status') and
+             isinstance(atom.arguments[1], str)]
+    if len(comparisons) != 1 or len(heads) != 1:
+        return None
+
+    def role(variable):
+        # 'qa' for the value of an observed QA value, 'nfr' of an NFR
+        prop, subject = bound_by.get(variable, (None, None))
+        if prop != 'hasValue':
+            return None, None
+        owner = bound_by.get(subject, (None, None))[0]
+        return {'hasQAvalue': 'qa', 'hasNFR': 'nfr'}.get(owner), subject
+
+    builtin, (left, right) = comparisons[0]
+    (left_role, left_subject), (right_role, right_subject) = \
+        role(left), role(right)
+    if (left_role, right_role) == ('qa', 'nfr'):
+        qa_subject = left_subject
+    elif (left_role, right_role) == ('nfr', 'qa'):
+        builtin, qa_subject = SWAPPED[builtin], right_subject
+    else:
+        return None
+    qa_type = qa_types.get(qa_subject)
+    if qa_type is None:
+        return None
+    head = heads[0]
+    return NFRRule(qa_type, builtin, head.property_predicate.name,
+                   str(head.arguments[1]))
+
+
+class NFRRules(object):
+    """NFR rules per QA type: those of the SWRL rules of the model, read
+       once per world, and the default rule for the other QA types.
+
+       Args:
+               bounds: {qa type name: 'upper' or 'lower'} of the default
+                       rule, 'upper' if not given.
+    """
+
+    def __init__(self, bounds=None):
+        self.bounds = dict(bounds or {})
+        self.model_rules = {}
+        self._world = None
+
+    def load(self, world):
+        """ Reads the NFR rules of the SWRL rules in a world, if it was not
+            read already
+        """
+        if world is self._world:
+            return
+        self.model_rules = defaultdict(list)
+        for imp in world.rules():
+            rule = parse_nfr_rule(imp)
+            if rule is not None:
+                self.model_rules[rule.qa_type].append(rule)
+        self.model_rules = dict(self.model_rules)
+        self._world = world
+
+    def rules(self, qa_type):
+        """ Returns the NFR rules of a QA type """
+        if qa_type in self.model_rules:
+            return self.model_rules[qa_type]
+        return [default_nfr_rule(qa_type, self.bounds.get(qa_type, 'upper'))]
+
+
+class Facts(object):
+    """Indexed in-memory copy of the KB facts the status rules depend on."""
+
+    def __init__(self):
+        # name -> individual, to write back inferred values
+        self.individuals = {}
+        # component name -> c_status
+        self.c_status = {}
+        # component name -> names roleDef may refer to it by
+        self.component_names = {}
+        # fd name -> fd_realisability
+        self.fd_realisability = {}
+        # fd name -> names of the components required by its roles
+        self.fd_components = defaultdict(set)
+        # fg name -> (fd name, objective name)
+        self.fg_grounding = {}
+        # fg name -> fg_status
+        self.fg_status = {}
+        # fg name -> {qa type name: observed value}
+        self.fg_qa_values = defaultdict(dict)
+        # objective name -> o_status
+        self.o_status = {}
+        # objective name -> {qa type name: nfr value}
+        self.o_nfrs = defaultdict(dict)
+        # objective name -> names of the fgs solving it
+        self.o_groundings = defaultdict(set)
+
+
+def collect_facts(tbox):
+    """ Reads the facts used by the status rules from the KB
+        Args:
+                tbox (ontology): ontology holding the tomasys Tbox.
+        Returns:
+                Facts
+    """
+    facts = Facts()
+    for c in tbox.ComponentState.instances():
+        facts.individuals[c.name] = c
+        facts.c_status[c.name] = c.c_status
+        facts.component_names[c.name] = component_names(c)
+    for fd in tbox.FunctionDesign.instances():
+        facts.individuals[fd.name] = fd
+        facts.fd_realisability[fd.name] = fd.fd_realisability
+        for role in getattr(fd, 'roles', []):
+            component = getattr(role, 'roleDef', None)
+            if component is not None:
+                facts.fd_components[fd.name].add(component.name)
+    for o in tbox.Objective.instances():
+        facts.individuals[o.name] = o
+        facts.o_status[o.name] = o.o_status
+        for nfr in o.hasNFR:
+            facts.o_nfrs[o.name][entity_name(nfr.isQAtype)] = nfr.hasValue
+    for fg in tbox.FunctionGrounding.instances():
+        facts.individuals[fg.name] = fg
+        fd_name = fg.typeFD.name if fg.typeFD is not None else None
+        o_name = fg.solvesO.name if fg.solvesO is not None else None
+        facts.fg_grounding[fg.name] = (fd_name, o_name)
+        facts.fg_status[fg.name] = fg.fg_status
+        if o_name is not None:
+            facts.o_groundings[o_name].add(fg.name)
+        for qa in fg.hasQAvalue:
+            facts.fg_qa_values[fg.name][entity_name(qa.isQAtype)] = \
+                qa.hasValue
+    return facts
+
+
+def infer_status(facts, nfr_rules=None):
+    """ Evaluates the status rules over the facts
+        Args:
+                facts (Facts): facts read by collect_facts.
+                nfr_rules (NFRRules): NFR rules, the default rule for all
+                                      QA types if not given.
+        Returns:
+                dict {(individual name, property name): value} with the
+                values inferred by the rules
+    """
+    inferred = {}
+    if nfr_rules is None:
+        nfr_rules = NFRRules()
+
+    failed = set()
+    for c, status in facts.c_status.items():
+        if status == "FALSE":
+            failed.update(facts.component_names.get(c, [c]))
+    recovered = any(status == "RECOVERED"
+                    for status in facts.c_status.values())
+
+    # FD realisability
+    unrealisable = set(fd for fd, realisability
+                       in facts.fd_realisability.items()
+                       if realisability is False)
+    for fd, components in facts.fd_components.items():
+        if components & failed:
+            unrealisable.add(fd)
+            inferred[(fd, 'fd_realisability')] = False
+
+    # FG status, and objective statuses asserted by NFR rules
+    fg_status = dict(facts.fg_status)
+    o_nfr_status = {}
+    for fg, (fd, o) in facts.fg_grounding.items():
+        status = None
+        if o is not None:
+            observed = facts.fg_qa_values.get(fg, {})
+            for qa_type, nfr_value in facts.o_nfrs.get(o, {}).items():
+                if qa_type not in observed:
+                    continue
+                for rule in nfr_rules.rules(qa_type):
+                    if not violates(rule, observed[qa_type], nfr_value):
+                        continue
+                    if rule.status_property == 'o_status':
+                        o_nfr_status.setdefault(o, rule.status)
+                    elif status is None:
+                        status = rule.status
+        if fd in unrealisable:
+            status = "IN_ERROR_COMPONENT"
+        if status is not None:
+            fg_status[fg] = status
+            inferred[(fg, 'fg_status')] = status
+
+    # Objective status
+    for o in facts.o_status:
+        groundings = facts.o_groundings.get(o, set())
+        statuses = set(fg_status.get(fg) for fg in groundings)
+        if not groundings:
+            status = "UNGROUNDED"
+        elif "IN_ERROR_COMPONENT" in statuses:
+            status = "IN_ERROR_COMPONENT"
+        elif o in o_nfr_status:
+            status = o_nfr_status[o]
+        elif "IN_ERROR_NFR" in statuses:
+            status = "IN_ERROR_NFR"
+        elif recovered:
+            status = "UPDATABLE"
+        else:
+            continue
+        inferred[(o, 'o_status')] = status
+
+    return inferred
+
+
+def apply_status(facts, inferred):
+    """ Writes the inferred values in the KB
+        Returns:
+                dict {(individual name, property name): (old, new)} with
+                the property values modified
+    """
+    changes = {}
+    for (name, prop), value in inferred.items():
+        individual = facts.individuals[name]
+        old = getattr(individual, prop)
+        if old != value:
+            setattr(individual, prop, value)
+            changes[(name, prop)] = (old, value)
+    return changes
+
+
+def current_status(facts, name, prop):
+    """ Returns the value of a status property read by collect_facts """
+    return getattr(facts, prop).get(name)
@@ -0,0 +1,65 @@
+###########################################
+#
+# DESCRIPTION:
+#  Memoized FD selections. A selection only depends on the FDs solving
+#  the Function, which of them can be selected (realisability, error log),
+#  their QA estimations, the NFRs and the utility, so it is reused while
+#  they do not change, e.g. for the branches of a functional hierarchy not
+#  affected by a component failure.
+##########################################
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class SolutionCache(object):
+    """LRU cache of the FD selected for each selection problem, it can be
+       used from several planning threads.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._lock = Lock()
+        self._solutions = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(fd_index, rows, suitable, nfrs, utility_config):
+        """ Returns the key of a selection problem
+            Args:
+                    fd_index: FunctionDesignIndex the rows refer to.
+                    rows: rows of the FDs solving the Function.
+                    suitable: boolean mask over rows of the FDs that can
+                              be selected.
+                    nfrs: list of (QA type name, NFR value).
+                    utility_config: utility used to rank the FDs.
+        """
+        return (fd_index.generation, fd_index.pareto_pruning,
+                rows.tobytes(), suitable.tobytes(),
+                fd_index.estimations[rows].tobytes(),
+                tuple(sorted(nfrs)), repr(sorted(utility_config.items())))
+
+    def get(self, key, select):
+        """ Returns the solution of the problem with the given key,
+            computed with select() if it is not in the cache
+        """
+        with self._lock:
+            if key in self._solutions:
+                self.hits += 1
+                self._solutions.move_to_end(key)
+                return self._solutions[key]
+            self.misses += 1
+        solution = select()
+        with self._lock:
+            self._solutions[key] = solution
+            if len(self._solutions) > self.max_size:
+                self._solutions.popitem(last=False)
+        return solution
+
+    def clear(self):
+        with self._lock:
+            self._solutions.clear()
+
+    def __len__(self):
+        return len(self._solutions)
@@ -0,0 +1,97 @@
+###########################################
+#
+# DESCRIPTION:
+#  Reports the status of the KB entities (components, FGs, objectives)
+#  that changed since the last report, instead of dumping the whole KB
+#  on every cycle. Nothing is read nor formatted when the logger would
+#  discard the messages, and reports can be rate-limited.
+##########################################
+
+import logging
+import time
+
+from mros1_reasoner.kb_index import entity_name
+
+
+def _name(entity):
+    return entity.name if entity is not None else None
+
+
+def snapshot_entities(tbox):
+    """ Reads the reported state of the components, FGs and objectives
+        Returns:
+                dict {(kind, name): state tuple}
+    """
+    snapshot = {}
+    for c in tbox.ComponentState.instances():
+        snapshot[('Component', c.name)] = (c.c_status,)
+    for fg in tbox.FunctionGrounding.instances():
+        snapshot[('FG', fg.name)] = (
+            fg.fg_status, _name(fg.solvesO), _name(fg.typeFD),
+            tuple((entity_name(qa.isQAtype), qa.hasValue)
+                  for qa in fg.hasQAvalue))
+    for o in tbox.Objective.instances():
+        snapshot[('OBJECTIVE', o.name)] = (
+            o.o_status,
+            tuple((entity_name(nfr.isQAtype), nfr.hasValue)
+                  for nfr in o.hasNFR))
+    return snapshot
+
+
+def format_entity(kind, name, state):
+    if state is None:
+        return "\n\t{0}: {1}\tREMOVED".format(kind, name)
+    if kind == 'Component':
+        return "\n\tComponent: {0}\tStatus: {1}".format(name, *state)
+    if kind == 'FG':
+        return ("\n\tFG: {0}\tStatus: {1}\tSolves: {2}\tFD: {3}"
+                "\tQAvalues: {4}".format(name, *state))
+    return "\n\tOBJECTIVE: {0}\tStatus: {1}\tNFRs:  {2}".format(name, *state)
+
+
+class StatusReporter(object):
+    """Logs the entities whose status changed since the last report.
+
+       Args:
+               logger: logger of the reports ('rosout' by default).
+               level: logging level of the reports.
+               period: minimum time (s) between two reports, changes in
+                       between are reported together.
+    """
+
+    def __init__(self, logger=None, level=logging.INFO, period=0.0,
+                 clock=time.monotonic):
+        self.logger = logger or logging.getLogger('rosout')
+        self.level = level
+        self.period = period
+        self.clock = clock
+        self.last_report = None
+        self.snapshot = {}
+
+    def report(self, tbox):
+        """ Logs the changes in the KB since the last report
+            Returns:
+                    number of entities reported
+        """
+        if not self.logger.isEnabledFor(self.level):
+            return 0
+        now = self.clock()
+        if self.last_report is not None and \
+                now - self.last_report < self.period:
+            return 0
+        self.last_report = now
+        snapshot = snapshot_entities(tbox)
+        changed = sorted(key for key in set(snapshot) | set(self.snapshot)
+                         if snapshot.get(key) != self.snapshot.get(key))
+        self.snapshot = snapshot
+        if changed:
+            self.logger.log(
+                self.level, "\t\t\t >>> Ontology Status changes <<<%s",
+                ''.join(format_entity(kind, name, snapshot.get((kind, name)))
+                        for kind, name in changed))
+        return len(changed)
+
+    def reset(self):
+        """ Forgets the last snapshot, the next report is complete """
+        self.snapshot = {}
+        self.last_report = None
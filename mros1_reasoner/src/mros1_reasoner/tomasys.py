@@ -9,8 +9,17 @@
 ##########################################
 
 from owlready2 import get_ontology, destroy_entity
-from rospy import loginfo
 import logging
+import numpy as np
+
+from mros1_reasoner.fd_index import FunctionDesignIndex
+from mros1_reasoner.kb_index import entity_name
+from mros1_reasoner.utility import DEFAULT_UTILITY, evaluate_utility
+from mros1_reasoner.utility import pareto_front
+
+# rospy logs through the 'rosout' logger, so the messages still reach
+# /rosout when the library is used in a ROS node, without depending on rospy
+loginfo = logging.getLogger('rosout').info
 
 
 def loadKB_from_file(kb_file):
@@ -37,52 +46,42 @@ def resetObjStatus(objective, status=None):
     objective.o_status = status
 
 
-def resetFDRealisability(tbox, abox, c_name):
+# - component: ComponentState individual whose status is being updated
+# - dependent_fds: FDs requiring the component (see kb_index.ComponentIndex),
+#   None to reset all the FDs
+# returns the number of FDs whose realisability was reset
+def resetFDRealisability(tbox, component, dependent_fds=None):
     loginfo("\nReset realisability:\n")
-    component = abox.search_one(iri="*{}".format(c_name))
     if component is None:
         # loginfo"C not found Return\n\n\n")
-        return
+        return 0
 
     if component.c_status is None:
         # loginfo("C status None Return\n\n\n")
-        return
+        return 0
     else:
+        invalidated = 0
         if component.c_status in ["FALSE", "RECOVERED"]:
             loginfo("component status is {} - Set to None\n"
                     .format(component.c_status))
-            for fd in list(tbox.FunctionDesign.instances()):
+            if dependent_fds is None:
+                dependent_fds = list(tbox.FunctionDesign.instances())
+            for fd in dependent_fds:
                 if fd.fd_realisability is None:
                     continue
                 else:
                     loginfo("FD {0} realisability: {1} -  Set to None"
                             .format(fd.name, fd.fd_realisability))
                     fd.fd_realisability = None
+                    invalidated += 1
+            loginfo("Reset realisability of {0} FDs depending on {1}"
+                    .format(invalidated, component.name))
             component.c_status = None
-
-
-# For debugging purposes
-def print_ontology_status(kb_box):
-    loginfo("\t\t\t >>> Ontology Status   <<<")
-
-    loginfo("\n\tComponent Status:\t{0}"
-            .format([(c.name, c.c_status)
-                    for c in list(kb_box.ComponentState.instances())]))
-
-    for i in list(kb_box.FunctionGrounding.instances()):
-        loginfo(
-            "\n\tFG: {0}\tStatus: {1}\tSolves: {2}\tFD: {3}\tQAvalues: {4}"
-            .format(i.name, i.fg_status, i.solvesO.name, i.typeFD.name,
-                    [(qa.isQAtype.name, qa.hasValue) for qa in i.hasQAvalue]))
-
-    for i in list(kb_box.Objective.instances()):
-        loginfo("\n\tOBJECTIVE: {0}\tStatus: {1}\tNFRs:  {2}"
-                .format(i.name, i.o_status, [(nfr.isQAtype.name,
-                        nfr.hasValue) for nfr in i.hasNFR]))
-    loginfo("\t\t\t >>>>>>>>>>>>> <<<<<<<<<<<")
+        return invalidated
 
 
 # update the QA value for an FG with the value received
+# returns True if the KB was modified (new QA value or different value)
 def updateQAvalue(fg, qa_type, value, tbox, abox):
     qas = fg.hasQAvalue
 
@@ -90,27 +89,20 @@ def updateQAvalue(fg, qa_type, value, tbox, abox):
         qav = tbox.QAvalue("obs_{}".format(qa_type.name), namespace=abox,
                            isQAtype=qa_type, hasValue=value)
         fg.hasQAvalue.append(qav)
+        return True
     else:
         for qa in qas:
             if qa.isQAtype == qa_type:
+                if qa.hasValue == value:
+                    return False
                 qa.hasValue = value
-                return
+                return True
         # case it is a new QA type value
         qav = tbox.QAvalue("obs_{}".format(qa_type.name), isQAtype=qa_type,
                            namespace=abox, hasValue=value)
         fg.hasQAvalue.append(qav)
+        return True
 
-# Adding Jasper's funciton to update QA estimations
-def updateQAestimation(fd, qa_type, value):
-    qas = fd.hasQAestimation
-    if qas == []: # for the first qa value received
-        print("No QAestimation found")
-    else:
-        for qa in qas:
-            # converting to str and splitting because different ontology naming can cause errors otherwise
-            if str(qa.isQAtype).split('.')[-1] == str(qa_type).split('.')[-1]:
-                qa.hasValue = value
-                print("Estimation updated succesfull!")
 
 # Evaluates the Objective individuals in the KB
 # returns a list with those in error
@@ -128,115 +120,205 @@ def evaluateObjectives(objectives):
 # Select best FD in the KB, given:
 # - o: individual of tomasys:Objective
 # - tomasys ontology that contains the tomasys tbox
-def obtainBestFunctionDesign(o, tbox):
+# - fd_index: FunctionDesignIndex with the QA estimations of the FDs,
+#   a temporary one is built from the tbox if not given
+# - utility_config: utility used to rank the FDs (see utility.py)
+def obtainBestFunctionDesign(o, tbox, fd_index=None,
+                             utility_config=DEFAULT_UTILITY):
     loginfo("\t\t\t == Obtain Best Function Design ==")
+    if fd_index is None:
+        fd_index = FunctionDesignIndex()
+    fd_index.refresh(tbox)
+    rows, suitable, nfrs = candidateFunctionDesigns(o, fd_index)
+    return selectFunctionDesign(fd_index, rows, suitable, nfrs,
+                                utility_config)
+
+
+# Reads from the KB what is needed to select an FD for objective o
+# (fd_index must be up to date), returns:
+# - rows of the FDs solving the function of o in fd_index
+# - boolean mask over rows of the FDs that can be selected
+# - NFRs of o as a list of (QA type name, value)
+def candidateFunctionDesigns(o, fd_index):
     f = o.typeF
     # get fds for Function F
-    fds = []
-    for fd in list(tbox.FunctionDesign.instances()):
-        if str(fd.solvesF).split('.')[1] == str(f).split('.')[1]:
-            fds.append(fd)
+    rows = fd_index.function_rows(f)
+    fds = [fd_index.fds[row] for row in rows]
     loginfo("== FunctionDesigns AVAILABLE: %s",
-            str([fd.name for fd in fds]))
+            str([fd_index.names[row] for row in rows]))
 
     # filter fds to only those available
     # FILTER if FD realisability is NOT FALSE
     # TODO check SWRL rules are complete for this
-    realizable_fd = [fd for fd in fds if fd.fd_realisability is not False]
+    realizable = np.array([fd.fd_realisability is not False for fd in fds],
+                          dtype=bool)
     loginfo("== FunctionDesigns REALIZABLE: %s",
-            str([fd.name for fd in realizable_fd]))
+            str([fd_index.names[row] for row in rows[realizable]]))
 
     # discard FDs already grounded for this objective when objective in error
-    suitable_fds = [fd for fd in fds if (o not in fd.fd_error_log
-                                         and fd.fd_realisability is not False)]
+    suitable = realizable & np.array([o not in fd.fd_error_log for fd in fds],
+                                     dtype=bool)
     loginfo("== FunctionDesigns NOT IN ERROR LOG: %s",
-            str([fd.name for fd in suitable_fds]))
+            str([fd_index.names[row] for row in rows[suitable]]))
 
-    # discard those FD that will not meet objective NFRs
+    nfrs = [(entity_name(nfr.isQAtype), nfr.hasValue) for nfr in o.hasNFR]
+    return rows, suitable, nfrs
 
-    fds_for_obj = meetNFRs(o, suitable_fds)
+
+# Selects the best FD among the candidates (see candidateFunctionDesigns)
+# using only fd_index, so it does not access the KB.
+# Returns the name of the FD, None if no FD meets the NFRs
+def selectFunctionDesign(fd_index, rows, suitable, nfrs,
+                         utility_config=DEFAULT_UTILITY):
+    # discard those FD that will not meet objective NFRs
+    if len(nfrs) == 0 and suitable.any():
+        loginfo("== Objective has no NFRs, so a random FD is picked")
+        candidates = rows[suitable][:1]
+    else:
+        if fd_index.prunable(utility_config):
+            # only FDs on the Pareto front can be the best FD
+            rows, suitable = fd_index.prune_dominated(rows, suitable, nfrs)
+            loginfo("== FunctionDesigns ON PARETO FRONT: %s",
+                    str([fd_index.names[row] for row in rows]))
+        candidates = rows[suitable & fd_index.meet_nfrs(rows, nfrs)]
 
     # get best FD based on higher Utility/trade-off of QAs
-    if fds_for_obj != []:
+    if len(candidates) > 0:
         loginfo("== FunctionDesigns also meeting NFRs: %s",
-                [fd.name for fd in fds_for_obj])
-        best_utility = 0
-        # best_fd = fds_for_obj[0]
-        for fd in fds_for_obj:
-            utility_fd = utility(fd)
-            loginfo("== Utility for %s : %f", fd.name, utility_fd)
-            if utility_fd > best_utility:
-                best_fd = fd
-                best_utility = utility_fd
-
-        loginfo("\t\t\t == Best FD available %s", str(best_fd.name))
-        return best_fd.name
+                [fd_index.names[row] for row in candidates])
+        utilities = evaluate_utility(utility_config,
+                                     fd_index.estimations[candidates],
+                                     fd_index.columns)
+        loginfo("== Utilities: %s",
+                [(fd_index.names[row], u)
+                 for row, u in zip(candidates, utilities)])
+        # ties are broken in favour of the FDs not dominated by another
+        # tied one (an FD is never better than one dominating it), so
+        # pruning the dominated FDs does not change the FD selected
+        best = int(np.argmax(utilities))
+        ties = candidates[utilities == utilities[best]]
+        if len(ties) > 1:
+            best_fd = fd_index.names[
+                ties[pareto_front(fd_index.signed(ties))][0]]
+        else:
+            best_fd = fd_index.names[candidates[best]]
+        loginfo("\t\t\t == Best FD available %s", best_fd)
+        return best_fd
     else:
         loginfo("\t\t\t == *** NO SOLUTION FOUND ***")
         return None
 
 
-def ground_fd(fd, objective, tbox, abox):
+def ground_fd(fd, objective, tbox, abox, solve=None, created=None):
     """Given a FunctionDesign fd and an Objective objective,
        creates an individual FunctionGrounds with typeF fd and solve) objective
+       If solve is given, the Functions required by fd are grounded too:
+       a sub-objective is created for each of them (with the NFRs of
+       objective), solved with solve(sub_objective) -> FD or None, and
+       grounded recursively.
+       The individuals created are appended to the created list, if given
        returns the fg
     """
-    fg = tbox.FunctionGrounding("fg_"+fd.name.replace('fd_', ''),
+    name = "fg_"+fd.name.replace('fd_', '')
+    if abox[name] is not None:
+        # the fd already grounds another objective
+        name = "{0}_{1}".format(name, objective.name)
+    fg = tbox.FunctionGrounding(name,
                                 namespace=abox, typeFD=fd, solvesO=objective)
-    # TODO: ground objectives required by FD
+    if created is not None:
+        created.append(fg)
+    if solve is None:
+        return fg
+    # ground objectives required by FD
+    for function in getattr(fd, 'requires', []):
+        sub_objective = tbox.Objective(
+            "o_{0}_{1}".format(function.name, fg.name), namespace=abox,
+            typeF=function, hasNFR=list(objective.hasNFR))
+        fg.needsO.append(sub_objective)
+        if created is not None:
+            created.append(sub_objective)
+        sub_fd = solve(sub_objective)
+        if sub_fd is None:
+            loginfo("No FD found for sub-objective {}"
+                    .format(sub_objective.name))
+            sub_objective.o_status = "UNGROUNDED"
+        else:
+            ground_fd(sub_fd, sub_objective, tbox, abox, solve, created)
+    return fg
+
+
+def reground_fd(fd, objective, tbox, abox, solve, created, removed):
+    """Given a FunctionDesign fd and an Objective objective, grounds
+       objective with fd keeping the groundings that do not change: if
+       objective is already grounded with fd, its fg and the sub-objectives
+       of the Functions fd requires are kept, and each sub-objective is
+       solved again and regrounded the same way. Only the branches whose
+       FD changes (e.g. after a component failure) are removed and grounded
+       again with ground_fd; the selections of the unchanged ones come from
+       the memoized solve.
+       The individuals created and removed are appended to those lists
+       returns the fg
+    """
+    fg = abox.search_one(solvesO=objective)
+    if fg is None or fg.typeFD != fd:
+        removed.extend(remove_objective_grounding(objective, tbox, abox))
+        return ground_fd(fd, objective, tbox, abox, solve, created)
+    # the statuses are inferred again for the kept fg
+    fg.fg_status = None
+    sub_objectives = dict((sub_objective.typeF, sub_objective)
+                          for sub_objective in fg.needsO)
+    for function in getattr(fd, 'requires', []):
+        sub_objective = sub_objectives.pop(function, None)
+        if sub_objective is None:
+            sub_objective = tbox.Objective(
+                "o_{0}_{1}".format(function.name, fg.name), namespace=abox,
+                typeF=function)
+            fg.needsO.append(sub_objective)
+            created.append(sub_objective)
+        if list(sub_objective.hasNFR) != list(objective.hasNFR):
+            sub_objective.hasNFR = list(objective.hasNFR)
+        resetObjStatus(sub_objective)
+        sub_fd = solve(sub_objective)
+        if sub_fd is None:
+            loginfo("No FD found for sub-objective {}"
+                    .format(sub_objective.name))
+            removed.extend(
+                remove_objective_grounding(sub_objective, tbox, abox))
+            sub_objective.o_status = "UNGROUNDED"
+        else:
+            reground_fd(sub_fd, sub_objective, tbox, abox, solve, created,
+                        removed)
+    # Functions no longer required by fd
+    for sub_objective in sub_objectives.values():
+        removed.extend(remove_objective_grounding(sub_objective, tbox, abox))
+        fg.needsO.remove(sub_objective)
+        removed.append(sub_objective)
+        destroy_entity(sub_objective)
     return fg
 
 
 def remove_objective_grounding(objective, tbox, abox):
     """Given an objective individual,
        removes the grounded hierarchy (fg tree) that solves it.
+       returns the list of removed individuals (fgs and sub-objectives),
+       empty if the objective was not grounded
     """
+    removed = []
     fg = abox.search_one(solvesO=objective)
     if fg:
+        for sub_objective in list(getattr(fg, 'needsO', [])):
+            removed.extend(
+                remove_objective_grounding(sub_objective, tbox, abox))
+            removed.append(sub_objective)
+            destroy_entity(sub_objective)
+        removed.append(fg)
         destroy_entity(fg)
+    return removed
 
 
-# Returns all FunctionDesign individuals from a given set (fds)
-# that comply with the NFRs of a given Objective individual (o)
-def meetNFRs(objective, fds):
-    if fds == []:
-        loginfo("Empty set of FDs")
-        return []
-    filtered = []
-    if len(objective.hasNFR) == 0:
-        loginfo("== Objective has no NFRs, so a random FD is picked")
-        return [next(iter(fds))]
-    # loginfo("== Checking FDs for Objective with NFRs type: %s "
-    #                 + "and value %s ", str(o.hasNFR[0].isQAtype.name),
-    #                 str(o.hasNFR[0].hasValue))
-
-    for fd in fds:
-        for nfr in objective.hasNFR:
-            qas = [qa for qa in fd.hasQAestimation if str(qa.isQAtype).split('.')[-1] == str(nfr.isQAtype).split('.')[-1]]  # noqa
-        if len(qas) != 1:
-            loginfo("FD has no expected value for this QA "
-                    + "or multiple definitions (inconsistent)")
-            break
-        else:
-            # Check if qa is meet
-            if qas[0].hasValue < nfr.hasValue:
-                filtered.append(fd)
-    if filtered == []:
-        loginfo("No FDs meet NFRs")
-
-    return filtered
-
-
-# Compute expected utility based on QA trade-off,
-# the criteria to chose FDs/configurations
-# TODO utility is the selection criteria for FDs
-# and it is hardcoded as QA performance
-def utility(fd):
-    # utility is equal to the expected performance
-    utility = [qa for qa in fd.hasQAestimation if qa.isQAtype.name == "performance"]  # noqa
-    if len(utility) != 1:
-        loginfo("FD has no expected value for this QA "
-                + "or multiple definitions (inconsistent)")
-        return 0.001
-    else:
-        return utility[0].hasValue
+def parent_objective(objective, abox):
+    """Returns the objective whose grounding requires objective (a
+       sub-objective), None for a root objective
+    """
+    fg = abox.search_one(needsO=objective)
+    return fg.solvesO if fg is not None else None
@@ -0,0 +1,191 @@
+###########################################
+#
+# DESCRIPTION:
+#  Utility functions used to select the best FunctionDesign among the
+#  candidates for an Objective, the criteria to chose FDs/configurations.
+#
+#  A utility function is evaluated in batch over all candidates:
+#    utility(estimations, columns, **params) -> array of utilities
+#  - estimations: numpy array (candidate FDs x QA types), NaN if missing
+#  - columns: dict {QA type name: column in estimations}
+#  Higher utilities are better.
+#
+#  Utility configurations are dicts such as
+#    {'function': 'weighted_sum',
+#     'weights': {'performance': 1.0, 'energy': -0.5}}
+#  where negative weights mean that lower values of the QA are better.
+##########################################
+
+import numpy as np
+
+
+UTILITY_FUNCTIONS = {}
+
+DEFAULT_UTILITY = {'function': 'performance'}
+
+
+def register_utility(name):
+    """ Decorator adding a utility function to the registry """
+    def register(function):
+        UTILITY_FUNCTIONS[name] = function
+        return function
+    return register
+
+
+def get_utility(name):
+    """ Returns the utility function registered with a given name
+        Raises:
+                ValueError: if there is no utility with that name.
+    """
+    if name not in UTILITY_FUNCTIONS:
+        raise ValueError("Unknown utility function '{0}', available: {1}"
+                         .format(name, sorted(UTILITY_FUNCTIONS.keys())))
+    return UTILITY_FUNCTIONS[name]
+
+
+def utility_config_for(configs, objective_name):
+    """ Returns the utility configuration for an objective
+        Args:
+                configs (dict): {objective name: utility configuration},
+                                'default' is used for objectives not listed.
+    """
+    if not configs:
+        return DEFAULT_UTILITY
+    return configs.get(objective_name,
+                       configs.get('default', DEFAULT_UTILITY))
+
+
+def evaluate_utility(config, estimations, columns):
+    """ Evaluates a utility configuration over all the candidates
+        Returns:
+                numpy array with the utility of each row of estimations
+    """
+    params = dict(config)
+    function = get_utility(params.pop('function', 'performance'))
+    return function(estimations, columns, **params)
+
+
+def utility_directions(config):
+    """ Returns the direction the utility prefers for each QA type it uses
+        Returns:
+                dict {QA type name: 1.0 if higher values are better, -1.0
+                if lower}, None for utility functions whose preferences
+                are not known
+    """
+    function = config.get('function', 'performance')
+    if function == 'performance':
+        return {'performance': 1.0}
+    if function in ('weighted_sum', 'pareto'):
+        weights = config.get('weights') or {'performance': 1.0}
+        return dict((qa_type, 1.0 if weight > 0 else -1.0)
+                    for qa_type, weight in weights.items() if weight != 0)
+    if function == 'lexicographic':
+        return dict((qa_type.lstrip('-'),
+                     -1.0 if qa_type.startswith('-') else 1.0)
+                    for qa_type in config.get('order', ('performance',)))
+    return None
+
+
+def _rank_scores(keys):
+    """ Converts sort keys (primary key last, ascending is better, as in
+        np.lexsort) into utilities: the best candidate gets the highest one
+    """
+    n = len(keys[0]) if len(keys) > 0 else 0
+    order = np.lexsort(keys)
+    scores = np.empty(n)
+    scores[order] = np.arange(n, 0, -1)
+    return scores
+
+
+def _weighted_columns(estimations, columns, weights):
+    """ Yields the weighted estimations of the QA types in weights that
+        are estimated, missing estimations are NaN
+    """
+    for qa_type, weight in weights.items():
+        column = columns.get(qa_type)
+        if column is not None:
+            yield estimations[:, column] * float(weight)
+
+
+# utility is equal to the expected performance, as the original
+# tomasys.utility (0.001 when there is no estimation)
+@register_utility('performance')
+def performance_utility(estimations, columns, default=0.001):
+    column = columns.get('performance')
+    if column is None:
+        return np.full(len(estimations), default)
+    utilities = estimations[:, column]
+    return np.where(np.isnan(utilities), default, utilities)
+
+
+# sum of the weighted QA estimations, missing estimations do not contribute
+@register_utility('weighted_sum')
+def weighted_sum_utility(estimations, columns, weights=None):
+    utilities = np.zeros(len(estimations))
+    for values in _weighted_columns(estimations, columns,
+                                    weights or {'performance': 1.0}):
+        utilities += np.nan_to_num(values)
+    return utilities
+
+
+# QAs are compared in the given order, the next QA only breaks ties.
+# A '-' prefix means lower values are better, missing estimations are worst
+@register_utility('lexicographic')
+def lexicographic_utility(estimations, columns, order=('performance',)):
+    keys = []
+    for qa_type in reversed(list(order)):
+        sign = -1.0 if qa_type.startswith('-') else 1.0
+        column = columns.get(qa_type.lstrip('-'))
+        if column is None:
+            continue
+        values = estimations[:, column] * sign
+        keys.append(-np.where(np.isnan(values), -np.inf, values))
+    if not keys:
+        return np.zeros(len(estimations))
+    return _rank_scores(keys)
+
+
+# Candidates on the Pareto front are better, ties are broken with the
+# weighted sum. The weights signs give whether higher or lower values of
+# each QA are better
+@register_utility('pareto')
+def pareto_utility(estimations, columns, weights=None):
+    weights = weights or {'performance': 1.0}
+    weighted = list(_weighted_columns(estimations, columns, weights))
+    if not weighted:
+        return np.zeros(len(estimations))
+    values = np.stack(weighted, axis=1)
+    front = pareto_front(values)
+    return _rank_scores([-np.nan_to_num(values).sum(axis=1), ~front])
+
+
+def dominates(values, point):
+    """ Boolean mask of the rows of values that dominate point, higher
+        values are better (all greater or equal and at least one greater).
+        Comparisons with NaN never dominate.
+    """
+    with np.errstate(invalid='ignore'):
+        return ((values >= point).all(axis=1)
+                & (values > point).any(axis=1))
+
+
+def dominated(values, point):
+    """ Boolean mask of the rows of values dominated by point """
+    with np.errstate(invalid='ignore'):
+        return ((point >= values).all(axis=1)
+                & (point > values).any(axis=1))
+
+
+def pareto_front(values):
+    """ Boolean mask of the rows of values not dominated by any other row.
+        A row can only be dominated by rows with a greater sum, so rows are
+        visited by decreasing sum and only compared with the front found.
+    """
+    front = np.zeros(len(values), dtype=bool)
+    members = []
+    for row in np.argsort(-np.nan_to_num(values).sum(axis=1),
+                          kind='stable'):
+        if not members or not dominates(values[members], values[row]).any():
+            members.append(row)
+            front[row] = True
+    return front
@@ -0,0 +1,567 @@
+#!/usr/bin/env python
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+from owlready2 import World, Thing, ObjectProperty, DataProperty
+from owlready2 import FunctionalProperty
+import numpy as np
+
+from mros1_reasoner.engine import MetacontrolEngine
+from mros1_reasoner.fd_index import FunctionDesignIndex
+from mros1_reasoner.kb_cache import load_snapshot, save_snapshot
+from mros1_reasoner.component_debouncer import ComponentDebouncer
+from mros1_reasoner.reasoning import PythonRulesBackend
+from mros1_reasoner.local_transport import LocalTransport, component_status
+from mros1_reasoner.local_transport import qa_status, KeyValue
+from mros1_reasoner.prediction_cache import CachedPredictor
+from mros1_reasoner.qa_smoothing import QASmoother
+from mros1_reasoner.status_reporter import StatusReporter
+from mros1_reasoner.qa_table import read_qa_table, import_qa_estimations
+from mros1_reasoner.qa_table import export_qa_estimations
+from mros1_reasoner.tomasys import selectFunctionDesign
+
+# Subset of the tomasys metamodel used by the engine
+CLASSES = ['Function', 'Objective', 'FunctionDesign', 'FunctionGrounding',
+           'QAvalue', 'QualityAttributeType', 'ComponentState', 'Role',
+           'ComponentClass']
+OBJECT_PROPERTIES = ['hasQAvalue', 'hasQAestimation', 'hasNFR',
+                     'fd_error_log', 'roles', 'requires', 'needsO']
+FUNCTIONAL_OBJECT_PROPERTIES = ['typeF', 'solvesF', 'solvesO', 'typeFD',
+                                'isQAtype', 'roleDef', 'typeC']
+DATA_PROPERTIES = ['hasValue', 'o_status', 'fg_status', 'fd_realisability',
+                   'c_status']
+
+# (name, function, performance, safety, component) of the FDs
+FUNCTION_DESIGNS = [
+    ('fd_fast', 'f_navigate', 0.9, 0.7, 'laser'),
+    ('fd_safe', 'f_navigate', 0.5, 0.3, 'battery'),
+    ('fd_slow', 'f_navigate', 0.2, 0.2, 'battery'),
+    ('fd_camera', 'f_perceive', 0.6, 0.5, 'camera'),
+    ('fd_lidar', 'f_perceive', 0.8, 0.4, 'laser'),
+]
+
+
+def build_tbox(world):
+    """ Builds a minimal tomasys Tbox """
+    tbox = world.get_ontology('http://metacontrol.org/tomasys#')
+    with tbox:
+        for name in CLASSES:
+            types.new_class(name, (Thing,))
+        for name in OBJECT_PROPERTIES:
+            types.new_class(name, (ObjectProperty,))
+        for name in FUNCTIONAL_OBJECT_PROPERTIES:
+            types.new_class(name, (ObjectProperty, FunctionalProperty))
+        for name in DATA_PROPERTIES:
+            types.new_class(name, (DataProperty, FunctionalProperty))
+    return tbox
+
+
+def build_kb(world):
+    """ Builds a minimal tomasys Tbox and a navigation model """
+    tbox = build_tbox(world)
+    onto = world.get_ontology('http://ros/navigation#')
+    functions = dict((name, tbox.Function(name, namespace=onto))
+                     for name in ('f_navigate', 'f_perceive'))
+    performance = tbox.QualityAttributeType('performance', namespace=onto)
+    safety = tbox.QualityAttributeType('safety', namespace=onto)
+    components = dict((name, tbox.ComponentState(name, namespace=onto))
+                      for name in ('laser', 'battery', 'camera'))
+    for name, function, performance_value, safety_value, component in \
+            FUNCTION_DESIGNS:
+        fd = tbox.FunctionDesign(name, namespace=onto,
+                                 solvesF=functions[function])
+        fd.hasQAestimation = [
+            tbox.QAvalue('qa_performance_' + name, namespace=onto,
+                         isQAtype=performance, hasValue=performance_value),
+            tbox.QAvalue('qa_safety_' + name, namespace=onto,
+                         isQAtype=safety, hasValue=safety_value)]
+        fd.roles = [tbox.Role('r_' + name, namespace=onto,
+                              roleDef=components[component])]
+    return tbox, onto
+
+
+class TestMetacontrolEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = MetacontrolEngine()
+        self.init_engine(self.engine)
+        self.engine.initKB(nfr_safety_value=0.8)
+        self.objective = self.engine.reasoner.lookup('o_navigateA')
+
+    @staticmethod
+    def init_engine(engine):
+        reasoner = engine.reasoner
+        reasoner.tomasys, reasoner.onto = build_kb(World())
+        reasoner.reasoning_backend = PythonRulesBackend()
+        reasoner.build_index()
+
+    def grounded_fd(self, objective=None, engine=None):
+        fg = (engine or self.engine).reasoner.onto.search_one(
+            solvesO=objective or self.objective)
+        return fg.typeFD.name if fg is not None else None
+
+    def test_runs_without_ros(self):
+        self.assertNotIn('rospy', sys.modules)
+
+    def test_reasoning_skipped_without_changes(self):
+        reasoner = self.engine.reasoner
+        transport = LocalTransport(self.engine)
+        # grounds the objective, then reasons on the new grounding
+        transport.spin(2)
+        stats = reasoner.reasoning_stats()
+        transport.spin_once()
+        self.assertEqual(reasoner.reasoning_stats(),
+                         {'runs': stats['runs'], 'skips': stats['skips'] + 1})
+        transport.publish(qa_status('fg_fast', 'safety', 0.5))
+        transport.spin_once()
+        self.assertEqual(reasoner.reasoning_stats(),
+                         {'runs': stats['runs'] + 1,
+                          'skips': stats['skips'] + 1})
+        reasoner.incremental_reasoning = False
+        transport.spin_once()
+        self.assertEqual(reasoner.reasoning_stats()['runs'],
+                         stats['runs'] + 2)
+
+    def test_diagnostics_coalesced_per_cycle(self):
+        buffer = self.engine.diagnostics_buffer
+        transport = LocalTransport(self.engine)
+        transport.spin_once()
+        # only the last QA value of an FG is applied in a cycle
+        transport.publish(qa_status('fg_fast', 'safety', 0.4),
+                          qa_status('fg_fast', 'safety', 0.5),
+                          component_status('camera', 'FALSE'),
+                          qa_status('fg_fast', 'safety', 0.6))
+        transport.spin_once()
+        self.assertEqual(buffer.received, 4)
+        self.assertEqual(buffer.last_coalesced, 2)
+        self.assertEqual(len(buffer), 0)
+        fg = self.engine.reasoner.lookup('fg_fast')
+        self.assertEqual(fg.hasQAvalue[0].hasValue, 0.6)
+        self.assertEqual(self.engine.reasoner.lookup('camera').c_status,
+                         'FALSE')
+        transport.spin_once()
+        self.assertEqual(buffer.last_coalesced, 0)
+
+    def test_loop_metrics(self):
+        metrics = self.engine.metrics
+        transport = LocalTransport(self.engine)
+        # disabled by default: nothing is measured
+        transport.spin_once()
+        self.assertEqual(metrics.summary(), {})
+        metrics.enabled = True
+        transport.spin(2)
+        summary = metrics.summary(reset=True)
+        for name in ('cycle', 'diagnostics', 'reasoning'):
+            self.assertEqual(summary[name]['count'], 2, name)
+            self.assertGreaterEqual(summary[name]['max_ms'],
+                                    summary[name]['mean_ms'])
+        self.assertEqual(metrics.summary()['cycle']['count'], 0)
+
+    def test_status_reporter_logs_changes(self):
+        tbox = self.engine.reasoner.tomasys
+        reporter = StatusReporter(logging.getLogger('rosout'))
+        with self.assertLogs('rosout', 'INFO') as logs:
+            # the first report includes all the entities
+            self.assertEqual(reporter.report(tbox), 4)
+            self.assertEqual(reporter.report(tbox), 0)
+            self.engine.reasoner.lookup('camera').c_status = 'FALSE'
+            self.objective.o_status = 'IN_ERROR_NFR'
+            self.assertEqual(reporter.report(tbox), 2)
+            # nothing is read when the reports would be discarded
+            reporter.level = logging.DEBUG
+            self.engine.reasoner.lookup('camera').c_status = None
+            self.assertEqual(reporter.report(tbox), 0)
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn('Component: camera\tStatus: FALSE', logs.output[1])
+        self.assertIn('OBJECTIVE: o_navigateA\tStatus: IN_ERROR_NFR',
+                      logs.output[1])
+        self.assertNotIn('fd_', logs.output[1])
+
+    def test_grounds_ungrounded_objective(self):
+        transport = LocalTransport(self.engine)
+        decisions = transport.spin_once()
+        self.assertEqual([d.configuration for d in decisions], ['fd_fast'])
+        self.assertEqual(self.grounded_fd(), 'fd_fast')
+        # no adaptation is needed once grounded
+        self.assertEqual(transport.spin_once(), [])
+
+    def test_component_failure(self):
+        transport = LocalTransport(self.engine)
+        transport.spin_once()
+        transport.publish(component_status('laser', 'FALSE'))
+        decisions = transport.spin_once()
+        self.assertEqual([d.configuration for d in decisions], ['fd_safe'])
+        self.assertEqual(self.grounded_fd(), 'fd_safe')
+
+    def test_failed_reconfiguration(self):
+        transport = LocalTransport(self.engine,
+                                   reconfigure=lambda configuration: False)
+        transport.spin_once()
+        self.assertIsNone(self.grounded_fd())
+        self.assertIsNone(self.engine.pending_reconfiguration)
+        self.assertEqual(transport.reconfigurations,
+                         [('fd_fast', ['o_navigateA'], False)])
+
+    def test_postponed_reconfiguration_is_requeued(self):
+        self.engine.step()
+        reconfiguration = self.engine.next_reconfiguration()
+        self.assertEqual(reconfiguration.configuration, 'fd_fast')
+        # the action server is not available yet
+        self.engine.requeue_reconfiguration()
+        self.assertIsNone(self.engine.pending_reconfiguration)
+        self.assertTrue(self.engine.reconfiguration_in_progress())
+        self.assertEqual(self.engine.step(), [])
+        self.assertIs(self.engine.next_reconfiguration(), reconfiguration)
+        self.assertEqual(self.engine.reconfiguration_done(True), 'fd_fast')
+        self.assertEqual(self.grounded_fd(), 'fd_fast')
+
+    def test_component_recovery_resets_dependent_fds(self):
+        reasoner = self.engine.reasoner
+        transport = LocalTransport(self.engine)
+        transport.publish(component_status('laser', 'FALSE'),
+                          component_status('battery', 'FALSE'))
+        transport.spin_once()
+        transport.publish(component_status('laser', 'RECOVERED'))
+        transport.spin_once()
+        # only fd_fast and fd_lidar require the laser
+        self.assertEqual(reasoner.last_invalidated_fds, 2)
+        self.assertIs(reasoner.lookup('fd_safe').fd_realisability, False)
+
+    def test_component_recovery_with_component_classes(self):
+        # layout of the tomasys models: the roles are defined by component
+        # classes, the status is reported on a ComponentState of that type
+        reasoner = self.engine.reasoner
+        tbox, onto = reasoner.tomasys, reasoner.onto
+        classes = {}
+        for fd in tbox.FunctionDesign.instances():
+            for role in fd.roles:
+                name = role.roleDef.name
+                if name not in classes:
+                    classes[name] = tbox.ComponentClass(
+                        'cc_' + name, namespace=onto)
+                    role.roleDef.typeC = classes[name]
+                role.roleDef = classes[name]
+        tbox.ComponentState('gps', namespace=onto, c_status='FALSE')
+        reasoner.build_index()
+        transport = LocalTransport(self.engine)
+        transport.spin_once()
+        transport.publish(component_status('laser', 'FALSE'))
+        transport.spin_once()
+        self.assertIs(reasoner.lookup('fd_fast').fd_realisability, False)
+        self.assertIs(reasoner.lookup('fd_lidar').fd_realisability, False)
+        self.assertIsNone(reasoner.lookup('fd_safe').fd_realisability)
+        transport.publish(component_status('laser', 'RECOVERED'))
+        transport.spin_once()
+        self.assertEqual(reasoner.last_invalidated_fds, 2)
+        # no role refers to the gps: all the FDs may depend on it
+        reasoner.lookup('fd_safe').fd_realisability = False
+        reasoner.lookup('fd_camera').fd_realisability = False
+        transport.publish(component_status('gps', 'RECOVERED'))
+        transport.spin_once()
+        self.assertEqual(reasoner.last_invalidated_fds, 2)
+
+    def test_component_flapping_is_debounced(self):
+        now = [0.0]
+        self.engine.component_debouncer = ComponentDebouncer(
+            confirmations=2, window=3, dwell_time=5.0, clock=lambda: now[0])
+        transport = LocalTransport(self.engine)
+        transport.spin_once()
+        # a single FALSE report is not confirmed
+        transport.publish(component_status('laser', 'FALSE'))
+        self.assertEqual(transport.spin_once(), [])
+        self.assertEqual(self.grounded_fd(), 'fd_fast')
+        transport.publish(component_status('laser', 'FALSE'))
+        decisions = transport.spin_once()
+        self.assertEqual([d.configuration for d in decisions], ['fd_safe'])
+        # confirmed recovery, but within the dwell time
+        now[0] = 1.0
+        transport.publish(component_status('laser', 'RECOVERED'),
+                          component_status('laser', 'RECOVERED'))
+        self.assertEqual(transport.spin_once(), [])
+        self.assertEqual(self.engine.component_debouncer.suppressed['laser'],
+                         3)
+
+    def test_held_back_component_status_is_released(self):
+        now = [0.0]
+        self.engine.component_debouncer = ComponentDebouncer(
+            dwell_time=5.0, clock=lambda: now[0])
+        reasoner = self.engine.reasoner
+        transport = LocalTransport(self.engine)
+        transport.spin_once()
+        transport.publish(component_status('laser', 'FALSE'))
+        transport.spin_once()
+        self.assertEqual(self.grounded_fd(), 'fd_safe')
+        # the recovery is reported only once, within the dwell time
+        now[0] = 1.0
+        transport.publish(component_status('laser', 'RECOVERED'))
+        transport.spin_once()
+        self.assertIs(reasoner.lookup('fd_fast').fd_realisability, False)
+        now[0] = 4.0
+        transport.spin_once()
+        self.assertIs(reasoner.lookup('fd_fast').fd_realisability, False)
+        # and applied once the dwell time has passed
+        now[0] = 5.0
+        transport.spin_once()
+        self.assertIsNone(reasoner.lookup('fd_fast').fd_realisability)
+        self.assertEqual(self.engine.component_debouncer.status('laser'),
+                         'RECOVERED')
+        self.assertEqual(self.engine.component_debouncer.release(), [])
+
+    def test_qa_outlier_is_smoothed(self):
+        self.engine.qa_smoother = QASmoother('percentile', window=5)
+        transport = LocalTransport(self.engine)
+        transport.spin_once()
+        for value in (0.5, 0.5, 0.9, 0.5):
+            transport.publish(qa_status('fg_fast', 'safety', value))
+        # the samples coalesced in one cycle are smoothed too
+        self.assertEqual(transport.spin_once(), [])
+        transport.publish(qa_status('fg_fast', 'safety', 0.95))
+        self.assertEqual(transport.spin_once(), [])
+        fg = self.engine.reasoner.lookup('fg_fast')
+        self.assertEqual(fg.hasQAvalue[0].hasValue, 0.5)
+
+    def test_cached_qa_predictions(self):
+        now = [0.0]
+        predictor = CachedPredictor(lambda: [KeyValue('fd_fast', '0.9')],
+                                    ttl=5.0, clock=lambda: now[0])
+        self.engine.qa_predictor = predictor
+        self.assertIsNone(predictor())
+        predictor.refresh()
+        # fd_fast is predicted not to meet the safety NFR
+        decisions = LocalTransport(self.engine).spin_once()
+        self.assertEqual([d.configuration for d in decisions], ['fd_safe'])
+        now[0] = 10.0
+        self.assertIsNone(predictor())
+        self.assertEqual(predictor.stale_reads, 2)
+
+    def test_qa_prediction_keys(self):
+        reasoner = self.engine.reasoner
+        # "fd/qa" keys name the QA type, plain "fd" keys predict the
+        # prediction_qa_type (safety)
+        self.assertEqual(reasoner.updateQA_pred([
+            KeyValue('fd_fast/performance', '0.3'),
+            KeyValue('fd_fast', '0.95'),
+            KeyValue('fd_safe/cost', '1.0'),
+            KeyValue('fd_slow', 'invalid')]), 1)
+        fd_index = reasoner.fd_index
+        estimations = fd_index.estimations[fd_index.rows['fd_fast']]
+        self.assertEqual(estimations[fd_index.columns['performance']], 0.3)
+        self.assertEqual(estimations[fd_index.columns['safety']], 0.95)
+        self.assertEqual(
+            [qa.hasValue for qa in reasoner.lookup('fd_slow').hasQAestimation],
+            [0.2, 0.2])
+        # predictions of unknown FDs or QA types are not applied
+        self.assertEqual(reasoner.updateQA_pred([
+            KeyValue('fd_unknown', '0.1'),
+            KeyValue('fd_fast/cost', '0.1')]), 0)
+
+    def test_qa_estimations_csv(self):
+        reasoner = self.engine.reasoner
+        fd, csv_file = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, csv_file)
+        self.assertEqual(export_qa_estimations(reasoner, csv_file), 5)
+        rows = dict(read_qa_table(csv_file))
+        self.assertEqual(sorted(rows['fd_fast']),
+                         [('performance', 0.9), ('safety', 0.7)])
+        with open(csv_file, 'w') as f:
+            f.write('Configuration name,safety,cost,\n'
+                    'fd_fast,0.9,1.0,\nfd_unknown,0.1,,\n')
+        stats = import_qa_estimations(reasoner, read_qa_table(csv_file))
+        self.assertEqual(stats, (1, 0, 0, ['fd_unknown'], ['cost']))
+        decisions = LocalTransport(self.engine).spin_once()
+        self.assertEqual([d.configuration for d in decisions], ['fd_safe'])
+
+    def test_journal_restores_kb_state(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        engine = MetacontrolEngine()
+        self.init_engine(engine)
+        engine.open_journal(directory, checkpoint_interval=3)
+        engine.initKB(nfr_safety_value=0.8)
+        transport = LocalTransport(engine)
+        transport.spin_once()
+        transport.publish(component_status('laser', 'FALSE'))
+        transport.spin_once()
+        transport.publish(qa_status('fg_safe', 'safety', 0.25))
+        transport.spin_once()
+        engine.reasoner.journal.close()
+
+        # a new node on the same model restores the state
+        restored = MetacontrolEngine()
+        self.init_engine(restored)
+        self.assertGreater(restored.open_journal(directory), 0)
+        restored.initKB()
+        reasoner = restored.reasoner
+        objective = reasoner.lookup('o_navigateA')
+        self.assertEqual(self.grounded_fd(objective, restored), 'fd_safe')
+        self.assertEqual(reasoner.lookup('laser').c_status, 'FALSE')
+        self.assertEqual(reasoner.lookup('fg_safe').hasQAvalue[0].hasValue,
+                         0.25)
+        self.assertEqual(LocalTransport(restored).spin_once(), [])
+
+    def test_kb_snapshot(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        tbox, onto = build_kb(World())
+        files = [os.path.join(directory, 'tomasys.owl'),
+                 os.path.join(directory, 'navigation.owl')]
+        tbox.save(file=files[0])
+        onto.save(file=files[1])
+        uris = ['file://' + files[0], 'file://' + files[1]]
+        world = World()
+        ontologies = [world.get_ontology(uri).load() for uri in uris]
+        cache_dir = os.path.join(directory, 'cache')
+        self.assertIsNotNone(save_snapshot(cache_dir, uris, ontologies,
+                                           world))
+
+        # the URIs are resolved to the files, and keyed on their contents
+        cached = load_snapshot(cache_dir, files, World())
+        self.assertEqual([o.base_iri for o in cached],
+                         [o.base_iri for o in ontologies])
+        self.assertIsNotNone(cached[1].fd_fast)
+        with open(files[1], 'a') as f:
+            f.write('\n')
+        with self.assertLogs('rosout', 'WARNING'):
+            self.assertIsNone(load_snapshot(cache_dir, uris + [
+                os.path.join(directory, 'missing.owl')], World()))
+        self.assertIsNone(load_snapshot(cache_dir, uris, World()))
+
+    def test_journal_restores_recovered_components_reset(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        engine = MetacontrolEngine()
+        self.init_engine(engine)
+        engine.open_journal(directory)
+        engine.initKB(nfr_safety_value=0.8)
+        transport = LocalTransport(engine)
+        transport.spin_once()
+        transport.publish(component_status('laser', 'FALSE'))
+        transport.spin_once()
+        # the objective is UPDATABLE once the laser is RECOVERED, then the
+        # status of the laser is reset
+        transport.publish(component_status('laser', 'RECOVERED'))
+        decisions = transport.spin_once()
+        self.assertEqual([d.configuration for d in decisions], ['fd_fast'])
+        self.assertIsNone(engine.reasoner.lookup('laser').c_status)
+        engine.reasoner.journal.close()
+
+        restored = MetacontrolEngine()
+        self.init_engine(restored)
+        restored.open_journal(directory)
+        restored.initKB()
+        reasoner = restored.reasoner
+        self.assertIsNone(reasoner.lookup('laser').c_status)
+        self.assertEqual(
+            self.grounded_fd(reasoner.lookup('o_navigateA'), restored),
+            'fd_fast')
+        self.assertEqual(LocalTransport(restored).spin_once(), [])
+
+    def test_multiple_objectives(self):
+        o_perceive = self.engine.reasoner.get_new_tomasys_objective(
+            'o_perceive', '*f_perceive')
+        o_perceive.hasNFR.append(self.engine.reasoner.get_new_tomasys_nrf(
+            'nfr_perceive_safety', '*safety', 0.8))
+        o_perceive.o_status = 'UNGROUNDED'
+        self.engine.planning_workers = 2
+        transport = LocalTransport(self.engine)
+        decisions = transport.spin_once()
+        self.assertEqual(sorted(d.configuration for d in decisions),
+                         ['fd_fast', 'fd_lidar'])
+        self.assertEqual(self.grounded_fd(), 'fd_fast')
+        self.assertEqual(self.grounded_fd(o_perceive), 'fd_lidar')
+        # both objectives are replanned after a failure of the laser
+        transport.publish(component_status('laser', 'FALSE'))
+        decisions = transport.spin_once()
+        self.assertEqual(sorted(d.configuration for d in decisions),
+                         ['fd_camera', 'fd_safe'])
+
+    def test_hierarchical_grounding(self):
+        reasoner = self.engine.reasoner
+        reasoner.lookup('fd_fast').requires = [reasoner.lookup('f_perceive')]
+        transport = LocalTransport(self.engine)
+        transport.spin_once()
+        fg = reasoner.onto.search_one(solvesO=self.objective)
+        self.assertEqual(len(fg.needsO), 1)
+        sub_objective = fg.needsO[0]
+        self.assertEqual(self.grounded_fd(sub_objective), 'fd_lidar')
+        # unchanged selection problems are solved from the cache, and their
+        # groundings kept
+        misses = reasoner.solution_cache.misses
+        reasoner.set_new_grounding('fd_fast', self.objective)
+        self.assertEqual(reasoner.solution_cache.misses, misses)
+        self.assertGreater(reasoner.solution_cache.hits, 0)
+        self.assertIs(reasoner.onto.search_one(solvesO=self.objective), fg)
+        self.assertEqual(fg.needsO, [sub_objective])
+        sub_fg = reasoner.onto.search_one(solvesO=sub_objective)
+        self.assertEqual(sub_fg.typeFD.name, 'fd_lidar')
+        # only the branch whose FD changes is grounded again
+        reasoner.lookup('fd_lidar').fd_realisability = False
+        reasoner.set_new_grounding('fd_fast', self.objective)
+        self.assertIs(reasoner.onto.search_one(solvesO=self.objective), fg)
+        self.assertEqual(fg.needsO, [sub_objective])
+        self.assertEqual(self.grounded_fd(sub_objective), 'fd_camera')
+        self.assertIsNone(reasoner.lookup(sub_fg.name))
+        reasoner.lookup('fd_lidar').fd_realisability = None
+        # the sub-objectives are removed with the grounding of fd_fast
+        transport.publish(component_status('laser', 'FALSE'))
+        decisions = transport.spin_once()
+        self.assertEqual([d.configuration for d in decisions], ['fd_safe'])
+        self.assertEqual(reasoner.tomasys.Objective.instances(),
+                         [self.objective])
+
+
+class TestFunctionDesignSelection(unittest.TestCase):
+
+    UTILITIES = [
+        {'function': 'performance'},
+        {'function': 'weighted_sum',
+         'weights': {'performance': 1.0, 'safety': -0.5}},
+        {'function': 'lexicographic', 'order': ['-safety', 'performance']},
+        {'function': 'pareto', 'weights': {'performance': 1.0,
+                                           'safety': -1.0}},
+        # disagrees with the QA directions: not pruned
+        {'function': 'weighted_sum', 'weights': {'safety': 1.0}},
+    ]
+
+    def test_pruning_selects_the_same_fds(self):
+        random = np.random.RandomState(0)
+        tbox = build_tbox(World())
+        onto = tbox.world.get_ontology('http://ros/selection#')
+        function = tbox.Function('f_navigate', namespace=onto)
+        qa_types = dict((name, tbox.QualityAttributeType(name,
+                                                         namespace=onto))
+                        for name in ('performance', 'safety'))
+        for i in range(40):
+            # coarse values, so that there are ties and dominated FDs
+            tbox.FunctionDesign(
+                'fd_{}'.format(i), namespace=onto, solvesF=function,
+                hasQAestimation=[
+                    tbox.QAvalue(namespace=onto, isQAtype=qa_type,
+                                 hasValue=float(random.randint(1, 6)) / 5)
+                    for qa_type in qa_types.values()])
+        pruned = FunctionDesignIndex()
+        unpruned = FunctionDesignIndex(pareto_pruning=False)
+        pruned.build(tbox)
+        unpruned.build(tbox)
+        rows = pruned.function_rows(function)
+        for _ in range(50):
+            suitable = random.rand(len(rows)) < 0.8
+            nfrs = [('safety', float(random.randint(3, 7)) / 5)]
+            for config in self.UTILITIES:
+                self.assertEqual(
+                    selectFunctionDesign(pruned, rows, suitable, nfrs,
+                                         config),
+                    selectFunctionDesign(unpruned, rows, suitable, nfrs,
+                                         config),
+                    (config, nfrs))
+        self.assertFalse(pruned.prunable(self.UTILITIES[-1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
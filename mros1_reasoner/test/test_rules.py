@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+import os
+import unittest
+
+from owlready2 import World, destroy_entity
+
+from mros1_reasoner.reasoning import CrossCheckBackend, PythonRulesBackend
+from mros1_reasoner.reasoning import PelletServerBackend
+from mros1_reasoner.rules import NFRRule, NFRRules
+
+from test_engine import build_kb, build_tbox
+
+KB_FILE = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', 'scripts', 'kb.owl'))
+
+# NFRs of the objective grounded on kb.owl
+NFR_SAFETY = 0.8
+NFR_ENERGY = 0.5
+
+# o_status inferred by Pellet on kb.owl for the observed (safety, energy)
+# of the FG: its SWRL rules assert INTERNAL_ERROR if the safety is below
+# the NFR (greaterThan(nfrv, qav)) or the energy above it
+# (greaterThan(qav, nfrv))
+PELLET_RESULTS = [
+    ((0.9, 0.3), None),
+    ((0.8, 0.5), None),
+    ((0.5, 0.3), 'INTERNAL_ERROR'),
+    ((0.9, 0.7), 'INTERNAL_ERROR'),
+    ((0.5, 0.7), 'INTERNAL_ERROR'),
+]
+
+
+class KnownResults(object):
+    """Stands for PelletBackend, asserting a known o_status."""
+
+    def __init__(self, o_status):
+        self.o_status = o_status
+
+    def reason(self, tbox, abox):
+        objective = abox.o_navigate
+        old, objective.o_status = objective.o_status, self.o_status
+        if old == self.o_status:
+            return {}
+        return {(objective.name, 'o_status'): (old, self.o_status)}
+
+
+class RecordingProcess(object):
+    """Stands for PelletProcess, recording the requests and answering
+       REASON with the lines of reason_output.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.reason_output = []
+        self.loaded = []
+        self.stopped = False
+
+    def start(self):
+        return self
+
+    def stop(self):
+        self.stopped = True
+
+    def request(self, command, argument=None, lines=None):
+        self.requests.append((command, sorted(lines or [])))
+        if command == 'LOAD':
+            with open(argument) as f:
+                self.loaded = f.read().splitlines()
+        if command == 'REASON':
+            output, self.reason_output = self.reason_output, []
+            return output
+        return []
+
+
+def load_grounded_kb(safety, energy):
+    """ Loads kb.owl and grounds an objective with an FG observing the
+        given safety and energy
+    """
+    world = World()
+    tbox = build_tbox(world)
+    kb = world.get_ontology('file://' + KB_FILE).load()
+    qa_types = dict((qa_type.name, qa_type)
+                    for qa_type in tbox.QualityAttributeType.instances())
+    fd = tbox.FunctionDesign.instances()[0]
+    objective = tbox.Objective(
+        'o_navigate', namespace=kb, typeF=fd.solvesF,
+        hasNFR=[tbox.QAvalue('nfr_safety', namespace=kb,
+                             isQAtype=qa_types['safety'],
+                             hasValue=NFR_SAFETY),
+                tbox.QAvalue('nfr_energy', namespace=kb,
+                             isQAtype=qa_types['energy'],
+                             hasValue=NFR_ENERGY)])
+    tbox.FunctionGrounding(
+        'fg_navigate', namespace=kb, typeFD=fd, solvesO=objective,
+        hasQAvalue=[tbox.QAvalue('obs_safety', namespace=kb,
+                                 isQAtype=qa_types['safety'],
+                                 hasValue=safety),
+                    tbox.QAvalue('obs_energy', namespace=kb,
+                                 isQAtype=qa_types['energy'],
+                                 hasValue=energy)])
+    return tbox, kb
+
+
+class TestRules(unittest.TestCase):
+
+    def test_nfr_rules_of_model(self):
+        world = World()
+        build_tbox(world)
+        world.get_ontology('file://' + KB_FILE).load()
+        nfr_rules = NFRRules()
+        nfr_rules.load(world)
+        self.assertEqual(nfr_rules.rules('safety'), [
+            NFRRule('safety', 'lessThan', 'o_status', 'INTERNAL_ERROR')])
+        self.assertEqual(nfr_rules.rules('energy'), [
+            NFRRule('energy', 'greaterThan', 'o_status', 'INTERNAL_ERROR')])
+        # no SWRL rule: default rule, upper bound
+        self.assertEqual(nfr_rules.rules('performance'), [
+            NFRRule('performance', 'greaterThanOrEqual', 'fg_status',
+                    'IN_ERROR_NFR')])
+
+    def test_python_backend_matches_pellet(self):
+        for (safety, energy), o_status in PELLET_RESULTS:
+            tbox, kb = load_grounded_kb(safety, energy)
+            PythonRulesBackend().reason(tbox, kb)
+            self.assertEqual(kb.o_navigate.o_status, o_status,
+                             (safety, energy))
+            self.assertIsNone(kb.fg_navigate.fg_status)
+
+    def test_crosscheck_backend_matches_pellet(self):
+        for (safety, energy), o_status in PELLET_RESULTS:
+            tbox, kb = load_grounded_kb(safety, energy)
+            backend = CrossCheckBackend()
+            backend.pellet = KnownResults(o_status)
+            backend.reason(tbox, kb)
+            self.assertEqual(backend.divergences, {}, (safety, energy))
+
+    def test_configured_nfr_bounds(self):
+        tbox, onto = build_kb(World())
+        fd = onto.fd_fast
+        objective = tbox.Objective(
+            'o_navigate', namespace=onto, typeF=fd.solvesF,
+            hasNFR=[tbox.QAvalue('nfr_safety', namespace=onto,
+                                 isQAtype=onto.safety, hasValue=0.8)])
+        tbox.FunctionGrounding(
+            'fg_fast', namespace=onto, typeFD=fd, solvesO=objective,
+            hasQAvalue=[tbox.QAvalue('obs_safety', namespace=onto,
+                                     isQAtype=onto.safety, hasValue=0.9)])
+        backend = PythonRulesBackend()
+        backend.nfr_rules.bounds['safety'] = 'lower'
+        self.assertEqual(backend.reason(tbox, onto), {})
+        onto.obs_safety.hasValue = 0.5
+        self.assertEqual(backend.reason(tbox, onto), {
+            ('fg_fast', 'fg_status'): (None, 'IN_ERROR_NFR'),
+            ('o_navigate', 'o_status'): (None, 'IN_ERROR_NFR')})
+
+    def test_pellet_server_sends_abox_deltas(self):
+        tbox, onto = build_kb(World())
+        fg = tbox.FunctionGrounding('fg_fast', namespace=onto,
+                                    typeFD=onto.fd_fast)
+        process = RecordingProcess()
+        backend = PelletServerBackend(process_factory=lambda: process)
+        tomasys = 'http://metacontrol.org/tomasys#'
+        laser = '<http://ros/navigation#laser>'
+        fd_fast = '<http://ros/navigation#fd_fast>'
+        realisability = (
+            '{0} <{1}fd_realisability> "false"^^'
+            '<http://www.w3.org/2001/XMLSchema#boolean> .'
+            .format(fd_fast, tomasys))
+        process.reason_output = [
+            'VALUE\t{0}\t{1}fd_realisability\tfalse\t'
+            'http://www.w3.org/2001/XMLSchema#boolean'
+            .format(fd_fast[1:-1], tomasys)]
+        # the whole KB is only sent when the process starts
+        self.assertEqual(backend.reason(tbox, onto), {
+            ('fd_fast', 'fd_realisability'): (None, False)})
+        self.assertIs(onto.fd_fast.fd_realisability, False)
+        self.assertEqual([command for command, _ in process.requests],
+                         ['PROPERTIES', 'LOAD', 'REASON'])
+        self.assertIn('{0} <{1}roles> <http://ros/navigation#r_fd_fast> .'
+                      .format(fd_fast, tomasys), process.loaded)
+
+        # then only the triples of the modified individuals
+        process.requests = []
+        onto.laser.c_status = 'FALSE'
+        self.assertEqual(backend.reason(tbox, onto), {})
+        status = ('{0} <{1}c_status> "FALSE"^^'
+                  '<http://www.w3.org/2001/XMLSchema#string> .'
+                  .format(laser, tomasys))
+        self.assertEqual(process.requests, [
+            ('ADD', sorted([status, realisability])),
+            ('REASON', sorted([laser[1:-1], fd_fast[1:-1]]))])
+
+        process.requests = []
+        onto.laser.c_status = 'RECOVERED'
+        backend.reason(tbox, onto)
+        self.assertEqual(process.requests, [
+            ('REMOVE', [status]),
+            ('ADD', [status.replace('FALSE', 'RECOVERED')]),
+            ('REASON', [laser[1:-1]])])
+
+        # all the triples sent of a destroyed individual are removed
+        process.requests = []
+        fg_fast = '<http://ros/navigation#fg_fast>'
+        fg_lines = sorted(line for line in process.loaded
+                          if line.startswith(fg_fast))
+        self.assertEqual(len(fg_lines), 3)
+        destroy_entity(fg)
+        backend.reason(tbox, onto)
+        self.assertEqual(process.requests, [('REMOVE', fg_lines),
+                                            ('REASON', [])])
+        backend.close()
+        self.assertTrue(process.stopped)
+
+
+if __name__ == '__main__':
+    unittest.main()